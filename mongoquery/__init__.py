@@ -32,92 +32,486 @@ class _Undefined(object):
     pass
 
 
+_MISSING = object()
+
+
 def is_non_string_sequence(entry):
     """ Returns True if entry is a Python sequence iterable, and not a string """
     return isinstance(entry, Sequence) and not isinstance(entry, string_type)
 
 
-class Query(object):
-    """ The Query class is used to match an object against a MongoDB-like query """
+_REGEX_LITERAL = re.compile(r"\A/(.+)/([imsx]{,4})\Z", flags=re.DOTALL)
+
+
+def _compile_regex(condition, options=""):
+    """ Compiles a $regex condition, given either as a compiled pattern or as a
+    string optionally using the "/pattern/<options>" syntax """
+    if not isinstance(options, string_type):
+        raise QueryError(
+            "$options has been attributed incorrect argument {!r}".format(
+                options))
+    if isinstance(condition, regex_type):
+        # If the caller has supplied a compiled regex, assume options are
+        # already included.
+        if not options:
+            return condition
+        exp, flags = condition.pattern, condition.flags
+    elif isinstance(condition, string_type):
+        regex = _REGEX_LITERAL.match(condition)
+        if regex:
+            exp, options = regex.group(1), regex.group(2) + options
+        else:
+            exp = condition
+        flags = 0
+    else:
+        raise QueryError(
+            "{!r} is not a regular expression "
+            "and should be a string".format(condition))
+
+    for option in options:
+        if option not in "imsx":
+            raise QueryError(
+                "{!r} isn't a supported regular expression option".format(
+                    option))
+        flags |= getattr(re, option.upper())
+
+    try:
+        return re.compile(exp, flags)
+    except Exception as error:
+        raise QueryError(
+            "{!r} failed to compile with error {!r}".format(condition, error))
+
+
+def _always(_):
+    return True
+
+
+def _never(_):
+    return False
+
+
+def _all_of(matchers):
+    """ Combines matchers into a single matcher requiring all of them """
+    if not matchers:
+        return _always
+    if len(matchers) == 1:
+        return matchers[0]
+    if len(matchers) == 2:
+        first, second = matchers
+
+        def match_both(entry):
+            return bool(first(entry) and second(entry))
+        return match_both
+
+    matchers = tuple(matchers)
+
+    def match_all(entry):
+        for matcher in matchers:
+            if not matcher(entry):
+                return False
+        return True
+    return match_all
+
+
+def _any_of(matchers):
+    """ Combines matchers into a single matcher requiring one of them """
+    if not matchers:
+        return _never
+    if len(matchers) == 1:
+        return matchers[0]
+    matchers = tuple(matchers)
+
+    def match_any(entry):
+        for matcher in matchers:
+            if matcher(entry):
+                return True
+        return False
+    return match_any
+
+
+def _as_index(key):
+    try:
+        return int(key)
+    except ValueError:
+        return None
+
+
+class _Path(object):
+    """ A dotted field path, split once, with the keys which can be used as
+    array indexes converted to integers """
     # pylint: disable=too-few-public-methods
+    __slots__ = ("keys", "indexes", "lazy")
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self.indexes = tuple(_as_index(key) for key in self.keys)
+        # Paths indexing arrays may raise an IndexError anywhere along a fan
+        # out, which makes the whole path undefined, so they are always
+        # extracted entirely.
+        self.lazy = all(index is None for index in self.indexes)
+
+    def extract(self, entry, start=0):
+        """ Returns the value at the path in entry, a list of the values
+        extracted from each item of the arrays it fans out over """
+        keys, indexes = self.keys, self.indexes
+        for position in range(start, len(keys)):
+            if type(entry) is dict:
+                entry = entry.get(keys[position], _MISSING)
+                if entry is _MISSING:
+                    return _Undefined()
+            elif entry is None:
+                return entry
+            elif is_non_string_sequence(entry):
+                index = indexes[position]
+                if index is None:
+                    return [self.extract(item, position) for item in entry]
+                entry = entry[index]
+            elif isinstance(entry, Mapping) and keys[position] in entry:
+                entry = entry[keys[position]]
+            else:
+                return _Undefined()
+        return entry
+
+    def fan_out(self, entry):
+        """ Walks the path in entry up to the first array it fans out over.
+        Returns the value at the path and None if it doesn't fan out, or None
+        and an iterator lazily extracting the values from each item of the
+        array otherwise """
+        keys, indexes = self.keys, self.indexes
+        extract = self.extract
+        for position in range(len(keys)):
+            if type(entry) is dict:
+                entry = entry.get(keys[position], _MISSING)
+                if entry is _MISSING:
+                    return _Undefined(), None
+            elif entry is None:
+                return entry, None
+            elif is_non_string_sequence(entry):
+                index = indexes[position]
+                if index is None:
+                    return None, (extract(item, position) for item in entry)
+                entry = entry[index]
+            elif isinstance(entry, Mapping) and keys[position] in entry:
+                entry = entry[keys[position]]
+            else:
+                return _Undefined(), None
+        return entry, None
+
+
+def _referenced_paths(condition):
+    """ Returns the set of the paths of the fields a query definition refers
+    to, or None if it refers to whole objects """
+    if not isinstance(condition, Mapping):
+        return None
+    paths = set()
+    for operator, sub_condition in condition.items():
+        if not isinstance(operator, string_type) or \
+                not operator.startswith("$"):
+            paths.add(operator)
+        elif operator in ("$and", "$or", "$nor") and \
+                is_non_string_sequence(sub_condition):
+            for sub in sub_condition:
+                sub_paths = _referenced_paths(sub)
+                if sub_paths is None:
+                    return None
+                paths.update(sub_paths)
+        elif operator != "$comment":
+            return None
+    return frozenset(paths)
+
+
+class Query(object):
+    """ The Query class is used to match an object against a MongoDB-like query
+
+    The definition is compiled once on instanciation into a tree of matcher
+    callables, so that `match` doesn't have to interpret the definition for
+    every entry. Malformed definitions raise a `QueryError` at that point.
+    """
     def __init__(self, definition):
         self._definition = definition
+        self._matcher = self._compile(definition)
+
+    def __reduce__(self):
+        # Compiled matchers can't be pickled, queries are pickled as their
+        # definition and compiled again when unpickled.
+        return self.__class__, (self._definition,)
+
+    @classmethod
+    def cached(cls, definition):
+        """ Returns the query of definition from a process-wide least recently
+        used cache, `cache.query_cache`, compiling it only when no equivalent
+        definition (the same regardless of the order of the keys of its
+        mappings, but for conditions which may raise, see
+        `planner.may_raise`) is cached. Cached queries are shared and
+        mustn't be altered. """
+        from .cache import query_cache
+        return query_cache.get(definition, cls)
+
+    @classmethod
+    def normalized(cls, definition):
+        """ Returns the query of the normalization of definition (see
+        `normalize.normalize`), which matches the same objects. Queries
+        provably matching nothing don't even consume the entries they are
+        given. """
+        from .normalize import normalize
+        return cls(normalize(definition))
+
+    @property
+    def paths(self):
+        """ The set of the dotted paths of the fields the query refers to, or
+        None if it refers to whole objects """
+        return _referenced_paths(self._definition)
+
+    def analyze(self):
+        """ Returns the `QueryAnalysis` of the query: the paths it reads, the
+        operators it uses, the indexes which can narrow it down and its
+        estimated cost """
+        from .analysis import QueryAnalysis
+        return QueryAnalysis(self)
+
+    def explain(self, entries=None, hooks=()):
+        """ Returns a MongoDB-like explanation of the query: its plan, a tree
+        of the operators it evaluates, under "queryPlanner". When entries are
+        given, they are matched by an `explain.InstrumentedQuery` deriving
+        from the class of the query, and the plan along with the number of
+        times each of its nodes was evaluated, matched and the time it took
+        is returned under "executionStats". Hooks are passed to the
+        InstrumentedQuery. """
+        from .explain import explain
+        return explain(self, entries, hooks)
 
     def match(self, entry):
         """ Matches the entry object against the query specified on instanciation """
-        return self._match(self._definition, entry)
-
-    def _match(self, condition, entry):
+        return self._matcher(entry)
+
+    def filter(self, entries, projection=None):
+        """ Returns an iterator over the entries matching the query, or over
+        their projections when a projection (either a `Projection` or a
+        projection specification) is given """
+        if self._matcher is _never:
+            return iter(())
+        matches = filter(self._matcher, entries)
+        if projection is None:
+            return matches
+        from .projection import Projection
+        if not isinstance(projection, Projection):
+            projection = Projection(projection)
+        return map(projection.apply, matches)
+
+    def find(self, entries, projection=None):
+        """ Returns a `Cursor` over the entries matching the query, which can
+        be sorted, skipped and limited """
+        from .cursor import Cursor
+        return Cursor(self, entries, projection)
+
+    def count(self, entries):
+        """ Returns the number of entries matching the query """
+        if self._matcher is _never:
+            return 0
+        return sum(1 for _ in filter(self._matcher, entries))
+
+    def first(self, entries, default=None):
+        """ Returns the first entry matching the query, or default if none
+        matches. Entries following the first match aren't consumed. """
+        if self._matcher is _never:
+            return default
+        return next(filter(self._matcher, entries), default)
+
+    def partition(self, entries):
+        """ Splits entries into a list of the ones matching the query and a
+        list of the ones that don't """
+        matcher = self._matcher
+        matched, unmatched = [], []
+        add_matched, add_unmatched = matched.append, unmatched.append
+        for entry in entries:
+            if matcher(entry):
+                add_matched(entry)
+            else:
+                add_unmatched(entry)
+        return matched, unmatched
+
+    def parallel_filter(self, entries, workers=None, chunksize=1000,
+                        ordered=True, indices=False):
+        """ Returns an iterator over the entries matching the query, matched
+        in chunks of chunksize entries by a pool of workers processes.
+
+        Matches are yielded in the order of entries unless ordered is False,
+        in which case they are yielded as soon as their chunk is matched.
+        With indices, the indices of the matching entries are yielded instead.
+        Entries have to be picklable, matching entries aren't pickled back.
+        """
+        from .parallel import parallel_filter
+        return parallel_filter(
+            self, entries, workers, chunksize, ordered, indices)
+
+    def afilter(self, entries, batch_size=1000, executor=None,
+                offload_cost=None, latency=None):
+        """ Returns an asynchronous iterator over the entries of an iterable
+        or of an asynchronous iterable matching the query, see
+        `afilter_batches` """
+        from .aio import afilter
+        return afilter(
+            self, entries, batch_size, executor, offload_cost, latency)
+
+    def afilter_batches(self, entries, batch_size=1000, executor=None,
+                        offload_cost=None, latency=None):
+        """ Returns an asynchronous iterator over the lists of the entries
+        matching the query of each batch of at most batch_size entries of an
+        iterable or of an asynchronous iterable.
+
+        Control is given back to the event loop between batches, so that
+        filtering many entries doesn't stall it. With an executor (of threads
+        or of processes, to which the query and the batches are sent), batches
+        are matched in the executor instead, only when their estimated cost
+        (see `planner.estimate_cost`) times their number of entries reaches
+        offload_cost if given. With latency, batches of asynchronous iterables
+        are matched once their first entry has waited for latency seconds,
+        even if they aren't full.
+        """
+        from .aio import afilter_batches
+        return afilter_batches(
+            self, entries, batch_size, executor, offload_cost, latency)
+
+    ##############
+    # Compilation
+    ##############
+
+    def _compile(self, condition):
         if isinstance(condition, Mapping):
-            return all(
-                self._process_condition(sub_operator, sub_condition, entry)
-                for sub_operator, sub_condition in condition.items()
+            if "$options" in condition and "$regex" in condition:
+                # $options only makes sense along with $regex, fold them into
+                # a single compiled pattern.
+                condition = dict(condition)
+                condition["$regex"] = _compile_regex(
+                    condition["$regex"], condition.pop("$options"))
+            return self._combine_all(
+                [
+                    self._compile_condition(sub_operator, sub_condition)
+                    for sub_operator, sub_condition in condition.items()
+                ],
+                [
+                    {sub_operator: sub_condition}
+                    for sub_operator, sub_condition in condition.items()
+                ]
             )
-        if condition == entry:
-            return True
-
-        if is_non_string_sequence(entry):
-            return condition in entry
-        return False
 
-    def _extract(self, entry, path):
-        if not path:
-            return entry
-        if entry is None:
-            return entry
-        if is_non_string_sequence(entry):
-            try:
-                index = int(path[0])
-                return self._extract(entry[index], path[1:])
-            except ValueError:
-                return [self._extract(item, path) for item in entry]
-        elif isinstance(entry, Mapping) and path[0] in entry:
-            return self._extract(entry[path[0]], path[1:])
-        else:
-            return _Undefined()
-
-    def _path_exists(self, operator, condition, entry):
-        keys_list = list(operator.split('.'))
-        for i, k in enumerate(keys_list):
-            if isinstance(entry, Sequence) and not k.isdigit():
-                for elem in entry:
-                    operator = '.'.join(keys_list[i:])
-                    if self._path_exists(operator, condition, elem) == condition:
-                        return condition
-                return not condition
-            elif isinstance(entry, Sequence):
-                k = int(k)
-            try:
-                entry = entry[k]
-            except (TypeError, IndexError, KeyError):
-                return not condition
-        return condition
+        def match_value(entry):
+            if condition == entry:
+                return True
+            if is_non_string_sequence(entry):
+                return condition in entry
+            return False
 
-    def _process_condition(self, operator, condition, entry):
+        if not isinstance(condition, list):
+            # A value which isn't a list only matches a list it's in.
+            def match_element(element):
+                return element is condition or element == condition
+            match_value.match_element = match_element
+        return match_value
+
+    def _combine_all(self, matchers, conditions):
+        # pylint: disable=unused-argument,no-self-use
+        """ Combines the matchers compiled from conditions into a matcher
+        requiring all of them to match """
+        return _all_of(matchers)
+
+    def _combine_any(self, matchers, conditions):
+        # pylint: disable=unused-argument,no-self-use
+        """ Combines the matchers compiled from conditions into a matcher
+        requiring any of them to match """
+        return _any_of(matchers)
+
+    def _compile_condition(self, operator, condition):
         if isinstance(condition, Mapping) and "$exists" in condition:
+            exists = condition["$exists"]
             if isinstance(operator, string_types) and operator.find('.') != -1:
-                return self._path_exists(operator, condition['$exists'], entry)
-            elif condition["$exists"] != (operator in entry):
-                return False
-            elif tuple(condition.keys()) == ("$exists",):
-                return True
+                return self._path_exists(tuple(operator.split('.')), exists)
+            if tuple(condition.keys()) == ("$exists",):
+                def match_exists(entry):
+                    return exists == (operator in entry)
+                return match_exists
+
+            matcher = self._compile_operand(operator, condition)
+
+            def match_exists_and(entry):
+                if exists != (operator in entry):
+                    return False
+                return matcher(entry)
+            return match_exists_and
+        return self._compile_operand(operator, condition)
+
+    def _compile_operand(self, operator, condition):
         if isinstance(operator, string_type):
             if operator.startswith("$"):
                 try:
-                    return getattr(self, "_" + operator[1:])(condition, entry)
+                    compiler = getattr(self, "_" + operator[1:])
                 except AttributeError:
                     raise QueryError(
                         "{!r} operator isn't supported".format(operator))
-            else:
-                try:
-                    extracted_data = self._extract(entry, operator.split("."))
-                except IndexError:
-                    extracted_data = _Undefined()
-        else:
+                return compiler(condition)
+            return self._compile_path(tuple(operator.split(".")), condition)
+
+        matcher = self._compile(condition)
+
+        def match_key(entry):
             if operator not in entry:
                 return False
-            extracted_data = entry[operator]
-        return self._match(condition, extracted_data)
+            return matcher(entry[operator])
+        return match_key
+
+    @staticmethod
+    def _field_path(keys):
+        """ Returns the accessor of the field at the path made of keys """
+        return _Path(keys)
+
+    def _compile_path(self, path, condition):
+        path = self._field_path(path)
+        matcher = self._compile(condition)
+
+        # Matchers matching any element of an array can stop extracting
+        # values from the items of an array the path fans out over as soon
+        # as one matches.
+        match_element = getattr(matcher, "match_element", None)
+        if path.lazy and match_element is not None:
+            fan_out = path.fan_out
+
+            def match_path_lazily(entry):
+                extracted_data, elements = fan_out(entry)
+                if elements is None:
+                    return matcher(extracted_data)
+                for element in elements:
+                    if match_element(element):
+                        return True
+                return False
+            return match_path_lazily
+
+        extract = path.extract
+
+        def match_path(entry):
+            try:
+                extracted_data = extract(entry)
+            except IndexError:
+                extracted_data = _Undefined()
+            return matcher(extracted_data)
+        return match_path
+
+    def _path_exists(self, keys, condition):
+        def path_exists(entry, start=0):
+            for i in range(start, len(keys)):
+                k = keys[i]
+                if isinstance(entry, Sequence) and not k.isdigit():
+                    for elem in entry:
+                        if path_exists(elem, i) == condition:
+                            return condition
+                    return not condition
+                elif isinstance(entry, Sequence):
+                    k = int(k)
+                try:
+                    entry = entry[k]
+                except (TypeError, IndexError, KeyError):
+                    return not condition
+            return condition
+        return path_exists
 
     ##################
     # Common operators
@@ -129,103 +523,194 @@ class Query(object):
 
     @staticmethod
     def _noop(*_):
-        return True
+        return _always
 
     ######################
     # Comparison operators
     ######################
 
     @staticmethod
-    def _eq(condition, entry):
-        try:
-            return entry == condition
-        except TypeError:
-            return False
+    def _eq(condition):
+        def match_eq(entry):
+            try:
+                return entry == condition
+            except TypeError:
+                return False
+        return match_eq
 
     @staticmethod
-    def _gt(condition, entry):
-        try:
-            return entry > condition
-        except TypeError:
-            return False
+    def _gt(condition):
+        def match_gt(entry):
+            try:
+                return entry > condition
+            except TypeError:
+                return False
+        return match_gt
 
     @staticmethod
-    def _gte(condition, entry):
-        try:
-            return entry >= condition
-        except TypeError:
-            return False
+    def _gte(condition):
+        def match_gte(entry):
+            try:
+                return entry >= condition
+            except TypeError:
+                return False
+        return match_gte
 
     @staticmethod
-    def _in(condition, entry):
-        if is_non_string_sequence(condition):
-            for elem in condition:
-                if is_non_string_sequence(entry) and elem in entry:
+    def _in(condition):
+        if not is_non_string_sequence(condition):
+            raise TypeError("condition must be a list")
+
+        # Hashable values are looked up in a set, the others (dicts, lists...)
+        # are compared one by one. Compiled patterns are matched against
+        # strings on top of being compared.
+        hashable, unhashable = set(), []
+        for elem in condition:
+            try:
+                hashable.add(elem)
+            except TypeError:
+                unhashable.append(elem)
+        hashable = frozenset(hashable)
+        searches = tuple(
+            elem.search for elem in hashable if isinstance(elem, regex_type))
+
+        if not unhashable and not searches:
+            def match_in_set(entry):
+                if is_non_string_sequence(entry):
+                    for item in entry:
+                        try:
+                            if item in hashable:
+                                return True
+                        except TypeError:
+                            pass
+                    return False
+                try:
+                    return entry in hashable
+                except TypeError:
+                    return False
+
+            def match_element_in_set(element):
+                try:
+                    return element in hashable
+                except TypeError:
+                    return False
+            match_in_set.match_element = match_element_in_set
+            return match_in_set
+
+        def match_value(value):
+            try:
+                if value in hashable:
                     return True
-                elif not is_non_string_sequence(entry) and elem == entry:
+            except TypeError:
+                pass
+            if isinstance(value, string_type):
+                for search in searches:
+                    if search(value) is not None:
+                        return True
+            return False
+
+        def match_in(entry):
+            if is_non_string_sequence(entry):
+                for item in entry:
+                    if match_value(item):
+                        return True
+                for elem in unhashable:
+                    if elem in entry:
+                        return True
+                return False
+            if match_value(entry):
+                return True
+            for elem in unhashable:
+                if elem == entry:
                     return True
             return False
-        else:
-            raise TypeError("condition must be a list")
 
-    @staticmethod
-    def _lt(condition, entry):
-        try:
-            return entry < condition
-        except TypeError:
+        def match_element_in(element):
+            if match_value(element):
+                return True
+            for elem in unhashable:
+                if elem is element or elem == element:
+                    return True
             return False
+        match_in.match_element = match_element_in
+        return match_in
 
     @staticmethod
-    def _lte(condition, entry):
-        try:
-            return entry <= condition
-        except TypeError:
-            return False
+    def _lt(condition):
+        def match_lt(entry):
+            try:
+                return entry < condition
+            except TypeError:
+                return False
+        return match_lt
+
+    @staticmethod
+    def _lte(condition):
+        def match_lte(entry):
+            try:
+                return entry <= condition
+            except TypeError:
+                return False
+        return match_lte
 
     @staticmethod
-    def _ne(condition, entry):
-        return entry != condition
+    def _ne(condition):
+        def match_ne(entry):
+            return entry != condition
+        return match_ne
+
+    def _nin(self, condition):
+        matcher = self._in(condition)
 
-    def _nin(self, condition, entry):
-        return not self._in(condition, entry)
+        def match_nin(entry):
+            return not matcher(entry)
+        return match_nin
 
     ###################
     # Logical operators
     ###################
 
-    def _and(self, condition, entry):
+    def _and(self, condition):
         if isinstance(condition, Sequence):
-            return all(
-                self._match(sub_condition, entry)
+            return self._combine_all([
+                self._compile(sub_condition)
                 for sub_condition in condition
-            )
+            ], condition)
         raise QueryError(
             "$and has been attributed incorrect argument {!r}".format(
                 condition
             )
         )
 
-    def _nor(self, condition, entry):
+    def _nor(self, condition):
         if isinstance(condition, Sequence):
-            return all(
-                not self._match(sub_condition, entry)
+            matcher = self._combine_any([
+                self._compile(sub_condition)
                 for sub_condition in condition
-            )
+            ], condition)
+
+            def match_nor(entry):
+                return not matcher(entry)
+            return match_nor
         raise QueryError(
             "$nor has been attributed incorrect argument {!r}".format(
                 condition
             )
         )
 
-    def _not(self, condition, entry):
-        return not self._match(condition, entry)
+    def _not(self, condition):
+        matcher = self._compile(condition)
 
-    def _or(self, condition, entry):
+        def match_not(entry):
+            return not matcher(entry)
+        return match_not
+
+    def _or(self, condition):
         if isinstance(condition, Sequence):
-            return any(
-                self._match(sub_condition, entry)
+            return self._combine_any([
+                self._compile(sub_condition)
                 for sub_condition in condition
-            )
+            ], condition)
         raise QueryError(
             "$or has been attributed incorrect argument {!r}".format(
                 condition
@@ -237,7 +722,7 @@ class Query(object):
     ###################
 
     @staticmethod
-    def _type(condition, entry):
+    def _type(condition):
         # TODO: further validation to ensure the right type
         # rather than just checking
         bson_type = {
@@ -276,19 +761,23 @@ class Query(object):
         }
 
         if condition == "number":
-            return any([
-                isinstance(entry, bson_type[bson_alias[alias]])
+            types = tuple(
+                bson_type[bson_alias[alias]]
                 for alias in ["double", "int", "long"]
-            ])
-
-        # resolves bson alias, or keeps original condition value
-        condition = bson_alias.get(condition, condition)
+            )
+        else:
+            # resolves bson alias, or keeps original condition value
+            condition = bson_alias.get(condition, condition)
 
-        if condition not in bson_type:
-            raise QueryError(
-                "$type has been used with unknown type {!r}".format(condition))
+            if condition not in bson_type:
+                raise QueryError(
+                    "$type has been used with unknown type {!r}".format(
+                        condition))
+            types = bson_type[condition]
 
-        return isinstance(entry, bson_type.get(condition))
+        def match_type(entry):
+            return isinstance(entry, types)
+        return match_type
 
     _exists = _noop
 
@@ -297,73 +786,74 @@ class Query(object):
     ######################
 
     @staticmethod
-    def _mod(condition, entry):
-        return entry % condition[0] == condition[1]
-
-    @staticmethod
-    def _regex(condition, entry):
-        if not isinstance(entry, string_type):
-            return False
-        # If the caller has supplied a compiled regex, assume options are already
-        # included.
-        if isinstance(condition, regex_type):
-            return bool(re.search(condition, entry))
+    def _mod(condition):
         try:
-            regex = re.match(
-                r"\A/(.+)/([imsx]{,4})\Z",
-                condition,
-                flags=re.DOTALL
-            )
-        except TypeError:
+            divisor, remainder = condition[0], condition[1]
+        except (TypeError, IndexError, KeyError):
             raise QueryError(
-                "{!r} is not a regular expression "
-                "and should be a string".format(condition))
+                "$mod has been attributed incorrect argument {!r}".format(
+                    condition
+                )
+            )
 
-        flags = 0
-        if regex:
-            options = regex.group(2)
-            for option in options:
-                flags |= getattr(re, option.upper())
-            exp = regex.group(1)
-        else:
-            exp = condition
+        def match_mod(entry):
+            return entry % divisor == remainder
+        return match_mod
 
-        try:
-            match = re.search(exp, entry, flags=flags)
-        except Exception as error:
-            raise QueryError(
-                "{!r} failed to execute with error {!r}".format(
-                    condition, error))
-        return bool(match)
+    @staticmethod
+    def _regex(condition):
+        search = _compile_regex(condition).search
+
+        def match_regex(entry):
+            if not isinstance(entry, string_type):
+                return False
+            return search(entry) is not None
+        return match_regex
 
-    _options = _text = _where = _not_implemented
+    @staticmethod
+    def _options(condition):
+        raise QueryError(
+            "$options {!r} has to be used along with $regex".format(condition))
+
+    _text = _where = _not_implemented
 
     #################
     # Array operators
     #################
 
-    def _all(self, condition, entry):
-        return all(
-            self._match(item, entry)
+    def _all(self, condition):
+        return self._combine_all([
+            self._compile(item)
             for item in condition
-        )
+        ], condition)
 
-    def _elemMatch(self, condition, entry):
+    def _elemMatch(self, condition):
         # pylint: disable=invalid-name
-        if not isinstance(entry, Sequence):
-            return False
-        return any(
-            all(
-                self._process_condition(sub_operator, sub_condition, element)
-                for sub_operator, sub_condition in condition.items()
+        if not isinstance(condition, Mapping):
+            raise QueryError(
+                "$elemMatch has been attributed incorrect argument {!r}".format(
+                    condition
+                )
             )
-            for element in entry
-        )
+        matcher = self._compile(condition)
 
-    @staticmethod
-    def _size(condition, entry):
+        def match_elem_match(entry):
+            if not isinstance(entry, Sequence):
+                return False
+            for element in entry:
+                if matcher(element):
+                    return True
+            return False
+        match_elem_match.match_element = matcher
+        return match_elem_match
+
+    def _size(self, condition):
         if isinstance(condition, Mapping):
-            return Query(condition).match(len(entry))
+            matcher = self._compile(condition)
+
+            def match_size_condition(entry):
+                return matcher(len(entry))
+            return match_size_condition
 
         if not isinstance(condition, int):
             raise QueryError(
@@ -372,10 +862,11 @@ class Query(object):
                 )
             )
 
-        if is_non_string_sequence(entry):
-            return len(entry) == condition
-
-        return False
+        def match_size(entry):
+            if is_non_string_sequence(entry):
+                return len(entry) == condition
+            return False
+        return match_size
 
     ####################
     # Comments operators
@@ -0,0 +1,10 @@
+"""
+Filters newline-delimited JSON with a query, see ``python -m mongoquery
+--help``.
+"""
+
+from .stream import main
+
+
+if __name__ == "__main__":
+    main()
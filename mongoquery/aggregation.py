@@ -0,0 +1,412 @@
+"""
+MongoDB-like aggregation pipelines evaluated over iterators of objects.
+
+Stages consume their input lazily, so that pipelines can run over streams
+larger than memory: only $group (which keeps one accumulator per group) and
+$sort (which keeps its input, or only the first matches when followed by
+$limit) hold objects.
+"""
+
+import heapq
+from collections.abc import Mapping
+from itertools import islice
+
+from . import Query, QueryError, _Path, _Undefined, is_non_string_sequence, \
+    string_type
+from .cursor import _compile_sort, sort_key
+from .projection import Projection
+
+
+#############
+# Expressions
+#############
+
+def _compile_expression(expression):
+    """ Compiles an expression into a function of an object: "$dotted.path"
+    field references, {"$literal": value}, mappings and lists of
+    expressions, other values being constants """
+    if isinstance(expression, string_type) and expression.startswith("$"):
+        extract = _Path(expression[1:].split(".")).extract
+
+        def evaluate_field(entry):
+            try:
+                value = extract(entry)
+            except IndexError:
+                return None
+            return None if isinstance(value, _Undefined) else value
+        return evaluate_field
+
+    if isinstance(expression, Mapping):
+        if len(expression) == 1 and "$literal" in expression:
+            literal = expression["$literal"]
+            return lambda entry: literal
+        if any(isinstance(key, string_type) and key.startswith("$")
+               for key in expression):
+            raise QueryError(
+                "unsupported expression {!r}".format(expression))
+        fields = [
+            (key, _compile_expression(value))
+            for key, value in expression.items()
+        ]
+        return lambda entry: {
+            key: evaluate(entry) for key, evaluate in fields}
+
+    if isinstance(expression, list):
+        items = [_compile_expression(item) for item in expression]
+        return lambda entry: [evaluate(entry) for evaluate in items]
+
+    return lambda entry: expression
+
+
+def _group_key(value):
+    """ Returns a hashable key for the value of a group _id, equal for values
+    MongoDB groups together """
+    if isinstance(value, bool):
+        return (bool, value)
+    if isinstance(value, Mapping):
+        return (dict, tuple(
+            (key, _group_key(item)) for key, item in value.items()))
+    if is_non_string_sequence(value):
+        return (list, tuple(_group_key(item) for item in value))
+    try:
+        hash(value)
+    except TypeError:
+        return (type(value), repr(value))
+    return value
+
+
+##############
+# Accumulators
+##############
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _Sum(object):
+    """ Sums the numeric values of an expression, ignoring others """
+    __slots__ = ("total",)
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, value):
+        if _is_number(value):
+            self.total += value
+
+    def result(self):
+        return self.total
+
+
+class _Avg(object):
+    """ Averages the numeric values of an expression, ignoring others """
+    __slots__ = ("total", "count")
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, value):
+        if _is_number(value):
+            self.total += value
+            self.count += 1
+
+    def result(self):
+        return self.total / float(self.count) if self.count else None
+
+
+class _Min(object):
+    """ Keeps the smallest non-null value of an expression, values being
+    ordered the way MongoDB orders them """
+    __slots__ = ("value", "key")
+    _pick = staticmethod(lambda key, best: key < best)
+
+    def __init__(self):
+        self.value = None
+        self.key = None
+
+    def add(self, value):
+        if value is None:
+            return
+        key = sort_key(value)
+        if self.key is None or self._pick(key, self.key):
+            self.value, self.key = value, key
+
+    def result(self):
+        return self.value
+
+
+class _Max(_Min):
+    """ Keeps the largest non-null value of an expression """
+    __slots__ = ()
+    _pick = staticmethod(lambda key, best: key > best)
+
+
+class _Count(object):
+    """ Counts the objects of a group """
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, _):
+        self.count += 1
+
+    def result(self):
+        return self.count
+
+
+_ACCUMULATORS = {
+    "$sum": _Sum,
+    "$avg": _Avg,
+    "$min": _Min,
+    "$max": _Max,
+    "$count": _Count,
+}
+
+
+########
+# Stages
+########
+
+def _match(condition):
+    matcher = Query(condition)._matcher
+    return lambda entries: filter(matcher, entries)
+
+
+def _limit(count):
+    if not isinstance(count, int) or isinstance(count, bool) or count <= 0:
+        raise QueryError("invalid $limit {!r}".format(count))
+    return lambda entries: islice(entries, count)
+
+
+def _skip(count):
+    if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+        raise QueryError("invalid $skip {!r}".format(count))
+    return lambda entries: islice(entries, count, None)
+
+
+def _sort(specification, limit=None):
+    """ Sorts entries, only keeping the first limit ones with a heap when
+    limit is given """
+    key = _compile_sort(specification)
+    if limit is None:
+        return lambda entries: iter(sorted(entries, key=key))
+    return lambda entries: iter(heapq.nsmallest(limit, entries, key=key))
+
+
+def _count(field):
+    if not isinstance(field, string_type) or not field or \
+            field.startswith("$") or "." in field:
+        raise QueryError("invalid $count {!r}".format(field))
+
+    def count(entries):
+        total = sum(1 for _ in entries)
+        if total:
+            yield {field: total}
+    return count
+
+
+def _group(specification):
+    if not isinstance(specification, Mapping) or "_id" not in specification:
+        raise QueryError("$group requires an _id")
+    group_id = _compile_expression(specification["_id"])
+    fields = []
+    for field, accumulator in specification.items():
+        if field == "_id":
+            continue
+        if not isinstance(accumulator, Mapping) or len(accumulator) != 1:
+            raise QueryError(
+                "invalid accumulator {!r} of {!r}".format(accumulator, field))
+        operator, expression = next(iter(accumulator.items()))
+        if operator not in _ACCUMULATORS:
+            raise QueryError(
+                "{!r} accumulator isn't supported".format(operator))
+        fields.append(
+            (field, _ACCUMULATORS[operator], _compile_expression(expression)))
+
+    def group(entries):
+        groups = {}
+        for entry in entries:
+            value = group_id(entry)
+            key = _group_key(value)
+            accumulators = groups.get(key)
+            if accumulators is None:
+                accumulators = groups[key] = (
+                    value, [accumulator() for _, accumulator, _ in fields])
+            for (_, _, evaluate), accumulator in zip(
+                    fields, accumulators[1]):
+                accumulator.add(evaluate(entry))
+
+        for value, accumulators in groups.values():
+            result = {"_id": value}
+            for (field, _, _), accumulator in zip(fields, accumulators):
+                result[field] = accumulator.result()
+            yield result
+    return group
+
+
+def _project(specification):
+    """ Projects entries with a `Projection`, along with computed fields given
+    as expressions """
+    if not isinstance(specification, Mapping) or not specification:
+        raise QueryError("invalid $project {!r}".format(specification))
+    projected, computed = {}, []
+    for path, value in specification.items():
+        if isinstance(value, (bool, int, float)) or (
+                isinstance(value, Mapping) and
+                set(value) & set(["$slice", "$elemMatch"])):
+            projected[path] = value
+        else:
+            computed.append(
+                (path.split("."), _compile_expression(value)))
+    if computed and any(
+            not value for path, value in projected.items()
+            if path != "_id" and not isinstance(value, Mapping)):
+        # As for MongoDB, exclusions can't be mixed with computed fields.
+        raise QueryError(
+            "invalid $project {!r}, computed fields can't be mixed with "
+            "exclusions".format(specification))
+    if computed and not any(
+            value for path, value in projected.items()
+            if path != "_id" and not isinstance(value, Mapping)):
+        # Computed fields alone only keep _id, unless it is excluded.
+        keep_id = projected.get("_id", True)
+
+        def apply(entry):
+            if keep_id and "_id" in entry:
+                return {"_id": entry["_id"]}
+            return {}
+    else:
+        apply = Projection(projected).apply
+
+    def project_entry(entry):
+        result = apply(entry)
+        for keys, evaluate in computed:
+            parent = result
+            for key in keys[:-1]:
+                parent = parent.setdefault(key, {})
+            parent[keys[-1]] = evaluate(entry)
+        return result
+    return lambda entries: map(project_entry, entries)
+
+
+_STAGES = {
+    "$match": _match,
+    "$group": _group,
+    "$project": _project,
+    "$sort": _sort,
+    "$limit": _limit,
+    "$skip": _skip,
+    "$count": _count,
+}
+
+
+##########
+# Pipeline
+##########
+
+def _optimize(stages):
+    """ Reorders stages so that $match and $limit stages are applied as early
+    as possible, without changing the results of the pipeline """
+    stages = list(stages)
+    changed = True
+    while changed:
+        changed = False
+        for index in range(1, len(stages)):
+            (previous, before), (name, argument) = \
+                stages[index - 1], stages[index]
+            if name == "$match" and previous == "$match":
+                # Consecutive matches are merged into a single query.
+                stages[index - 1:index + 1] = [
+                    ("$match", {"$and": [before, argument]})]
+            elif name == "$limit" and previous == "$limit" and \
+                    isinstance(before, int) and isinstance(argument, int):
+                stages[index - 1:index + 1] = [
+                    ("$limit", min(before, argument))]
+            elif name == "$match" and previous == "$sort" or \
+                    name in ("$limit", "$skip") and previous == "$project":
+                # Filtering commutes with sorting, and limiting with
+                # projecting.
+                stages[index - 1], stages[index] = \
+                    stages[index], stages[index - 1]
+            else:
+                continue
+            changed = True
+            break
+    return stages
+
+
+class Pipeline(object):
+    """ The Pipeline class is used to run MongoDB-like aggregation pipelines
+    over iterables of objects
+
+    Pipelines are lists of single-key stage mappings: $match (a query
+    definition), $group (with $sum, $avg, $min, $max and $count
+    accumulators), $project, $sort, $skip, $limit and $count. Stages are
+    reordered to filter and limit as early as possible, and compiled once on
+    instanciation.
+    """
+
+    def __init__(self, stages):
+        self._definition = stages
+        self.stages = _optimize(self._parse(stages))
+        self._stages = self._compile(self.stages)
+
+    def __reduce__(self):
+        return self.__class__, (self._definition,)
+
+    def run(self, entries):
+        """ Returns an iterator over the results of the pipeline, lazily
+        consuming the entries """
+        results = iter(entries)
+        for stage in self._stages:
+            results = stage(results)
+        return results
+
+    @staticmethod
+    def _parse(stages):
+        if not is_non_string_sequence(stages):
+            raise QueryError("pipelines must be lists of stages")
+        parsed = []
+        for stage in stages:
+            if not isinstance(stage, Mapping) or len(stage) != 1:
+                raise QueryError("invalid stage {!r}".format(stage))
+            name, argument = next(iter(stage.items()))
+            if name not in _STAGES:
+                raise QueryError("{!r} stage isn't supported".format(name))
+            parsed.append((name, argument))
+        return parsed
+
+    @staticmethod
+    def _compile(stages):
+        compiled = []
+        for index, (name, argument) in enumerate(stages):
+            if name == "$sort":
+                limit = _sort_limit(stages[index + 1:])
+                compiled.append(_sort(argument, limit))
+            else:
+                compiled.append(_STAGES[name](argument))
+        return compiled
+
+
+def _sort_limit(following):
+    """ Returns the number of sorted entries the stages following a $sort
+    use, None if they may use all of them """
+    skipped = 0
+    for name, argument in following:
+        if name in ("$skip", "$limit") and not isinstance(argument, int):
+            return None
+        if name == "$skip":
+            skipped += argument
+        elif name == "$limit":
+            return skipped + argument
+        elif name != "$project":
+            return None
+    return None
+
+
+def aggregate(entries, stages):
+    """ Returns an iterator over the results of the aggregation pipeline made
+    of stages, run over entries """
+    return Pipeline(stages).run(entries)
@@ -0,0 +1,118 @@
+"""
+Asynchronous matching of the objects of (async) iterables, in micro-batches
+giving control back to the event loop in between.
+"""
+
+import asyncio
+from itertools import islice
+
+from .planner import estimate_cost
+
+
+def _matching_indices(query, batch):
+    """ Returns the indices of the entries of batch matching query. Run in
+    executors, where queries are sent rather than their (unpicklable) compiled
+    matchers """
+    matcher = query._matcher
+    return [index for index, entry in enumerate(batch) if matcher(entry)]
+
+
+async def _batches(entries, batch_size, latency):
+    """ Yields lists of at most batch_size entries from an iterable or an
+    asynchronous iterable. With latency, a batch of entries of an
+    asynchronous iterable is yielded once its first entry has waited for
+    latency seconds, even if it isn't full. """
+    if not hasattr(entries, "__aiter__"):
+        entries = iter(entries)
+        while True:
+            batch = list(islice(entries, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    batch = []
+    if latency is None:
+        async for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = entries.__aiter__()
+    pending = deadline = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(0, deadline - loop.time()) if batch else None
+            done, _ = await asyncio.wait([pending], timeout=timeout)
+            if not done:
+                yield batch
+                batch = []
+                continue
+            try:
+                entry = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            pending = None
+            if not batch:
+                deadline = loop.time() + latency
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    finally:
+        if pending is not None:
+            pending.cancel()
+    if batch:
+        yield batch
+
+
+def afilter_batches(query, entries, batch_size=1000, executor=None,
+                    offload_cost=None, latency=None):
+    """ Returns an asynchronous iterator over the lists of the entries
+    matching query of each batch of at most batch_size entries, see
+    `Query.afilter_batches` """
+    if batch_size < 1:
+        raise ValueError("batch_size must be strictly positive")
+    return _afilter_batches(
+        query, entries, batch_size, executor, offload_cost, latency)
+
+
+async def _afilter_batches(query, entries, batch_size, executor,
+                           offload_cost, latency):
+    loop = asyncio.get_running_loop()
+    matcher = query._matcher
+    cost = estimate_cost(query._definition)
+    async for batch in _batches(entries, batch_size, latency):
+        if executor is not None and (
+                offload_cost is None or cost * len(batch) >= offload_cost):
+            indices = await loop.run_in_executor(
+                executor, _matching_indices, query, batch)
+            matches = [batch[index] for index in indices]
+        else:
+            matches = list(filter(matcher, batch))
+            # Matching a batch doesn't give control back to the event loop,
+            # nor may reading the next one.
+            await asyncio.sleep(0)
+        if matches:
+            yield matches
+
+
+def afilter(query, entries, batch_size=1000, executor=None,
+            offload_cost=None, latency=None):
+    """ Returns an asynchronous iterator over the entries matching query, see
+    `Query.afilter` """
+    return _afilter(afilter_batches(
+        query, entries, batch_size, executor, offload_cost, latency))
+
+
+async def _afilter(batches):
+    async for matches in batches:
+        for entry in matches:
+            yield entry
@@ -0,0 +1,144 @@
+"""
+Static analysis of queries: the fields they read, the operators they use, the
+indexes which can narrow them down and a rough estimate of their cost.
+"""
+
+from collections.abc import Mapping
+
+from . import Query, QueryError, is_non_string_sequence, string_type
+from .collection import _family, _is_indexable
+from .planner import estimate_cost
+
+
+_RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+
+class QueryAnalysis(object):
+    # pylint: disable=too-few-public-methods
+    """ The result of the static analysis of a query
+
+    - ``paths``: the dotted paths of the fields the query reads, None if it
+      reads whole objects (see `Query.paths`),
+    - ``operators``: the operators the query uses, implicit equalities being
+      reported as ``$eq``,
+    - ``index_eligible``: for each of the paths, ``"any"`` if any index on
+      the path alone can narrow down the objects matching the query in an
+      `IndexedCollection`, ``"ordered"`` if only an ordered index can, or None,
+    - ``cost``: the estimated cost of matching an object (see
+      `planner.estimate_cost`),
+    - ``elem_match_depth``: the deepest nesting of ``$elemMatch`` operators,
+    - ``in_size``: the largest number of values of ``$in``, ``$nin`` and
+      ``$all`` operators.
+    """
+
+    def __init__(self, query):
+        if not isinstance(query, Query):
+            query = Query(query)
+        definition = query._definition
+        self.paths = query.paths
+        self.operators = set()
+        self.elem_match_depth = 0
+        self.in_size = 0
+        self._walk(definition, 0)
+        self.operators = frozenset(self.operators)
+        kinds = _index_kinds(definition)
+        self.index_eligible = {
+            path: kinds.get(path) for path in self.paths or ()}
+        self.cost = estimate_cost(definition)
+
+    def check(self, max_cost=None, max_elem_match_depth=None,
+              max_in_size=None):
+        """ Raises a QueryError if the query exceeds any of the limits """
+        for name, value, limit in [
+                ("cost", self.cost, max_cost),
+                ("$elemMatch depth", self.elem_match_depth,
+                 max_elem_match_depth),
+                ("$in size", self.in_size, max_in_size)]:
+            if limit is not None and value > limit:
+                raise QueryError(
+                    "query {} {} exceeds {}".format(name, value, limit))
+
+    def _walk(self, condition, elem_match_depth, field=False):
+        """ Collects the operators of a condition, which applies to a field
+        when field is True """
+        if not isinstance(condition, Mapping):
+            if field:
+                self.operators.add("$eq")
+            return
+        for operator, sub_condition in condition.items():
+            if not isinstance(operator, string_type) or \
+                    not operator.startswith("$"):
+                self._walk(sub_condition, elem_match_depth, field=True)
+                continue
+            self.operators.add(operator)
+            if operator in ("$in", "$nin", "$all") and \
+                    is_non_string_sequence(sub_condition):
+                self.in_size = max(self.in_size, len(sub_condition))
+            if operator in ("$and", "$or", "$nor", "$all") and \
+                    is_non_string_sequence(sub_condition):
+                for sub in sub_condition:
+                    self._walk(sub, elem_match_depth, field)
+            elif operator == "$elemMatch":
+                self.elem_match_depth = max(
+                    self.elem_match_depth, elem_match_depth + 1)
+                self._walk(sub_condition, elem_match_depth + 1)
+            elif operator in ("$not", "$size"):
+                self._walk(sub_condition, elem_match_depth, field)
+
+
+def analyze(query):
+    """ Returns the `QueryAnalysis` of query, given either as a Query or as a
+    query definition """
+    return QueryAnalysis(query)
+
+
+def _merge(kinds, path, kind):
+    """ Records that an index of kind can narrow down path, any index being
+    better than an ordered one """
+    if kind is not None and kinds.get(path) != "any":
+        kinds[path] = kind
+
+
+def _index_kinds(condition):
+    """ Returns the kinds of indexes which can narrow down the objects
+    matching condition, by path, following `IndexedCollection._candidates` """
+    kinds = {}
+    if not isinstance(condition, Mapping):
+        return kinds
+    for operator, sub_condition in condition.items():
+        if not isinstance(operator, string_type):
+            continue
+        if operator == "$and" and is_non_string_sequence(sub_condition):
+            for sub in sub_condition:
+                for path, kind in _index_kinds(sub).items():
+                    _merge(kinds, path, kind)
+        elif operator == "$or" and is_non_string_sequence(sub_condition):
+            branches = [_index_kinds(sub) for sub in sub_condition]
+            if not branches:
+                continue
+            for path in set(branches[0]).intersection(*branches[1:]):
+                ordered = any(
+                    branch[path] == "ordered" for branch in branches)
+                _merge(kinds, path, "ordered" if ordered else "any")
+        elif not operator.startswith("$"):
+            _merge(kinds, operator, _field_index_kind(sub_condition))
+    return kinds
+
+
+def _field_index_kind(condition):
+    if not isinstance(condition, Mapping):
+        return "any" if _is_indexable(condition) else None
+    if "$exists" in condition:
+        return None
+    families = set()
+    for operator, value in condition.items():
+        if operator == "$eq" and _is_indexable(value):
+            return "any"
+        if operator == "$in" and is_non_string_sequence(value) and \
+                all(_is_indexable(item) for item in value):
+            return "any"
+        if operator in _RANGE_OPERATORS:
+            families.add(_family(value))
+    if len(families) == 1 and families <= set(["number", "string"]):
+        return "ordered"
+    return None
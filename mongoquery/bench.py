@@ -0,0 +1,236 @@
+"""
+Benchmarks of query matching over synthetic collections.
+
+Run with ``python -m mongoquery.bench``, see ``--help`` for options. Results
+can be written as JSON and compared against the results of another run, for
+instance of a previous release.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+
+from . import Query
+
+
+#############
+# Generators
+#############
+
+_WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf"]
+
+
+def flat_documents(count, seed=0):
+    """ Returns count documents made of scalar fields """
+    rand = random.Random(seed)
+    return [
+        {
+            "id": index,
+            "qty": rand.randint(0, 100),
+            "price": round(rand.uniform(0, 50), 2),
+            "type": rand.choice(_WORDS),
+            "active": rand.random() < 0.5,
+            "note": None if rand.random() < 0.2 else " ".join(
+                rand.choice(_WORDS) for _ in range(5)),
+        }
+        for index in range(count)
+    ]
+
+
+def nested_documents(count, seed=0, depth=5):
+    """ Returns count documents holding their fields depth levels deep """
+    rand = random.Random(seed)
+    documents = []
+    for index in range(count):
+        leaf = {
+            "qty": rand.randint(0, 100),
+            "type": rand.choice(_WORDS),
+        }
+        for level in reversed(range(depth)):
+            leaf = {"level{}".format(level): leaf, "id": index}
+        documents.append(leaf)
+    return documents
+
+
+def array_documents(count, seed=0, length=20):
+    """ Returns count documents holding arrays of scalars and of
+    sub-documents """
+    rand = random.Random(seed)
+    return [
+        {
+            "id": index,
+            "tags": rand.sample(_WORDS, rand.randint(0, len(_WORDS))),
+            "ratings": [rand.randint(0, 10) for _ in range(length)],
+            "items": [
+                {
+                    "sku": "{}-{}".format(rand.choice(_WORDS), item),
+                    "qty": rand.randint(0, 100),
+                }
+                for item in range(length)
+            ],
+        }
+        for index in range(count)
+    ]
+
+
+_SHAPES = {
+    "flat": flat_documents,
+    "nested": nested_documents,
+    "array": array_documents,
+}
+
+_NESTED = "level0.level1.level2.level3.level4"
+
+# Benchmark cases, as (name, document shape, query definition).
+CASES = [
+    ("equality", "flat", {"type": "delta"}),
+    ("comparison", "flat", {"qty": {"$gte": 20, "$lt": 60}}),
+    ("ne", "flat", {"type": {"$ne": "delta"}}),
+    ("in", "flat", {"qty": {"$in": list(range(0, 100, 3))}}),
+    ("in_large", "flat", {"id": {"$in": list(range(0, 100000, 7))}}),
+    ("nin", "flat", {"type": {"$nin": ["alpha", "echo"]}}),
+    ("exists", "flat", {"note": {"$exists": True}}),
+    ("type", "flat", {"price": {"$type": "double"}}),
+    ("mod", "flat", {"qty": {"$mod": [7, 3]}}),
+    ("regex", "flat", {"note": {"$regex": "/^ECHO.*golf$/i"}}),
+    ("and", "flat", {"$and": [{"qty": {"$gt": 10}}, {"active": True}]}),
+    ("or", "flat", {"$or": [{"type": "alpha"}, {"qty": {"$lt": 5}}]}),
+    ("nor", "flat", {"$nor": [{"type": "alpha"}, {"qty": {"$lt": 5}}]}),
+    ("not", "flat", {"qty": {"$not": {"$gt": 50}}}),
+    ("mixed", "flat", {
+        "note": {"$regex": "charlie"}, "type": "golf", "qty": {"$gt": 30}}),
+    ("nested_equality", "nested", {_NESTED + ".type": "delta"}),
+    ("nested_comparison", "nested", {_NESTED + ".qty": {"$gt": 50}}),
+    ("nested_exists", "nested", {_NESTED + ".type": {"$exists": True}}),
+    ("array_contains", "array", {"tags": "delta"}),
+    ("array_fan_out", "array", {"items.sku": "delta-3"}),
+    ("array_index", "array", {"items.3.qty": {"$gt": 50}}),
+    ("array_all", "array", {"tags": {"$all": ["alpha", "echo"]}}),
+    ("array_size", "array", {"ratings": {"$size": 20}}),
+    ("array_elem_match", "array", {
+        "items": {"$elemMatch": {"qty": {"$gt": 90}, "sku": {"$regex": "^a"}}}
+    }),
+]
+
+DEFAULT_SIZES = (100, 10000)
+
+
+######
+# Runs
+######
+
+def run_case(name, shape, definition, size, repeat=5, seed=0):
+    """ Times matching a collection of size documents of shape against the
+    definition, returning a dict of results """
+    documents = _SHAPES[shape](size, seed)
+    query = Query(definition)
+    timer = timeit.Timer(lambda: query.count(documents))
+    number = max(1, 10000 // size)
+    timings = [timing / number for timing in timer.repeat(repeat, number)]
+    compilation = min(timeit.Timer(lambda: Query(definition)).repeat(3, 100))
+    return {
+        "name": name,
+        "shape": shape,
+        "size": size,
+        "matched": query.count(documents),
+        "best": min(timings),
+        "mean": sum(timings) / len(timings),
+        "per_document": min(timings) / size,
+        "compilation": compilation / 100,
+    }
+
+
+def run(sizes=DEFAULT_SIZES, repeat=5, names=None, seed=0):
+    """ Runs the benchmark cases whose name contains any of names (all of them
+    by default) for each collection size """
+    results = []
+    for name, shape, definition in CASES:
+        if names and not any(part in name for part in names):
+            continue
+        for size in sizes:
+            results.append(
+                run_case(name, shape, definition, size, repeat, seed))
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "results": results,
+    }
+
+
+def compare(results, baseline):
+    """ Returns the ratio of the best timing of each result to the one of the
+    same case in baseline, keyed by (name, size) """
+    previous = {
+        (result["name"], result["size"]): result["best"]
+        for result in baseline["results"]
+    }
+    return {
+        (result["name"], result["size"]):
+            result["best"] / previous[(result["name"], result["size"])]
+        for result in results["results"]
+        if (result["name"], result["size"]) in previous
+    }
+
+
+def format_results(results, ratios=None):
+    """ Returns a human readable table of the results """
+    lines = ["{:<20} {:>7} {:>8} {:>12} {:>12} {:>12}".format(
+        "case", "size", "matched", "best (s)", "per doc (ns)",
+        "vs baseline")]
+    for result in results["results"]:
+        ratio = (ratios or {}).get((result["name"], result["size"]))
+        lines.append("{:<20} {:>7} {:>8} {:>12.6f} {:>12.1f} {:>12}".format(
+            result["name"], result["size"], result["matched"],
+            result["best"], result["per_document"] * 1e9,
+            "" if ratio is None else "{:.2f}x".format(ratio)))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(
+        prog="python -m mongoquery.bench",
+        description="Benchmarks mongoquery over synthetic collections.")
+    parser.add_argument(
+        "cases", nargs="*",
+        help="only run the cases whose name contains one of these")
+    parser.add_argument(
+        "--sizes", type=lambda sizes: [int(size) for size in sizes.split(",")],
+        default=list(DEFAULT_SIZES),
+        help="comma separated collection sizes (default: %(default)s)")
+    parser.add_argument(
+        "--repeat", type=int, default=5,
+        help="number of timings per case, the best is kept "
+             "(default: %(default)s)")
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="seed of the document generators (default: %(default)s)")
+    parser.add_argument(
+        "--json", metavar="FILE",
+        help="write the results as JSON to FILE, '-' for stdout")
+    parser.add_argument(
+        "--compare", metavar="FILE",
+        help="compare the results to the JSON results of a previous run")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.cases, args.seed)
+    ratios = None
+    if args.compare:
+        with open(args.compare) as baseline:
+            ratios = compare(results, json.load(baseline))
+
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    print(format_results(results, ratios))
+
+
+if __name__ == "__main__":
+    main()
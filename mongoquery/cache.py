@@ -0,0 +1,215 @@
+"""
+Memoization of the results of matching objects against a query, for objects
+matched repeatedly between their changes, and of the queries compiled from
+recurring definitions.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from . import Query, is_non_string_sequence, string_type
+from .planner import _ordered, may_raise
+
+
+_ABSENT = object()
+
+
+class _Unkeyable(Exception):
+    """ Raised when a value can't be turned into a cache key """
+
+
+def _freeze(value):
+    """ Returns a hashable key equal for values any query matches the same
+    way, types being part of it (True and 1 don't match the same $type) """
+    if isinstance(value, Mapping):
+        return (dict, tuple(
+            (_freeze(key), _freeze(item)) for key, item in value.items()))
+    if is_non_string_sequence(value):
+        # Lists, tuples and bytes don't compare equal to each other.
+        return (type(value), tuple(_freeze(item) for item in value))
+    try:
+        hash(value)
+    except TypeError:
+        raise _Unkeyable()
+    return (type(value), value)
+
+
+def _canonical(definition):
+    """ Returns a hashable key equal for query definitions matching the same
+    way, regardless of the order of the keys of their mappings (which are
+    conjunctions of conditions, or compared as dicts), except for conditions
+    which may raise, which keep their position as they decide whether the
+    conditions after them are evaluated. Types are part of it, as for
+    `_freeze`. """
+    if isinstance(definition, Mapping):
+        items = [
+            (_canonical(key), _canonical(item))
+            for key, item in definition.items()]
+        fixed = [
+            may_raise({key: item}) for key, item in definition.items()]
+        return (dict, tuple(
+            items[index] for index in _ordered(
+                range(len(items)), lambda index: repr(items[index][0]),
+                fixed)))
+    if is_non_string_sequence(definition):
+        # Lists and tuples don't compare equal to each other.
+        return (type(definition), tuple(
+            _canonical(item) for item in definition))
+    try:
+        hash(definition)
+    except TypeError:
+        raise _Unkeyable()
+    return (type(definition), definition)
+
+
+class CachedQuery(object):
+    """ Wraps a Query to cache the results of `match`, in a bounded least
+    recently used cache
+
+    Results are cached under the key and version of objects when given to
+    `match` (for instance an id and a modification counter), a newer version
+    replacing the result of the previous one. Otherwise they are cached under
+    the values of the top-level fields the query refers to, so that objects
+    don't need to be hashable. Fingerprinting these values costs about as
+    much as copying them, which pays off for expensive queries, or for the
+    objects of a collection referenced by key.
+
+    Results expire after ttl seconds when given. Cache hits, misses and
+    evictions are counted.
+    """
+
+    def __init__(self, query, maxsize=1024, ttl=None, clock=time.monotonic):
+        if not isinstance(query, Query):
+            query = Query(query)
+        self.query = query
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._matcher = query._matcher
+        paths = query.paths
+        self._keys = None if paths is None else sorted(set(
+            path.split(".")[0] if isinstance(path, string_type) else path
+            for path in paths
+        ), key=repr)
+        self._results = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def match(self, entry, key=None, version=None):
+        """ Matches the entry object against the query, unless its result is
+        cached under key and version, or under the fields the query refers
+        to when key isn't given """
+        if key is None:
+            key = self._fingerprint(entry)
+            if key is _ABSENT:
+                self.misses += 1
+                return self._matcher(entry)
+
+        results = self._results
+        cached = results.get(key)
+        if cached is not None:
+            cached_version, result, expiry = cached
+            if cached_version == version and (
+                    expiry is None or self._clock() < expiry):
+                results.move_to_end(key)
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        result = self._matcher(entry)
+        expiry = None if self.ttl is None else self._clock() + self.ttl
+        results[key] = (version, result, expiry)
+        results.move_to_end(key)
+        if len(results) > self.maxsize:
+            results.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def filter(self, entries):
+        """ Returns an iterator over the entries matching the query """
+        return filter(self.match, entries)
+
+    def invalidate(self, key):
+        """ Discards the result cached under key """
+        self._results.pop(key, None)
+
+    def clear(self):
+        """ Discards all the cached results """
+        self._results.clear()
+
+    def _fingerprint(self, entry):
+        """ Returns a key made of the values of the fields of entry the query
+        refers to, _ABSENT if there isn't any """
+        if self._keys is None or type(entry) is not dict:
+            return _ABSENT
+        try:
+            # Tagged so as not to collide with keys given to match.
+            return _ABSENT, tuple(
+                _freeze(entry.get(key, _ABSENT)) for key in self._keys)
+        except _Unkeyable:
+            return _ABSENT
+
+
+class QueryCache(object):
+    """ A bounded least recently used cache of the queries compiled from
+    definitions, shared by equivalent definitions (see `Query.cached`)
+
+    Definitions are copied before being compiled, so that the cached queries
+    aren't affected by changes of the definitions they were created from.
+    Definitions holding unhashable values other than mappings and sequences
+    are compiled anew every time. Cache hits, misses and evictions are
+    counted. Caches can be used from several threads.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._queries)
+
+    def get(self, definition, query_class=Query):
+        """ Returns the query_class query of definition, compiling it unless
+        it is cached """
+        try:
+            key = (query_class, _canonical(definition))
+        except _Unkeyable:
+            with self._lock:
+                self.misses += 1
+            return query_class(definition)
+
+        queries = self._queries
+        with self._lock:
+            query = queries.get(key)
+            if query is not None:
+                queries.move_to_end(key)
+                self.hits += 1
+                return query
+
+        # Compiled outside of the lock, a definition compiled concurrently by
+        # several threads being cached once.
+        query = query_class(copy.deepcopy(definition))
+        with self._lock:
+            self.misses += 1
+            query = queries.setdefault(key, query)
+            queries.move_to_end(key)
+            if len(queries) > self.maxsize:
+                queries.popitem(last=False)
+                self.evictions += 1
+        return query
+
+    def clear(self):
+        """ Discards all the cached queries """
+        with self._lock:
+            self._queries.clear()
+
+
+# The cache of `Query.cached`.
+query_cache = QueryCache()
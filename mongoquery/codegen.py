@@ -0,0 +1,230 @@
+"""
+Code generation backend translating query definitions into specialised Python
+source, compiled once into a single matching function.
+"""
+
+import math
+from collections.abc import Mapping
+from functools import lru_cache
+from itertools import count
+
+from . import Query, _MISSING, _Undefined, is_non_string_sequence, \
+    string_type
+
+
+# Types of values comparisons are inlined for, along with the types values
+# compared to them may have without being matched by the compiled matcher.
+_NUMBERS = frozenset([int, float, bool])
+_SCALARS = frozenset([int, float, bool, str, type(None), _Undefined])
+# Values of these types only match a literal when equal to it.
+_INERT = _SCALARS | frozenset([dict])
+
+# Stands for the value of a path going through a value which isn't a dict.
+_SKIPPED = object()
+
+_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+# Paths longer than this are extracted by their _Path rather than inlined.
+_MAX_INLINED_KEYS = 8
+
+
+@lru_cache(maxsize=256)
+def _compile_source(source):
+    """ Compiles generated source, once for all the queries generating it """
+    return compile(source, "<mongoquery>", "exec")
+
+
+class _Generator(object):
+    """ Generates the source of the functions matching a query definition,
+    and the namespace of the values they refer to """
+
+    def __init__(self, query):
+        self._query = query
+        self._names = count()
+        self._functions = []
+        self.namespace = {"_M": _MISSING, "_S": _SKIPPED, "_U": _Undefined}
+        for name in ("_NUMBERS", "_SCALARS", "_INERT"):
+            self.namespace[name] = globals()[name]
+
+    def generate(self, definition):
+        """ Returns the source of a module defining `match`, the matching
+        function of definition """
+        name = self._function(definition)
+        return "\n\n".join(self._functions + ["match = {}\n".format(name)])
+
+    def _name(self, prefix, value):
+        """ Returns a new global name bound to value """
+        name = "_{}{}".format(prefix, next(self._names))
+        self.namespace[name] = value
+        return name
+
+    def _constant(self, value):
+        """ Returns a source expression evaluating to value """
+        if type(value) in (int, bool, str, type(None)) or (
+                type(value) is float and math.isfinite(value)):
+            return repr(value)
+        return self._name("c", value)
+
+    def _function(self, definition):
+        """ Generates a function matching entries against a query definition,
+        returning its name """
+        name = "_q{}".format(next(self._names))
+        lines = ["def {}(entry):".format(name)]
+        self._conjunction(definition, lines, 1)
+        lines.append("    return True")
+        self._functions.append("\n".join(lines))
+        return name
+
+    def _conjunction(self, definition, lines, depth):
+        """ Generates the statements returning False unless entry matches all
+        the conditions of definition """
+        indent = "    " * depth
+        if not isinstance(definition, Mapping) or (
+                "$options" in definition and "$regex" in definition):
+            matcher = self._name("m", self._query._compile(definition))
+            lines.append("{}if not {}(entry):".format(indent, matcher))
+            lines.append("{}    return False".format(indent))
+            return
+
+        for operator, condition in definition.items():
+            if operator == "$and" and is_non_string_sequence(condition):
+                for sub in condition:
+                    self._conjunction(sub, lines, depth)
+            elif operator in ("$or", "$nor") and \
+                    is_non_string_sequence(condition):
+                calls = " or ".join(
+                    "{}(entry)".format(self._function(sub))
+                    for sub in condition) or "False"
+                test = "not ({})" if operator == "$or" else "{}"
+                lines.append(
+                    "{}if {}:".format(indent, test.format(calls)))
+                lines.append("{}    return False".format(indent))
+            elif operator == "$comment":
+                continue
+            elif isinstance(operator, string_type) and \
+                    not operator.startswith("$") and not (
+                        isinstance(condition, Mapping) and
+                        "$exists" in condition):
+                self._field(operator, condition, lines, depth)
+            else:
+                matcher = self._name(
+                    "m", self._query._compile_condition(operator, condition))
+                lines.append("{}if not {}(entry):".format(indent, matcher))
+                lines.append("{}    return False".format(indent))
+
+    def _field(self, path, condition, lines, depth):
+        """ Generates the statements matching the field at path against
+        condition """
+        indent = "    " * depth
+        keys = tuple(path.split("."))
+        matcher = self._name(
+            "f", self._query._compile_path(keys, condition))
+        if not self._query._field_path(keys).lazy or \
+                len(keys) > _MAX_INLINED_KEYS:
+            lines.append("{}if not {}(entry):".format(indent, matcher))
+            lines.append("{}    return False".format(indent))
+            return
+
+        # Values are looked up inline through dicts, anything else along the
+        # path (arrays fanned out over, None, other mappings) being left to
+        # the compiled matcher of the field.
+        value = "v{}".format(next(self._names))
+        parent = "entry"
+        for level, key in enumerate(keys):
+            inner = indent + "    " * level
+            lines.append("{}if type({}) is dict:".format(inner, parent))
+            lines.append("{}    {} = {}.get({!r}, _M)".format(
+                inner, value, parent, key))
+            parent = value
+        for level in reversed(range(len(keys))):
+            inner = indent + "    " * level
+            if level:
+                lines.append("{}elif {} is not _M:".format(inner, value))
+            else:
+                lines.append("{}else:".format(inner))
+            lines.append("{}    {} = _S".format(inner, value))
+        lines.append("{}if {} is _S:".format(indent, value))
+        lines.append("{}    if not {}(entry):".format(indent, matcher))
+        lines.append("{}        return False".format(indent))
+        lines.append("{}else:".format(indent))
+        lines.append("{}    if {} is _M:".format(indent, value))
+        lines.append("{}        {} = _U()".format(indent, value))
+        for test in self._value_tests(condition, value):
+            lines.append("{}    if not {}:".format(indent, test))
+            lines.append("{}        return False".format(indent))
+
+    def _value_tests(self, condition, value):
+        """ Returns the expressions testing the variable named value against
+        a value condition, falling back on compiled matchers for the types of
+        values they aren't specialised for """
+        if not isinstance(condition, Mapping) or (
+                "$options" in condition and "$regex" in condition):
+            matcher = self._name("m", self._query._compile(condition))
+            if isinstance(condition, (Mapping, list)):
+                return ["{}({})".format(matcher, value)]
+            # Only lists hold the literal as an element, values of other
+            # types are equal to it or don't match.
+            literal = self._constant(condition)
+            return [
+                "({literal} == {value} or ({literal} in {value} "
+                "if type({value}) is list else "
+                "type({value}) not in _INERT and {matcher}({value})))".format(
+                    literal=literal, value=value, matcher=matcher)
+            ]
+        return [
+            self._operator_test(operator, sub_condition, value)
+            for operator, sub_condition in condition.items()
+        ]
+
+    def _operator_test(self, operator, condition, value):
+        matcher = self._name(
+            "m", self._query._compile_condition(operator, condition))
+        fallback = "{}({})".format(matcher, value)
+        if operator in _COMPARISONS:
+            # Comparisons between numbers, or between strings, can't raise
+            # the TypeError the compiled matchers swallow.
+            if type(condition) in _NUMBERS:
+                guard = "type({}) in _NUMBERS".format(value)
+            elif type(condition) is str:
+                guard = "type({}) is str".format(value)
+            else:
+                return fallback
+            return "({} {} {} if {} else {})".format(
+                value, _COMPARISONS[operator], self._constant(condition),
+                guard, fallback)
+        if operator == "$eq" and type(condition) in _SCALARS:
+            return "({} == {} if type({}) in _INERT else {})".format(
+                value, self._constant(condition), value, fallback)
+        if operator == "$ne":
+            return "{} != {}".format(value, self._constant(condition))
+        if operator in ("$in", "$nin") and \
+                is_non_string_sequence(condition) and \
+                all(type(item) in _SCALARS for item in condition):
+            if operator == "$nin":
+                fallback = "{}({})".format(
+                    self._name("m", self._query._in(condition)), value)
+            members = self._name("c", frozenset(condition))
+            test = "({} in {} if type({}) in _SCALARS else {})".format(
+                value, members, value, fallback)
+            return test if operator == "$in" else "not " + test
+        return fallback
+
+
+class CompiledQuery(Query):
+    """ A Query compiled into the source of a single Python function, in
+    which values are looked up through dicts and compared inline
+
+    Conditions on values of other types than the ones they are specialised
+    for (arrays fanned out over, values comparisons may raise a TypeError
+    for...) fall back on the compiled matchers of `Query`, so that results
+    are the same. The generated source is available as `source`, and its
+    compiled code is cached and shared by the queries generating it.
+    """
+
+    def __init__(self, definition):
+        super(CompiledQuery, self).__init__(definition)
+        generator = _Generator(self)
+        self.source = generator.generate(definition)
+        namespace = generator.namespace
+        exec(_compile_source(self.source), namespace)
+        self._matcher = namespace["match"]
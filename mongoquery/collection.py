@@ -0,0 +1,381 @@
+"""
+In-memory collection of objects maintaining secondary indexes on field paths,
+used to narrow down the objects a query has to be matched against.
+"""
+
+import math
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping
+
+from . import Query, _Path, _Undefined, is_non_string_sequence, regex_type, \
+    string_type
+
+
+# Index keys sorted in separate lists for values of these families, as values
+# of different families can't be ordered against each other.
+_NUMBER_TYPES = frozenset([int, float, bool])
+_STRING_TYPES = frozenset([str])
+
+
+def _extract(document, path):
+    try:
+        return path.extract(document)
+    except IndexError:
+        return _Undefined()
+
+
+def _is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _is_indexable(value):
+    """ Tells whether objects equal to value, or holding it, can be looked up
+    in an index (regular expressions match values rather than being equal to
+    them) """
+    return _is_hashable(value) and not isinstance(value, regex_type)
+
+
+def _family(value):
+    """ Returns the family of values value can be ordered against, None if it
+    can't be ordered against numbers and strings, and "other" if its ordering
+    is unknown """
+    kind = type(value)
+    if kind in _NUMBER_TYPES:
+        if kind is float and math.isnan(value):
+            return "other"
+        return "number"
+    if kind in _STRING_TYPES:
+        return "string"
+    if value is None or isinstance(value, (_Undefined, Mapping)) or \
+            is_non_string_sequence(value):
+        return None
+    return "other"
+
+
+class _Index(object):
+    """ Hash index of the values found at a path, used for equality and $in
+    conditions """
+
+    def __init__(self, path):
+        self.path = _Path(path.split("."))
+        self._ids_by_key = {}
+        self._keys_by_id = {}
+
+    def add(self, doc_id, document):
+        """ Indexes the document stored under doc_id """
+        value = _extract(document, self.path)
+        keys = set()
+        # A value is matched by equality to itself, or to any of its elements
+        # when it is a sequence.
+        if _is_hashable(value) and not isinstance(value, _Undefined):
+            keys.add(value)
+        if is_non_string_sequence(value):
+            keys.update(item for item in value if _is_hashable(item))
+        for key in keys:
+            self._ids_by_key.setdefault(key, set()).add(doc_id)
+        self._keys_by_id[doc_id] = keys
+        return value
+
+    def remove(self, doc_id):
+        """ Removes the document stored under doc_id from the index """
+        for key in self._keys_by_id.pop(doc_id, ()):
+            ids = self._ids_by_key[key]
+            ids.discard(doc_id)
+            if not ids:
+                del self._ids_by_key[key]
+
+    def equal(self, values):
+        """ Returns the ids of the documents which may hold any of the values
+        at the path, or None if some of the values can't be looked up """
+        ids = set()
+        for value in values:
+            if not _is_indexable(value):
+                return None
+            ids.update(self._ids_by_key.get(value, ()))
+        return ids
+
+    def range(self, lower, lower_inclusive, upper, upper_inclusive):
+        # pylint: disable=unused-argument,no-self-use
+        """ Returns the ids of the documents which may hold a value within the
+        range at the path, or None if the index can't tell """
+        return None
+
+
+class _OrderedIndex(_Index):
+    """ Index which also keeps the values found at a path sorted, used for
+    range conditions on top of equality ones """
+
+    def __init__(self, path):
+        super(_OrderedIndex, self).__init__(path)
+        self._sorted = {"number": [], "string": []}
+        self._others = set()
+        self._sorted_by_id = {}
+
+    def add(self, doc_id, document):
+        value = super(_OrderedIndex, self).add(doc_id, document)
+        family = _family(value)
+        if family == "other":
+            self._others.add(doc_id)
+        elif family is not None:
+            insort(self._sorted[family], (value, doc_id))
+        self._sorted_by_id[doc_id] = (family, value)
+        return value
+
+    def remove(self, doc_id):
+        super(_OrderedIndex, self).remove(doc_id)
+        family, value = self._sorted_by_id.pop(doc_id, (None, None))
+        if family == "other":
+            self._others.discard(doc_id)
+        elif family is not None:
+            values = self._sorted[family]
+            del values[bisect_left(values, (value, doc_id))]
+
+    def range(self, lower, lower_inclusive, upper, upper_inclusive):
+        families = set(
+            _family(bound) for bound in (lower, upper) if bound is not None)
+        if len(families) != 1 or not families <= set(self._sorted):
+            return None
+        values = self._sorted[families.pop()]
+
+        start, stop = 0, len(values)
+        # Document ids are positive, so these bound all the ids of a value.
+        if lower is not None:
+            if lower_inclusive:
+                start = bisect_left(values, (lower, -1))
+            else:
+                start = bisect_right(values, (lower, float("inf")))
+        if upper is not None:
+            if upper_inclusive:
+                stop = bisect_right(values, (upper, float("inf")))
+            else:
+                stop = bisect_left(values, (upper, -1))
+
+        ids = set(doc_id for _, doc_id in values[start:stop])
+        ids.update(self._others)
+        return ids
+
+
+class IndexedCollection(object):
+    """ A collection of objects, along with indexes on some of their field
+    paths used to avoid matching queries against every object
+
+    Indexes are used to select candidate objects, which are then matched
+    against the whole query, so that results are always the same as the ones
+    of `Query.match`. Objects modified in place have to be passed to `update`
+    for the indexes to reflect their changes.
+    """
+
+    def __init__(self, documents=()):
+        self._documents = {}
+        self._indexes = {}
+        self._listeners = []
+        self._next_id = 1
+        for document in documents:
+            self.insert(document)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __iter__(self):
+        return iter(self._documents.values())
+
+    def get(self, doc_id):
+        """ Returns the object stored under doc_id """
+        return self._documents[doc_id]
+
+    ##########
+    # Indexes
+    ##########
+
+    def create_index(self, path, ordered=False):
+        """ Indexes the values found at the dotted path. Ordered indexes also
+        support range conditions ($gt, $gte, $lt, $lte) """
+        index = (_OrderedIndex if ordered else _Index)(path)
+        for doc_id, document in self._documents.items():
+            index.add(doc_id, document)
+        self._indexes[path] = index
+
+    def drop_index(self, path):
+        """ Removes the index on path """
+        del self._indexes[path]
+
+    @property
+    def indexes(self):
+        """ Returns the paths which are indexed """
+        return list(self._indexes)
+
+    ################
+    # Modifications
+    ################
+
+    def insert(self, document):
+        """ Adds the object to the collection and returns its id """
+        doc_id = self._next_id
+        self._next_id += 1
+        self._documents[doc_id] = document
+        for index in self._indexes.values():
+            index.add(doc_id, document)
+        self._notify("insert", doc_id, document, None)
+        return doc_id
+
+    def update(self, doc_id, document=None, changed=None):
+        """ Replaces the object stored under doc_id with document, or reindexes
+        it when it has been modified in place and document isn't given.
+
+        changed is the dotted paths of the fields which changed, if known.
+        It is computed for the top-level fields of replaced objects. """
+        previous = self._documents[doc_id]
+        if document is None:
+            document = previous
+        elif changed is None and document is not previous and \
+                isinstance(previous, Mapping) and \
+                isinstance(document, Mapping):
+            # Objects modified in place and passed back can't be compared
+            # with their previous version.
+            changed = _changed_keys(previous, document)
+        self._documents[doc_id] = document
+        for index in self._indexes.values():
+            index.remove(doc_id)
+            index.add(doc_id, document)
+        self._notify(
+            "update", doc_id, document,
+            None if changed is None else frozenset(changed))
+
+    def remove(self, doc_id):
+        """ Removes the object stored under doc_id and returns it """
+        document = self._documents.pop(doc_id)
+        for index in self._indexes.values():
+            index.remove(doc_id)
+        self._notify("remove", doc_id, document, None)
+        return document
+
+    ##########
+    # Changes
+    ##########
+
+    def subscribe(self, listener):
+        """ Calls listener(event, doc_id, document, changed) on every change
+        of the collection, event being "insert", "update" or "remove", and
+        changed the paths of the fields an update changed, None if unknown """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """ Stops calling listener on changes """
+        self._listeners.remove(listener)
+
+    def _notify(self, event, doc_id, document, changed):
+        for listener in self._listeners:
+            listener(event, doc_id, document, changed)
+
+    ##########
+    # Queries
+    ##########
+
+    def find_ids(self, query):
+        """ Returns an iterator over the ids of the objects matching query,
+        given either as a Query or as a query definition """
+        if not isinstance(query, Query):
+            query = Query(query)
+        candidates = self._candidates(query._definition)
+        documents = self._documents
+        match = query.match
+        if candidates is None:
+            return (
+                doc_id for doc_id, document in documents.items()
+                if match(document)
+            )
+        return (
+            doc_id for doc_id in sorted(candidates)
+            if match(documents[doc_id])
+        )
+
+    def find(self, query):
+        """ Returns an iterator over the objects matching query, given either
+        as a Query or as a query definition """
+        documents = self._documents
+        return (documents[doc_id] for doc_id in self.find_ids(query))
+
+    def count(self, query):
+        """ Returns the number of objects matching query """
+        return sum(1 for _ in self.find_ids(query))
+
+    ##########
+    # Planner
+    ##########
+
+    def _candidates(self, condition):
+        """ Returns the ids of the objects which may match condition, or None
+        if the indexes can't narrow them down """
+        if not isinstance(condition, Mapping):
+            return None
+        candidates = []
+        for operator, sub_condition in condition.items():
+            if not isinstance(operator, string_type):
+                continue
+            if operator == "$and" and is_non_string_sequence(sub_condition):
+                ids = _intersect([
+                    self._candidates(sub) for sub in sub_condition])
+            elif operator == "$or" and is_non_string_sequence(sub_condition):
+                ids = _union([
+                    self._candidates(sub) for sub in sub_condition])
+            elif operator in self._indexes:
+                ids = self._field_candidates(
+                    self._indexes[operator], sub_condition)
+            else:
+                continue
+            candidates.append(ids)
+        return _intersect(candidates)
+
+    @staticmethod
+    def _field_candidates(index, condition):
+        if not isinstance(condition, Mapping):
+            return index.equal([condition])
+        if "$exists" in condition:
+            return None
+
+        candidates = []
+        lower = upper = None
+        lower_inclusive = upper_inclusive = False
+        for operator, value in condition.items():
+            if operator == "$eq":
+                candidates.append(index.equal([value]))
+            elif operator == "$in" and is_non_string_sequence(value):
+                candidates.append(index.equal(value))
+            elif operator in ("$gt", "$gte"):
+                lower, lower_inclusive = value, operator == "$gte"
+            elif operator in ("$lt", "$lte"):
+                upper, upper_inclusive = value, operator == "$lte"
+        if lower is not None or upper is not None:
+            candidates.append(
+                index.range(lower, lower_inclusive, upper, upper_inclusive))
+        return _intersect(candidates)
+
+
+def _changed_keys(previous, document):
+    """ Returns the keys of the fields which differ between two objects """
+    missing = _Undefined()
+    return [
+        key for key in set(previous).union(document)
+        if previous.get(key, missing) is not document.get(key, missing) and
+        previous.get(key, missing) != document.get(key, missing)
+    ]
+
+
+def _intersect(candidates):
+    """ Intersects sets of candidates, None standing for all the objects """
+    candidates = sorted(
+        (ids for ids in candidates if ids is not None), key=len)
+    if not candidates:
+        return None
+    return candidates[0].intersection(*candidates[1:])
+
+
+def _union(candidates):
+    """ Unites sets of candidates, None standing for all the objects """
+    if not candidates or any(ids is None for ids in candidates):
+        return None
+    return set().union(*candidates)
@@ -0,0 +1,194 @@
+"""
+Cursors over the objects matching a query, sorted, skipped and limited like
+the results of MongoDB's ``find``.
+"""
+
+import heapq
+import math
+import numbers
+import re
+from collections.abc import Mapping
+from datetime import datetime
+from itertools import islice
+
+from . import QueryError, _Path, _Undefined, is_non_string_sequence, \
+    string_type
+
+
+# Ranks of the types of values in MongoDB's comparison order, values of lower
+# ranks sorting first.
+_EMPTY_ARRAY = 0
+_NULL = 1
+_NUMBER = 2
+_STRING = 3
+_OBJECT = 4
+_ARRAY = 5
+_BINARY = 6
+_BOOLEAN = 8
+_DATE = 9
+_REGEX = 11
+_OTHER = 12
+
+_REGEX_TYPE = type(re.compile(""))
+
+
+def sort_key(value):
+    """ Returns a key ordering value among values of any type the way MongoDB
+    orders them: null, numbers, strings, objects, arrays, binary data,
+    booleans, dates and regular expressions """
+    if value is None or isinstance(value, _Undefined):
+        return (_NULL,)
+    if isinstance(value, bool):
+        return (_BOOLEAN, value)
+    if isinstance(value, numbers.Number) and not isinstance(value, complex):
+        if isinstance(value, float) and math.isnan(value):
+            # NaN sorts before every other number.
+            return (_NUMBER, 0)
+        return (_NUMBER, 1, value)
+    if isinstance(value, string_type):
+        return (_STRING, value)
+    if isinstance(value, Mapping):
+        return (_OBJECT, tuple(
+            (key_of_value[0], key, key_of_value)
+            for key, key_of_value in (
+                (key, sort_key(item)) for key, item in value.items())
+        ))
+    if isinstance(value, (bytes, bytearray)):
+        return (_BINARY, len(value), bytes(value))
+    if is_non_string_sequence(value):
+        return (_ARRAY, tuple(sort_key(item) for item in value))
+    if isinstance(value, datetime):
+        return (_DATE, value)
+    if isinstance(value, _REGEX_TYPE):
+        return (_REGEX, value.pattern, value.flags)
+    return (_OTHER, type(value).__name__, repr(value))
+
+
+class _Descending(object):
+    # pylint: disable=too-few-public-methods
+    """ Wraps a sort key to reverse its order """
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _leaves(value):
+    """ Yields the values of an array field, and of the arrays it holds """
+    if isinstance(value, list):
+        for item in value:
+            for leaf in _leaves(item):
+                yield leaf
+    else:
+        yield value
+
+
+def _field_key(path, descending):
+    """ Returns a function computing the sort key of an object on the field at
+    path. Arrays sort by their smallest element in ascending order, by their
+    largest one in descending order """
+    extract = _Path(path.split(".")).extract
+    pick = max if descending else min
+
+    def field_key(entry):
+        try:
+            value = extract(entry)
+        except IndexError:
+            value = None
+        if isinstance(value, list):
+            keys = [sort_key(leaf) for leaf in _leaves(value)]
+            key = pick(keys) if keys else (_EMPTY_ARRAY,)
+        else:
+            key = sort_key(value)
+        return _Descending(key) if descending else key
+    return field_key
+
+
+def _compile_sort(specification):
+    """ Compiles a sort specification, given as a mapping or as a sequence of
+    (path, direction) pairs, into a key function """
+    if isinstance(specification, Mapping):
+        specification = list(specification.items())
+    elif isinstance(specification, string_type):
+        specification = [(specification, 1)]
+    fields = []
+    for field in specification:
+        try:
+            path, direction = field
+        except (TypeError, ValueError):
+            raise QueryError("invalid sort field {!r}".format(field))
+        if direction not in (1, -1) or isinstance(direction, bool) or \
+                not isinstance(path, string_type):
+            raise QueryError("invalid sort field {!r}".format(field))
+        fields.append(_field_key(path, direction == -1))
+    if not fields:
+        raise QueryError("sort specifications can't be empty")
+    if len(fields) == 1:
+        return fields[0]
+
+    def entry_key(entry):
+        return tuple(field(entry) for field in fields)
+    return entry_key
+
+
+class Cursor(object):
+    """ A Cursor iterates over the entries matching a query, optionally
+    sorted, skipped and limited, and projected:
+
+        query.find(entries).sort({"age": -1}).skip(10).limit(5)
+
+    Without sort, matches are streamed as entries are consumed. When sorted
+    with a limit, only the first skip + limit matches are kept in memory.
+    """
+
+    def __init__(self, query, entries, projection=None):
+        self._query = query
+        self._entries = entries
+        self._projection = projection
+        self._key = None
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, specification):
+        """ Sorts matches following a MongoDB sort specification, either
+        ``{path: 1 or -1, ...}`` or ``[(path, 1 or -1), ...]`` """
+        self._key = _compile_sort(specification)
+        return self
+
+    def skip(self, count):
+        """ Skips the first count matches """
+        if not isinstance(count, int) or count < 0:
+            raise QueryError("invalid skip {!r}".format(count))
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        """ Yields at most count matches, 0 standing for no limit """
+        if not isinstance(count, int) or count < 0:
+            raise QueryError("invalid limit {!r}".format(count))
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        matches = self._query.filter(self._entries)
+        stop = self._skip + self._limit if self._limit else None
+        if self._key is not None:
+            if stop is None:
+                matches = sorted(matches, key=self._key)
+            else:
+                matches = heapq.nsmallest(stop, matches, key=self._key)
+        matches = islice(matches, self._skip, stop)
+
+        if self._projection is None:
+            return matches
+        from .projection import Projection
+        projection = self._projection
+        if not isinstance(projection, Projection):
+            projection = Projection(projection)
+        return map(projection.apply, matches)
@@ -0,0 +1,201 @@
+"""
+Plans of queries, and instrumented queries counting how many times each node
+of their plan is evaluated, matches, and how long it takes.
+"""
+
+import time
+from collections.abc import Mapping
+
+from . import Query
+
+
+class PlanNode(object):
+    """ A node of the plan of a query: an operator (a field path, a $operator,
+    or $and for the implicit conjunction of a mapping of several conditions)
+    along with its condition, the nodes it evaluates, and the number of times
+    it has been evaluated (calls), has matched, and its cumulated evaluation
+    time, including the one of the nodes it evaluates """
+    __slots__ = (
+        "operator", "condition", "path", "children", "calls", "matched",
+        "time")
+
+    def __init__(self, operator, condition, parent=None):
+        self.operator = operator
+        self.condition = condition
+        self.path = (operator,) if parent is None else \
+            parent.path + (operator,)
+        self.children = []
+        self.calls = self.matched = 0
+        self.time = 0.0
+
+    @property
+    def unmatched(self):
+        return self.calls - self.matched
+
+    @property
+    def self_time(self):
+        """ The time spent evaluating the node, but not the nodes below it,
+        such as extracting the value of a field """
+        return self.time - sum(child.time for child in self.children)
+
+    def walk(self):
+        """ Yields the node and the nodes below it, depth first """
+        yield self
+        for child in self.children:
+            for node in child.walk():
+                yield node
+
+    def reset(self):
+        """ Resets the counters of the node and of the nodes below it """
+        for node in self.walk():
+            node.calls = node.matched = 0
+            node.time = 0.0
+
+    def to_dict(self, stats=True):
+        """ Returns the node as a dict, along with its counters if stats """
+        result = {"operator": self.operator, "condition": self.condition}
+        if stats:
+            result.update(
+                calls=self.calls, matched=self.matched,
+                unmatched=self.unmatched, time=self.time,
+                self_time=self.self_time)
+        result["children"] = [
+            child.to_dict(stats) for child in self.children]
+        return result
+
+
+class InstrumentedQuery(Query):
+    """ A Query counting, for each node of its `plan`, how many times it is
+    evaluated, matches and how long it takes.
+
+    Hooks are called with each evaluated node, its result and the time its
+    evaluation took, for instance to export metrics. Instrumentation only
+    costs when matching with an InstrumentedQuery, Query being left as is.
+
+    Subclasses of other queries are instrumented by deriving from both (see
+    `instrumented_class`), args being passed on to the other query. Queries
+    which don't match through the matchers they compile (such as
+    `codegen.CompiledQuery`) can't be, and raise a TypeError.
+    """
+
+    def __init__(self, definition, hooks=(), *args):
+        # pylint: disable=keyword-arg-before-vararg
+        self.hooks = list(hooks)
+        self.plan = PlanNode("$query", definition)
+        self._parents = [self.plan]
+        self._root = None
+        super(InstrumentedQuery, self).__init__(definition, *args)
+        self._parents = None
+        if self._matcher is not self._root:
+            raise TypeError("{} can't be instrumented".format(
+                type(self).__name__))
+        self._matcher = self._instrument(self.plan, self._matcher)
+
+    def nodes(self):
+        """ Yields the nodes of the plan, depth first """
+        return self.plan.walk()
+
+    def reset(self):
+        """ Resets the counters of the nodes of the plan """
+        self.plan.reset()
+
+    ##############
+    # Compilation
+    ##############
+
+    def _compile(self, condition):
+        compile_ = super(InstrumentedQuery, self)._compile
+        if self._parents[-1] is self.plan:
+            self._root = compile_(condition)
+            return self._root
+        if isinstance(condition, Mapping) and len(condition) > 1:
+            return self._compile_node("$and", condition, compile_, condition)
+        return compile_(condition)
+
+    def _compile_condition(self, operator, condition):
+        return self._compile_node(
+            operator, condition,
+            super(InstrumentedQuery, self)._compile_condition,
+            operator, condition)
+
+    def _compile_node(self, operator, condition, compile_, *args):
+        """ Adds a node to the plan, compiling it with compile_(*args) """
+        parent = self._parents[-1]
+        node = PlanNode(operator, condition, parent)
+        parent.children.append(node)
+        self._parents.append(node)
+        try:
+            matcher = compile_(*args)
+        finally:
+            self._parents.pop()
+        return self._instrument(node, matcher)
+
+    def _instrument(self, node, matcher):
+        hooks = self.hooks
+        clock = time.perf_counter
+
+        def match_instrumented(entry):
+            start = clock()
+            result = matcher(entry)
+            elapsed = clock() - start
+            node.calls += 1
+            if result:
+                node.matched += 1
+            node.time += elapsed
+            for hook in hooks:
+                hook(node, result, elapsed)
+            return result
+
+        # Elements of arrays fanned out over are matched without being
+        # counted, so as not to change the way they are matched.
+        match_element = getattr(matcher, "match_element", None)
+        if match_element is not None:
+            match_instrumented.match_element = match_element
+        return match_instrumented
+
+
+_INSTRUMENTED_CLASSES = {Query: InstrumentedQuery}
+
+
+def instrumented_class(query_class):
+    """ Returns the InstrumentedQuery class deriving from query_class """
+    if issubclass(query_class, InstrumentedQuery):
+        return query_class
+    instrumented = _INSTRUMENTED_CLASSES.get(query_class)
+    if instrumented is None:
+        instrumented = _INSTRUMENTED_CLASSES[query_class] = type(
+            "Instrumented" + query_class.__name__,
+            (InstrumentedQuery, query_class), {})
+    return instrumented
+
+
+def explain(query, entries=None, hooks=()):
+    """ Returns the plan of query, see `Query.explain` """
+    if isinstance(query, Query):
+        # Queries are rebuilt from the arguments they are pickled with.
+        query_class, args = query.__reduce__()
+        definition, args = args[0], args[1:]
+        instrumented = instrumented_class(query_class)(
+            definition, hooks, *args)
+    else:
+        definition = query
+        instrumented = InstrumentedQuery(definition, hooks)
+    result = {
+        "queryPlanner": {
+            "parsedQuery": definition,
+            "winningPlan": instrumented.plan.to_dict(stats=False),
+        }
+    }
+    if entries is None:
+        return result
+
+    start = time.perf_counter()
+    returned = instrumented.count(entries)
+    elapsed = time.perf_counter() - start
+    result["executionStats"] = {
+        "nReturned": returned,
+        "totalDocsExamined": instrumented.plan.calls,
+        "executionTime": elapsed,
+        "executionStages": instrumented.plan.to_dict(),
+    }
+    return result
@@ -0,0 +1,119 @@
+"""
+Live views of the objects of an `IndexedCollection` matching a query, kept up
+to date as the collection changes.
+"""
+
+from . import Query, _as_index, string_type
+
+
+def _segments(path):
+    """ Returns the keys of a path up to its first array index, beyond which
+    it may refer to any element of an array """
+    if not isinstance(path, string_type):
+        return (path,)
+    segments = []
+    for key in path.split("."):
+        if _as_index(key) is not None:
+            break
+        segments.append(key)
+    return tuple(segments)
+
+
+class LiveView(object):
+    """ The objects of a collection matching a query, updated as objects are
+    inserted, updated and removed
+
+    Only changed objects are matched again, and updates are ignored when the
+    fields they changed aren't referenced by the query. Changes of the view
+    are both passed to listener(event, doc_id, document), event being
+    "added" or "removed", and accumulated until `changes` is called.
+    """
+
+    def __init__(self, collection, query, listener=None):
+        if not isinstance(query, Query):
+            query = Query(query)
+        self.query = query
+        self._collection = collection
+        self._matcher = query._matcher
+        self._listener = listener
+        paths = query.paths
+        self._segments = None if paths is None else [
+            _segments(path) for path in paths]
+        self._ids = set(collection.find_ids(query))
+        self._added = set()
+        self._removed = set()
+        collection.subscribe(self._on_change)
+
+    def close(self):
+        """ Stops following the changes of the collection """
+        self._collection.unsubscribe(self._on_change)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._ids
+
+    def __iter__(self):
+        get = self._collection.get
+        return (get(doc_id) for doc_id in sorted(self._ids))
+
+    @property
+    def ids(self):
+        """ The ids of the objects matching the query """
+        return frozenset(self._ids)
+
+    def changes(self):
+        """ Returns the sets of the ids of the objects added to and removed
+        from the view since the previous call """
+        added, removed = self._added, self._removed
+        self._added, self._removed = set(), set()
+        return added, removed
+
+    #########
+    # Changes
+    #########
+
+    def _affects(self, changed):
+        """ Tells whether changes of the fields at the changed paths may change
+        the result of the query """
+        if changed is None or self._segments is None:
+            return True
+        for path in changed:
+            path = _segments(path)
+            for segments in self._segments:
+                length = min(len(path), len(segments))
+                if path[:length] == segments[:length]:
+                    return True
+        return False
+
+    def _on_change(self, event, doc_id, document, changed):
+        if event == "remove":
+            if doc_id in self._ids:
+                self._remove(doc_id, document)
+            return
+        if event == "update" and not self._affects(changed):
+            return
+        matched = bool(self._matcher(document))
+        if matched and doc_id not in self._ids:
+            self._add(doc_id, document)
+        elif not matched and doc_id in self._ids:
+            self._remove(doc_id, document)
+
+    def _add(self, doc_id, document):
+        self._ids.add(doc_id)
+        if doc_id in self._removed:
+            self._removed.discard(doc_id)
+        else:
+            self._added.add(doc_id)
+        if self._listener is not None:
+            self._listener("added", doc_id, document)
+
+    def _remove(self, doc_id, document):
+        self._ids.discard(doc_id)
+        if doc_id in self._added:
+            self._added.discard(doc_id)
+        else:
+            self._removed.add(doc_id)
+        if self._listener is not None:
+            self._listener("removed", doc_id, document)
@@ -0,0 +1,234 @@
+"""
+Matching of an object against many queries at once, as done when routing
+objects to the subscriptions whose queries they match.
+"""
+
+from collections.abc import Mapping
+
+from . import Query, _Path, is_non_string_sequence, regex_type, string_type
+
+
+def _is_hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _SharedPath(_Path):
+    """ A field path whose value is extracted once per object, and shared by
+    all the queries of a QuerySet reading it """
+    # pylint: disable=too-few-public-methods
+    __slots__ = ("_entry", "_value", "_used")
+
+    def __init__(self, keys, used):
+        super(_SharedPath, self).__init__(keys)
+        self._entry = self._value = None
+        self._used = used
+        # Values are shared as a whole, including arrays fanned out over.
+        self.lazy = False
+
+    def extract(self, entry, start=0):
+        if start:
+            return super(_SharedPath, self).extract(entry, start)
+        if entry is not self._entry:
+            self._value = super(_SharedPath, self).extract(entry)
+            if self._entry is None:
+                self._used.append(self)
+            self._entry = entry
+        return self._value
+
+    def clear(self):
+        """ Forgets the value extracted last """
+        self._entry = self._value = None
+
+
+class _SharedQuery(Query):
+    """ A Query extracting field values through the paths of a QuerySet """
+
+    def __init__(self, definition, paths):
+        self._paths = paths
+        super(_SharedQuery, self).__init__(definition)
+
+    def _field_path(self, keys):
+        return self._paths.get(keys)
+
+
+class _SharedPaths(object):
+    """ The paths shared by the queries of a QuerySet """
+
+    def __init__(self):
+        self._paths = {}
+        self._used = []
+
+    def get(self, keys):
+        """ Returns the shared path made of keys """
+        keys = tuple(keys)
+        path = self._paths.get(keys)
+        if path is None:
+            path = self._paths[keys] = _SharedPath(keys, self._used)
+        return path
+
+    def clear(self):
+        """ Forgets the values extracted from the last object """
+        for path in self._used:
+            path.clear()
+        del self._used[:]
+
+
+class QuerySet(object):
+    """ A set of queries, identified by ids, an object can be matched against
+    at once
+
+    Field values are extracted once per object for all the queries reading
+    them. Queries requiring a field to be equal to, or in, some values are
+    indexed by these values, so that only the queries whose indexed values are
+    found in an object are matched against it. A QuerySet isn't thread safe.
+    """
+
+    def __init__(self, queries=None):
+        self._paths = _SharedPaths()
+        self._queries = {}
+        self._order = {}
+        self._next_order = 0
+        # Ids of the queries indexed by field path keys, then by value.
+        self._index = {}
+        self._anchors = {}
+        self._unindexed = set()
+        for query_id, definition in dict(queries or {}).items():
+            self.add(query_id, definition)
+
+    def __len__(self):
+        return len(self._queries)
+
+    def __contains__(self, query_id):
+        return query_id in self._queries
+
+    def add(self, query_id, definition):
+        """ Adds the query definition under query_id, replacing any query
+        already added under it """
+        if isinstance(definition, Query):
+            definition = definition._definition
+        query = _SharedQuery(definition, self._paths)
+        if query_id in self._queries:
+            self.remove(query_id)
+        self._queries[query_id] = query
+        self._order[query_id] = self._next_order
+        self._next_order += 1
+
+        anchors = _anchors(definition)
+        if anchors is None:
+            self._unindexed.add(query_id)
+            return
+        values_by_keys = {}
+        for keys, values in anchors:
+            values_by_keys.setdefault(keys, set()).update(values)
+        anchors = self._anchors[query_id] = list(values_by_keys.items())
+        for keys, values in anchors:
+            by_value = self._index.setdefault(keys, {})
+            for value in values:
+                by_value.setdefault(value, set()).add(query_id)
+
+    def remove(self, query_id):
+        """ Removes the query added under query_id """
+        del self._queries[query_id]
+        del self._order[query_id]
+        self._unindexed.discard(query_id)
+        for keys, values in self._anchors.pop(query_id, ()):
+            by_value = self._index[keys]
+            for value in values:
+                ids = by_value[value]
+                ids.discard(query_id)
+                if not ids:
+                    del by_value[value]
+            if not by_value:
+                del self._index[keys]
+
+    def match(self, entry):
+        """ Returns the ids of the queries entry matches, in the order they
+        were added """
+        queries = self._queries
+        try:
+            matched = [
+                query_id for query_id in self._candidates(entry)
+                if queries[query_id]._matcher(entry)
+            ]
+        finally:
+            self._paths.clear()
+        matched.sort(key=self._order.__getitem__)
+        return matched
+
+    def _candidates(self, entry):
+        candidates = set(self._unindexed)
+        for keys, by_value in self._index.items():
+            try:
+                value = self._paths.get(keys).extract(entry)
+            except IndexError:
+                continue
+            # A value is matched by equality to itself, or to any of its
+            # elements when it is a sequence.
+            if _is_hashable(value) and value in by_value:
+                candidates.update(by_value[value])
+            if is_non_string_sequence(value):
+                for item in value:
+                    if _is_hashable(item) and item in by_value:
+                        candidates.update(by_value[item])
+        return candidates
+
+
+def _anchors(definition):
+    """ Returns a list of (path keys, values) pairs such that an object can
+    only match definition if the value at one of the paths is, or contains,
+    one of the values. Returns None if there is no such list """
+    if not isinstance(definition, Mapping):
+        return None
+    best = None
+    for operator, condition in definition.items():
+        if not isinstance(operator, string_type):
+            continue
+        if operator == "$or" and is_non_string_sequence(condition):
+            anchors = [_anchors(sub_condition) for sub_condition in condition]
+            if not anchors or None in anchors:
+                continue
+            anchors = [anchor for branch in anchors for anchor in branch]
+        elif operator == "$and" and is_non_string_sequence(condition):
+            anchors = [_anchors(sub_condition) for sub_condition in condition]
+            anchors = min(
+                (anchor for anchor in anchors if anchor is not None),
+                key=_size, default=None)
+            if anchors is None:
+                continue
+        elif operator.startswith("$"):
+            continue
+        else:
+            values = _field_values(condition)
+            if values is None:
+                continue
+            anchors = [(tuple(operator.split(".")), values)]
+        if best is None or _size(anchors) < _size(best):
+            best = anchors
+    return best
+
+
+def _size(anchors):
+    return sum(len(values) for _, values in anchors)
+
+
+def _field_values(condition):
+    """ Returns the values one of which a field has to be equal to, or contain,
+    to match condition, or None if there are no such values """
+    if not isinstance(condition, Mapping):
+        if isinstance(condition, list) or not _is_hashable(condition):
+            return None
+        return [condition]
+    if "$exists" in condition:
+        return None
+    if "$eq" in condition and _is_hashable(condition["$eq"]):
+        return [condition["$eq"]]
+    values = condition.get("$in")
+    if is_non_string_sequence(values) and all(
+            _is_hashable(value) and not isinstance(value, regex_type)
+            for value in values):
+        return list(values)
+    return None
@@ -0,0 +1,325 @@
+"""
+Normalization of query definitions into simpler equivalent ones: logical
+operators flattened, ranges on the same field merged, disjunctions of
+equalities turned into $in, and constant conditions folded.
+"""
+
+from collections.abc import Mapping
+
+from . import Query, is_non_string_sequence, string_type
+from .collection import _family
+
+
+# The definition of queries matching nothing, which `Query` compiles into a
+# matcher returning False right away.
+EMPTY = {"$or": []}
+
+_LOWER_BOUNDS = ("$gt", "$gte")
+_UPPER_BOUNDS = ("$lt", "$lte")
+
+# Types of the values equality conditions and $in operators match the same
+# way.
+_EQUALITY_TYPES = frozenset([int, float, bool, str, type(None)])
+
+
+# Stands for conditions which always match.
+_ALWAYS = object()
+
+
+class _Empty(Exception):
+    """ Raised when a conjunction provably matches nothing """
+
+
+def _is_field(operator):
+    # Conditions on keys which aren't strings require the key to be present,
+    # they are left as they are.
+    return isinstance(operator, string_type) and not operator.startswith("$")
+
+
+def _is_empty_sequence(value):
+    return is_non_string_sequence(value) and len(value) == 0
+
+
+def _is_sequence_of_mappings(condition):
+    return is_non_string_sequence(condition) and all(
+        isinstance(sub, Mapping) for sub in condition)
+
+
+def _is_separable(condition):
+    """ Tells whether the operators of a field condition can be split into
+    several conditions and merged with others ($exists and $options have to
+    stay along with the operators they apply to) """
+    return isinstance(condition, Mapping) and \
+        "$exists" not in condition and "$options" not in condition
+
+
+class _Range(object):
+    """ The tightest bounds of the ranges required on a field, for values of
+    a single family """
+
+    def __init__(self, family):
+        self.family = family
+        self.lower = self.upper = None
+
+    def add(self, operator, value):
+        if operator in _LOWER_BOUNDS:
+            strict = operator == "$gt"
+            if self.lower is None or value > self.lower[0] or (
+                    value == self.lower[0] and strict):
+                self.lower = (value, strict)
+        else:
+            strict = operator == "$lt"
+            if self.upper is None or value < self.upper[0] or (
+                    value == self.upper[0] and strict):
+                self.upper = (value, strict)
+
+    def is_empty(self):
+        """ Tells whether no value is within the bounds """
+        if self.lower is None or self.upper is None:
+            return False
+        (lower, lower_strict), (upper, upper_strict) = self.lower, self.upper
+        return lower > upper or (
+            lower == upper and (lower_strict or upper_strict))
+
+    def condition(self):
+        condition = {}
+        if self.lower is not None:
+            condition["$gt" if self.lower[1] else "$gte"] = self.lower[0]
+        if self.upper is not None:
+            condition["$lt" if self.upper[1] else "$lte"] = self.upper[0]
+        return condition
+
+
+#########
+# Fields
+#########
+
+def _field(condition):
+    """ Returns the normalized condition on a field, _ALWAYS if it always
+    matches. Raises _Empty if it never does. """
+    if not _is_separable(condition):
+        return condition
+    condition = dict(condition)
+    if _is_empty_sequence(condition.get("$nin")):
+        del condition["$nin"]
+    if _is_empty_sequence(condition.get("$in")):
+        raise _Empty()
+    if not condition:
+        return _ALWAYS
+    if list(condition) == ["$in"]:
+        members = condition["$in"]
+        if is_non_string_sequence(members) and len(members) == 1 and \
+                type(members[0]) in _EQUALITY_TYPES:
+            # A single value is in the values of a field exactly when the
+            # field is equal to it, or holds it as an element of an array.
+            return members[0]
+    return condition
+
+
+def _merge_ranges(conditions):
+    """ Merges the bounds of the ranges required on each field by a
+    conjunction of (operator, condition) pairs. Raises _Empty if a field is
+    required to be within an empty range. """
+    ranges = {}
+    merged = []
+    for operator, condition in conditions:
+        if not _is_field(operator) or not _is_separable(condition):
+            merged.append((operator, condition))
+            continue
+        rest = {}
+        for sub_operator, value in condition.items():
+            family = _family(value) \
+                if sub_operator in _LOWER_BOUNDS + _UPPER_BOUNDS else None
+            if family not in ("number", "string"):
+                rest[sub_operator] = value
+                continue
+            bounds = ranges.get(operator)
+            if bounds is None:
+                bounds = ranges[operator] = _Range(family)
+                merged.append((operator, bounds))
+            elif bounds.family != family:
+                # Values of different families can't be ordered against each
+                # other, such bounds are left as they are.
+                rest[sub_operator] = value
+                continue
+            bounds.add(sub_operator, value)
+        if rest:
+            merged.append((operator, rest))
+
+    for bounds in ranges.values():
+        if bounds.is_empty():
+            raise _Empty()
+    return [
+        (operator, condition.condition()
+         if isinstance(condition, _Range) else condition)
+        for operator, condition in merged
+    ]
+
+
+#############
+# Conjunction
+#############
+
+def _conjunction(definition):
+    """ Returns the normalized conditions of a query definition as a list of
+    (operator, condition) pairs which all have to match. Raises _Empty if the
+    definition provably matches nothing. """
+    conditions = []
+    for operator, condition in definition.items():
+        if operator == "$comment":
+            continue
+        if operator == "$and" and _is_sequence_of_mappings(condition):
+            for sub in condition:
+                conditions.extend(_conjunction(sub))
+        elif operator == "$or" and _is_sequence_of_mappings(condition):
+            branches = _disjunction(condition)
+            if branches is None:
+                continue
+            if not branches:
+                raise _Empty()
+            if len(branches) == 1:
+                conditions.extend(branches[0])
+            else:
+                conditions.append(
+                    ("$or", [_rebuild(branch) for branch in branches]))
+        elif operator == "$nor" and _is_sequence_of_mappings(condition):
+            branches = _disjunction(condition)
+            if branches is None:
+                raise _Empty()
+            if branches:
+                conditions.append(
+                    ("$nor", [_rebuild(branch) for branch in branches]))
+        elif _is_field(operator):
+            condition = _field(condition)
+            if condition is not _ALWAYS:
+                conditions.append((operator, condition))
+        else:
+            conditions.append((operator, condition))
+    return _merge_ranges(conditions)
+
+
+def _disjunction(definitions):
+    """ Returns the normalized conjunctions of the branches of a disjunction
+    which may match, None if one of them always matches """
+    branches = []
+    for definition in definitions:
+        try:
+            branch = _conjunction(definition)
+        except _Empty:
+            continue
+        if not branch:
+            return None
+        if len(branch) == 1 and branch[0][0] == "$or":
+            # Branches of a disjunction nested in a disjunction.
+            branches.extend(_conjunction(sub) for sub in branch[0][1])
+        else:
+            branches.append(branch)
+    return _merge_equalities(branches)
+
+
+def _equality_values(branch):
+    """ Returns the field and the values a branch requires the field to be
+    equal to (or to hold in an array), None if it isn't such a branch """
+    if len(branch) != 1:
+        return None
+    operator, condition = branch[0]
+    if not _is_field(operator):
+        return None
+    if type(condition) in _EQUALITY_TYPES:
+        return operator, [condition]
+    if isinstance(condition, Mapping) and list(condition) == ["$in"] and \
+            is_non_string_sequence(condition["$in"]) and all(
+                type(value) in _EQUALITY_TYPES
+                for value in condition["$in"]):
+        return operator, list(condition["$in"])
+    return None
+
+
+def _merge_equalities(branches):
+    """ Merges the branches of a disjunction requiring the same field to be
+    equal to some values into a single $in branch """
+    values = {}
+    for branch in branches:
+        equality = _equality_values(branch)
+        if equality is not None:
+            values.setdefault(equality[0], []).extend(equality[1])
+
+    merged = []
+    for branch in branches:
+        equality = _equality_values(branch)
+        if equality is None:
+            merged.append(branch)
+            continue
+        field = equality[0]
+        if field not in values:
+            # Already merged into a previous branch.
+            continue
+        if len(values[field]) == len(equality[1]):
+            # The only branch on this field.
+            merged.append(branch)
+            continue
+        members, seen = [], set()
+        for value in values.pop(field):
+            if (type(value), value) not in seen:
+                seen.add((type(value), value))
+                members.append(value)
+        merged.append([(field, _field({"$in": members}))])
+    return merged
+
+
+def _rebuild(conditions):
+    """ Returns the query definition requiring all the (operator, condition)
+    pairs to match """
+    definition = {}
+    others = []
+    for operator, condition in conditions:
+        if operator not in definition:
+            definition[operator] = condition
+            continue
+        previous = definition[operator]
+        if _is_field(operator) and _is_separable(previous) and \
+                _is_separable(condition) and \
+                not set(previous) & set(condition):
+            # Conditions on the same field hold for the same value.
+            definition[operator] = dict(previous)
+            definition[operator].update(condition)
+        else:
+            others.append({operator: condition})
+    if not others:
+        return definition
+    if "$and" in definition:
+        return {"$and": [definition] + others}
+    definition["$and"] = others
+    return definition
+
+
+def normalize(definition):
+    """ Returns a query definition equivalent to definition, simplified:
+
+    - $and operators are flattened, as well as $or operators of a single
+      branch which may match,
+    - the bounds of the ranges on a same field are merged, and numbers and
+      strings outside of them, or conditions which can't match (such as
+      $in of no value), make the definition match nothing,
+    - branches of $or operators requiring a same field to be equal to some
+      values are merged into a single $in condition, $in conditions of a
+      single value turned into equalities,
+    - $comment and conditions which always match are removed.
+
+    Definitions matching nothing are normalized as `EMPTY`. Malformed
+    definitions, which `Query` rejects, are returned as they are, so that
+    dropping their conditions doesn't hide the error. Errors matching some
+    entries may still be: a condition raising on them (such as $mod on a
+    string) isn't evaluated when dropped along with a branch which can't
+    match, or which always does.
+    """
+    if not isinstance(definition, Mapping):
+        return definition
+    try:
+        Query(definition)
+    except Exception:  # pylint: disable=broad-except
+        return definition
+    try:
+        return _rebuild(_conjunction(definition))
+    except _Empty:
+        return dict(EMPTY)
@@ -0,0 +1,91 @@
+"""
+Matching of large collections using a pool of worker processes.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+# The query of a worker process, sent once when the worker starts.
+_query = None
+
+
+def _initialize(query):
+    # pylint: disable=global-statement
+    global _query
+    _query = query
+
+
+def _match_chunk(chunk):
+    """ Returns the indices of the entries of chunk matching the query of the
+    worker """
+    matcher = _query._matcher
+    return [index for index, entry in enumerate(chunk) if matcher(entry)]
+
+
+def _chunks(entries, chunksize):
+    entries = iter(entries)
+    start = 0
+    while True:
+        chunk = list(islice(entries, chunksize))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def parallel_filter(query, entries, workers=None, chunksize=1000,
+                    ordered=True, indices=False):
+    """ Returns an iterator over the entries matching query, see
+    `Query.parallel_filter`. Entries are read as the chunks are submitted, at
+    most twice as many chunks as workers being in flight at any time. """
+    if chunksize < 1:
+        raise ValueError("chunksize must be strictly positive")
+    return _parallel_filter(
+        query, entries, workers or os.cpu_count() or 1, chunksize, ordered,
+        indices)
+
+
+def _parallel_filter(query, entries, workers, chunksize, ordered, indices):
+    # pylint: disable=too-many-arguments
+    chunks = _chunks(entries, chunksize)
+
+    def results(matched, start, chunk):
+        if indices:
+            return [start + index for index in matched]
+        return [chunk[index] for index in matched]
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers, initializer=_initialize, initargs=(query,))
+    pending = deque()
+    try:
+        for start, chunk in islice(chunks, 2 * workers):
+            pending.append(
+                (executor.submit(_match_chunk, chunk), start, chunk))
+
+        while pending:
+            if ordered:
+                future, start, chunk = pending.popleft()
+            else:
+                done, _ = wait(
+                    [future for future, _, _ in pending],
+                    return_when=FIRST_COMPLETED)
+                index = next(
+                    index for index, (future, _, _) in enumerate(pending)
+                    if future in done)
+                future, start, chunk = pending[index]
+                del pending[index]
+
+            matched = future.result()
+            for start_next, chunk_next in islice(chunks, 1):
+                pending.append((
+                    executor.submit(_match_chunk, chunk_next),
+                    start_next, chunk_next))
+
+            for result in results(matched, start, chunk):
+                yield result
+    finally:
+        for future, _, _ in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,187 @@
+"""
+Query planner reordering the conditions a query combines, so that cheap and
+selective conditions are evaluated before expensive ones.
+"""
+
+from collections.abc import Mapping
+
+from . import Query, _all_of, _any_of, is_non_string_sequence, string_type
+
+
+# Rough relative costs of evaluating conditions.
+_PATH_SEGMENT_COST = 1
+_VALUE_COST = 1
+_REGEX_COST = 10
+# Number of elements arrays are assumed to hold.
+_ELEMENTS = 4
+
+# Operators which can't raise whatever the entries they are matched against,
+# conditions made of them only can be moved ahead of others.
+_SAFE_OPERATORS = frozenset([
+    "$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin", "$regex",
+    "$options", "$type", "$comment",
+])
+
+
+def estimate_cost(condition):
+    """ Returns a rough estimate of the relative cost of matching an object
+    against condition, given as a query definition or as a value condition """
+    if not isinstance(condition, Mapping):
+        return _VALUE_COST
+    return sum(
+        _operand_cost(operator, sub_condition)
+        for operator, sub_condition in condition.items()
+    )
+
+
+def _operand_cost(operator, condition):
+    if not isinstance(operator, string_type):
+        return _PATH_SEGMENT_COST + estimate_cost(condition)
+    if not operator.startswith("$"):
+        return (
+            _PATH_SEGMENT_COST * len(operator.split(".")) +
+            estimate_cost(condition)
+        )
+    if operator in ("$and", "$or", "$nor", "$all"):
+        return sum(estimate_cost(sub) for sub in condition)
+    if operator in ("$not", "$size"):
+        return _VALUE_COST + estimate_cost(condition)
+    if operator == "$elemMatch":
+        return _ELEMENTS * estimate_cost(condition)
+    if operator == "$regex":
+        return _REGEX_COST
+    if operator in ("$in", "$nin") and is_non_string_sequence(condition):
+        # Hashable values are looked up in a set, others compared one by one.
+        return _VALUE_COST + sum(
+            _VALUE_COST for item in condition
+            if isinstance(item, (Mapping, list))
+        )
+    return _VALUE_COST
+
+
+def may_raise(condition, safe_operators=_SAFE_OPERATORS):
+    """ Tells whether matching an entry against condition, given as a query
+    definition or as a value condition, may raise (for instance $mod on a
+    string), given the operators which never do """
+    if not isinstance(condition, Mapping):
+        return False
+    for operator, sub_condition in condition.items():
+        if not isinstance(operator, string_type):
+            # Looked up in entries which may not be containers.
+            return True
+        if not operator.startswith("$"):
+            if isinstance(sub_condition, Mapping) and \
+                    "$exists" in sub_condition:
+                return True
+            if may_raise(sub_condition, safe_operators):
+                return True
+        elif operator in ("$and", "$or", "$nor", "$all"):
+            if not is_non_string_sequence(sub_condition) or any(
+                    may_raise(sub, safe_operators) for sub in sub_condition):
+                return True
+        elif operator in ("$not", "$elemMatch"):
+            if may_raise(sub_condition, safe_operators):
+                return True
+        elif operator == "$size":
+            # Sizes matched against conditions are taken of any value.
+            if isinstance(sub_condition, Mapping):
+                return True
+        elif operator not in safe_operators:
+            return True
+    return False
+
+
+def _ordered(indexes, key, fixed):
+    """ Returns indexes sorted by key between the fixed ones, which keep their
+    position """
+    order, run = [], []
+    for index in indexes:
+        if fixed[index]:
+            order.extend(sorted(run, key=key))
+            order.append(index)
+            run = []
+        else:
+            run.append(index)
+    order.extend(sorted(run, key=key))
+    return order
+
+
+class PlannedQuery(Query):
+    """ A Query evaluating the conditions it combines (explicitly with $and,
+    $or, $nor and $all, or implicitly in a mapping) by increasing estimated
+    cost, so that cheap conditions can short-circuit expensive ones.
+
+    When sample_size is given, the number of times each condition decides of
+    the result of its combination (by not matching for a conjunction, by
+    matching for a disjunction) is observed over the first sample_size
+    matches, after which conditions are reordered by their cost relative to
+    their probability of deciding.
+
+    Conditions which may raise (see `may_raise`) keep their position, so that
+    results, and errors, are the same as the ones of Query. Subclasses
+    defining operators which never raise can add them to `safe_operators`.
+    """
+
+    safe_operators = _SAFE_OPERATORS
+
+    def __init__(self, definition, sample_size=0):
+        self._sample_size = sample_size
+        super(PlannedQuery, self).__init__(definition)
+
+    def __reduce__(self):
+        return self.__class__, (self._definition, self._sample_size)
+
+    def _combine_all(self, matchers, conditions):
+        return self._plan(matchers, conditions, _all_of, False)
+
+    def _combine_any(self, matchers, conditions):
+        return self._plan(matchers, conditions, _any_of, True)
+
+    def _plan(self, matchers, conditions, combine, decisive):
+        costs = [estimate_cost(condition) for condition in conditions]
+        fixed = [
+            may_raise(condition, self.safe_operators)
+            for condition in conditions
+        ]
+        order = _ordered(range(len(matchers)), costs.__getitem__, fixed)
+        if not self._sample_size or len(matchers) < 2:
+            return combine([matchers[index] for index in order])
+        return _adaptive(
+            matchers, costs, fixed, order, combine, decisive,
+            self._sample_size)
+
+
+def _adaptive(matchers, costs, fixed, order, combine, decisive, sample_size):
+    # pylint: disable=too-many-arguments
+    """ Returns a matcher observing which matchers decide of the result over
+    sample_size matches, then reordering them accordingly """
+    # Number of evaluations, and number of decisive results, of each matcher.
+    evaluations = [0] * len(matchers)
+    decisions = [0] * len(matchers)
+    remaining = [sample_size]
+
+    def rank(index):
+        probability = (decisions[index] + 1.0) / (evaluations[index] + 2.0)
+        return costs[index] / probability
+
+    def match_sampled(entry):
+        result = not decisive
+        for index in order:
+            evaluations[index] += 1
+            if bool(matchers[index](entry)) is decisive:
+                decisions[index] += 1
+                result = decisive
+                break
+
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            planned[0] = combine([
+                matchers[index]
+                for index in _ordered(range(len(matchers)), rank, fixed)])
+        return result
+
+    planned = [match_sampled]
+
+    def match_adaptive(entry):
+        return planned[0](entry)
+    return match_adaptive
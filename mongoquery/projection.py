@@ -0,0 +1,217 @@
+"""
+MongoDB-like projections, selecting the fields of the objects a query matches.
+"""
+
+from collections.abc import Mapping
+
+from . import (
+    Query, QueryError, _MISSING, is_non_string_sequence, string_type)
+
+
+class Projection(object):
+    """ The Projection class is used to select fields of an object according
+    to a MongoDB projection specification
+
+    Specifications either include fields (``{"a": 1, "b.c": 1}``), in which
+    case ``_id`` is also included unless excluded with ``{"_id": 0}``, or
+    exclude them (``{"a": 0}``). Array fields can also be projected with
+    ``{"$slice": count}``, ``{"$slice": [skip, count]}`` and ``{"$elemMatch":
+    query}``, the latter only keeping the first element matching the query.
+
+    Like queries, specifications are compiled once on instanciation. Projected
+    objects are new dicts, which may share their values with the original
+    object.
+    """
+
+    def __init__(self, specification):
+        self._specification = specification
+        self._projector = self._compile(specification)
+
+    def __reduce__(self):
+        return self.__class__, (self._specification,)
+
+    def apply(self, entry):
+        """ Returns the projection of the entry object """
+        if not isinstance(entry, Mapping):
+            return entry
+        return self._projector(entry)
+
+    ##############
+    # Compilation
+    ##############
+
+    def _compile(self, specification):
+        if not specification:
+            return dict
+        if not isinstance(specification, Mapping):
+            raise QueryError(
+                "projections must be mappings, not {!r}".format(
+                    specification))
+
+        tree = {}
+        included = excluded = False
+        for path, value in specification.items():
+            if not isinstance(path, string_type):
+                raise QueryError("invalid projection path {!r}".format(path))
+            if path == "$" or path.endswith(".$"):
+                raise QueryError("positional projection isn't supported")
+            if isinstance(value, Mapping):
+                if "$elemMatch" in value:
+                    included = True
+                leaf = self._compile_operator(value)
+            else:
+                leaf = bool(value)
+                if path != "_id":
+                    included = included or leaf
+                    excluded = excluded or not leaf
+            _insert(tree, path.split("."), leaf)
+
+        if included and excluded:
+            raise QueryError(
+                "projections can't both include and exclude fields, besides "
+                "_id")
+        if not included and not excluded:
+            # Projections of _id and of array operators alone.
+            included = all(leaf is True for leaf in tree.values())
+        if included:
+            tree.setdefault("_id", True)
+            return _include(tree)
+        return _exclude(tree)
+
+    def _compile_operator(self, condition):
+        if len(condition) != 1:
+            raise QueryError(
+                "invalid projection operator {!r}".format(condition))
+        operator, value = next(iter(condition.items()))
+        if operator == "$slice":
+            return self._slice(value)
+        if operator == "$elemMatch":
+            return self._elem_match(value)
+        raise QueryError(
+            "{!r} projection operator isn't supported".format(operator))
+
+    ###########
+    # Operators
+    ###########
+
+    @staticmethod
+    def _slice(condition):
+        if is_non_string_sequence(condition) and len(condition) == 2:
+            skip, limit = condition
+        else:
+            skip, limit = None, condition
+        if not all(
+                isinstance(number, int) and not isinstance(number, bool)
+                for number in (limit, skip or 0)) or (
+                    skip is not None and limit <= 0):
+            raise QueryError(
+                "invalid $slice projection {!r}".format(condition))
+
+        def project_slice(value):
+            if not is_non_string_sequence(value):
+                return value
+            if skip is None:
+                return list(value[:limit] if limit >= 0 else value[limit:])
+            start = skip if skip >= 0 else max(len(value) + skip, 0)
+            return list(value[start:start + limit])
+        return project_slice
+
+    @staticmethod
+    def _elem_match(condition):
+        matcher = Query(condition)._matcher
+
+        def project_elem_match(value):
+            if is_non_string_sequence(value):
+                for element in value:
+                    if matcher(element):
+                        return [element]
+            return _MISSING
+        return project_elem_match
+
+
+def _insert(tree, keys, leaf):
+    """ Adds the leaf at the path made of keys in the tree of projected
+    fields """
+    key = keys[0]
+    if len(keys) == 1:
+        if key in tree:
+            raise QueryError(
+                "projection of {!r} collides with another path".format(key))
+        tree[key] = leaf
+        return
+    subtree = tree.setdefault(key, {})
+    if not isinstance(subtree, dict):
+        raise QueryError(
+            "projection of {!r} collides with another path".format(key))
+    _insert(subtree, keys[1:], leaf)
+
+
+def _keep(value):
+    return value
+
+
+def _drop(_):
+    return _MISSING
+
+
+def _include(tree):
+    """ Compiles a tree of included fields into a projector """
+    fields = []
+    for key, leaf in tree.items():
+        if isinstance(leaf, dict):
+            fields.append((key, _nested(_include(leaf), keep_others=False)))
+        elif leaf is True:
+            fields.append((key, _keep))
+        elif leaf is not False:
+            fields.append((key, leaf))
+
+    def project_included(entry):
+        projected = {}
+        for key, project in fields:
+            if key in entry:
+                value = project(entry[key])
+                if value is not _MISSING:
+                    projected[key] = value
+        return projected
+    return project_included
+
+
+def _exclude(tree):
+    """ Compiles a tree of excluded fields into a projector """
+    fields = []
+    for key, leaf in tree.items():
+        if isinstance(leaf, dict):
+            fields.append((key, _nested(_exclude(leaf), keep_others=True)))
+        elif leaf is False:
+            fields.append((key, _drop))
+        elif leaf is not True:
+            fields.append((key, leaf))
+
+    def project_excluded(entry):
+        projected = dict(entry)
+        for key, project in fields:
+            if key in projected:
+                value = project(projected[key])
+                if value is _MISSING:
+                    del projected[key]
+                else:
+                    projected[key] = value
+        return projected
+    return project_excluded
+
+
+def _nested(projector, keep_others):
+    """ Applies the projector of a sub-tree to a sub-document, or to each
+    sub-document of an array. Other values are kept when keep_others,
+    dropped otherwise """
+    def project_nested(value):
+        if isinstance(value, Mapping):
+            return projector(value)
+        if is_non_string_sequence(value):
+            return [
+                projector(item) if isinstance(item, Mapping) else item
+                for item in value
+                if keep_others or isinstance(item, Mapping)
+            ]
+        return value if keep_others else _MISSING
+    return project_nested
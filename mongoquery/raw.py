@@ -0,0 +1,348 @@
+"""
+Read-only mappings over raw JSON or BSON bytes, decoding only the fields which
+are looked up, so that queries touching a few fields of large documents can be
+matched without decoding them entirely:
+
+    query.match(RawJSONDocument(line))
+
+The members of an object are located lazily, by skipping over the values of
+the preceding ones without decoding them. Object values are themselves
+returned as raw documents, other values are decoded in full.
+
+Unlike `json.loads`, which keeps the last of duplicate keys, raw JSON
+documents return the first one.
+"""
+
+import json
+import re
+import struct
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+try:
+    import bson
+except ImportError:  # pragma: no cover
+    bson = None
+
+
+class _RawDocument(Mapping):
+    """ Lazily decoded document, locating its members as they are looked up.
+    Subclasses implement `_next_member` and `_decode` """
+
+    def __init__(self, raw, start, end):
+        self._raw = raw
+        self._end = end
+        # Position of the next member to be located, None once all have been.
+        self._position = start
+        self._spans = {}
+        self._values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        span = self._locate(key)
+        if span is None:
+            raise KeyError(key)
+        value = self._values[key] = self._decode(*span)
+        return value
+
+    def __contains__(self, key):
+        return self._locate(key) is not None
+
+    def __iter__(self):
+        self._locate_all()
+        return iter(self._spans)
+
+    def __len__(self):
+        self._locate_all()
+        return len(self._spans)
+
+    def __repr__(self):
+        return "{}({!r})".format(
+            self.__class__.__name__, bytes(self._raw[self._start:self._end]))
+
+    def _locate(self, key):
+        """ Returns the span of the value of key, None if there isn't any """
+        span = self._spans.get(key)
+        while span is None and self._position is not None:
+            member = self._next_member()
+            if member is not None:
+                found, span = member
+                self._spans.setdefault(found, span)
+                if found != key:
+                    span = None
+        return span
+
+    def _locate_all(self):
+        while self._position is not None:
+            member = self._next_member()
+            if member is not None:
+                self._spans.setdefault(*member)
+
+
+######
+# JSON
+######
+
+_STRING_PATTERN = br'"[^"\\]*(?:\\.[^"\\]*)*"'
+_STRING = re.compile(_STRING_PATTERN, re.DOTALL)
+_WHITESPACE_PATTERN = br"[ \t\n\r]*"
+_WHITESPACE = re.compile(_WHITESPACE_PATTERN)
+_SCALAR = re.compile(br"[^,:\]}\s]+")
+
+
+def _container_pattern(depth):
+    """ Returns a pattern matching arrays and objects nested up to depth
+    levels. Strings, and the characters between them and nested values, are
+    matched in runs which can only be split one way, which keeps failures
+    from backtracking exponentially """
+    others = br'[^"\[\]{}]*'
+    pattern = None
+    for _ in range(depth):
+        item = _STRING_PATTERN if pattern is None else (
+            br"(?:" + _STRING_PATTERN + br"|" + pattern + br")")
+        pattern = br"[{\[]" + others + br"(?:" + item + others + br")*[}\]]"
+    return pattern
+
+
+_CONTAINER_PATTERN = _container_pattern(6)
+# Skips over arrays and objects in a single match, values nested deeper being
+# skipped bracket by bracket.
+_CONTAINER = re.compile(_CONTAINER_PATTERN, re.DOTALL)
+# A member of an object, along with the separator preceding it, capturing its
+# key and its value.
+_MEMBER = re.compile(
+    _WHITESPACE_PATTERN + b",?" + _WHITESPACE_PATTERN +
+    b"(" + _STRING_PATTERN + b")" +
+    _WHITESPACE_PATTERN + b":" + _WHITESPACE_PATTERN +
+    b"(" + _STRING_PATTERN + b"|" + _CONTAINER_PATTERN +
+    br'|[^,:\]}\s"\[{]+)', re.DOTALL)
+# Characters changing the nesting level, or starting a string which may hold
+# such characters.
+_STRUCTURE = re.compile(br'[\[\]{}"]')
+
+
+def _skip_value(raw, position):
+    """ Returns the position following the JSON value starting at position """
+    first = raw[position:position + 1]
+    if first == b'"':
+        string = _STRING.match(raw, position)
+        if string is None:
+            raise ValueError("unterminated string at {}".format(position))
+        return string.end()
+    if first not in (b"{", b"["):
+        scalar = _SCALAR.match(raw, position)
+        if scalar is None:
+            raise ValueError("expected a value at {}".format(position))
+        return scalar.end()
+
+    container = _CONTAINER.match(raw, position)
+    if container is not None:
+        return container.end()
+
+    depth = 0
+    search = _STRUCTURE.search
+    while True:
+        found = search(raw, position)
+        if found is None:
+            raise ValueError("unterminated value")
+        character = found.group()
+        if character == b'"':
+            string = _STRING.match(raw, found.start())
+            if string is None:
+                raise ValueError(
+                    "unterminated string at {}".format(found.start()))
+            position = string.end()
+            continue
+        position = found.end()
+        if character in (b"{", b"["):
+            depth += 1
+        else:
+            depth -= 1
+            if not depth:
+                return position
+
+
+def _decode_key(raw):
+    if b"\\" in raw:
+        return json.loads(raw)
+    return raw[1:-1].decode("utf-8")
+
+
+class RawJSONDocument(_RawDocument):
+    """ A mapping over the bytes (or string) of a JSON object, decoding its
+    members as they are looked up """
+
+    def __init__(self, raw, start=0, end=None):
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        if end is None:
+            end = len(raw)
+        start = _WHITESPACE.match(raw, start).end()
+        if raw[start:start + 1] != b"{":
+            raise ValueError("expected a JSON object at {}".format(start))
+        self._start = start
+        super(RawJSONDocument, self).__init__(raw, start + 1, end)
+
+    def decode(self):
+        """ Returns the whole document, decoded as a dict """
+        return json.loads(self._raw[self._start:_skip_value(
+            self._raw, self._start)])
+
+    def _next_member(self):
+        raw = self._raw
+        member = _MEMBER.match(raw, self._position)
+        if member is not None:
+            self._position = member.end()
+            return _decode_key(member.group(1)), member.span(2)
+
+        # The end of the object, or a value nested too deeply to be matched.
+        position = _WHITESPACE.match(raw, self._position).end()
+        character = raw[position:position + 1]
+        if character == b"}":
+            self._position = None
+            return None
+        if character == b",":
+            position = _WHITESPACE.match(raw, position + 1).end()
+
+        key = _STRING.match(raw, position)
+        if key is None:
+            raise ValueError("expected a key at {}".format(position))
+        position = _WHITESPACE.match(raw, key.end()).end()
+        if raw[position:position + 1] != b":":
+            raise ValueError("expected ':' at {}".format(position))
+        start = _WHITESPACE.match(raw, position + 1).end()
+        end = _skip_value(raw, start)
+        if end > self._end:
+            raise ValueError("unterminated object")
+        self._position = end
+        return _decode_key(key.group()), (start, end)
+
+    def _decode(self, start, end):
+        if self._raw[start:start + 1] == b"{":
+            return RawJSONDocument(self._raw, start, end)
+        return json.loads(self._raw[start:end])
+
+
+######
+# BSON
+######
+
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+_DOUBLE = struct.Struct("<d")
+# Dates are decoded as naive UTC datetimes, as bson and pymongo do by default.
+_EPOCH = datetime(1970, 1, 1)
+
+# Sizes of the BSON values of fixed size, by type.
+_FIXED_SIZES = {
+    0x01: 8, 0x06: 0, 0x07: 12, 0x08: 1, 0x09: 8, 0x0A: 0, 0x10: 4,
+    0x11: 8, 0x12: 8, 0x13: 16, 0x7F: 0, 0xFF: 0,
+}
+# Types of the BSON values prefixed by their size, and the number of bytes
+# following them not included in it.
+_SIZED = {0x02: 4, 0x03: 0, 0x04: 0, 0x05: 5, 0x0D: 4, 0x0E: 4, 0x0F: 0}
+
+
+def _cstring_end(raw, position):
+    end = raw.find(b"\x00", position)
+    if end == -1:
+        raise ValueError("unterminated BSON string")
+    return end
+
+
+def _bson_value_end(raw, kind, position):
+    """ Returns the position following the BSON value of type kind starting
+    at position """
+    if kind in _FIXED_SIZES:
+        return position + _FIXED_SIZES[kind]
+    if kind in _SIZED:
+        return position + _SIZED[kind] + _INT32.unpack_from(raw, position)[0]
+    if kind == 0x0B:
+        pattern_end = _cstring_end(raw, position)
+        return _cstring_end(raw, pattern_end + 1) + 1
+    if kind == 0x0C:
+        return position + 4 + _INT32.unpack_from(raw, position)[0] + 12
+    raise ValueError("unknown BSON type 0x{:02x}".format(kind))
+
+
+class RawBSONDocument(_RawDocument):
+    """ A mapping over the bytes of a BSON document, decoding its fields as
+    they are looked up
+
+    Values of the types JSON can represent, binary data and dates are decoded
+    natively, the others require the ``bson`` package of ``pymongo``.
+    """
+
+    def __init__(self, raw, start=0, kind=0x03):
+        size = _INT32.unpack_from(raw, start)[0]
+        self._start = start
+        self._kind = kind
+        super(RawBSONDocument, self).__init__(raw, start + 4, start + size)
+
+    def decode(self):
+        """ Returns the whole document, decoded as a dict (or as a list for
+        embedded arrays) """
+        if self._kind == 0x04:
+            return [_decoded(self[key]) for key in self]
+        return {key: _decoded(self[key]) for key in self}
+
+    def _next_member(self):
+        raw, position = self._raw, self._position
+        kind = raw[position]
+        if kind == 0:
+            self._position = None
+            return None
+        key_end = _cstring_end(raw, position + 1)
+        start = key_end + 1
+        end = _bson_value_end(raw, kind, start)
+        if end > self._end:
+            raise ValueError("truncated BSON document")
+        self._position = end
+        key = bytes(raw[position + 1:key_end]).decode("utf-8")
+        return key, (position, end)
+
+    def _decode(self, position, end):
+        raw = self._raw
+        kind = raw[position]
+        start = _cstring_end(raw, position + 1) + 1
+        if kind == 0x03:
+            return RawBSONDocument(raw, start)
+        if kind == 0x04:
+            array = RawBSONDocument(raw, start, kind)
+            return [array[key] for key in array]
+        if kind == 0x01:
+            return _DOUBLE.unpack_from(raw, start)[0]
+        if kind == 0x02:
+            return bytes(raw[start + 4:end - 1]).decode("utf-8")
+        if kind == 0x05:
+            return bytes(raw[start + 5:end])
+        if kind == 0x08:
+            return raw[start] != 0
+        if kind == 0x09:
+            milliseconds = _INT64.unpack_from(raw, start)[0]
+            return _EPOCH + timedelta(milliseconds=milliseconds)
+        if kind == 0x0A:
+            return None
+        if kind == 0x10:
+            return _INT32.unpack_from(raw, start)[0]
+        if kind == 0x12:
+            return _INT64.unpack_from(raw, start)[0]
+        if bson is None:
+            raise ValueError(
+                "decoding BSON type 0x{:02x} requires the bson package of "
+                "pymongo".format(kind))
+        # Decodes a document holding nothing but this element.
+        element = bytes(raw[position:end])
+        document = _INT32.pack(len(element) + 5) + element + b"\x00"
+        return next(iter(bson.decode(document).values()))
+
+
+def _decoded(value):
+    if isinstance(value, RawBSONDocument):
+        return value.decode()
+    if isinstance(value, list):
+        return [_decoded(item) for item in value]
+    return value
@@ -0,0 +1,389 @@
+"""
+Segmented files of documents, storing zone maps (the bounds and distinct
+values of some fields) for each segment, so that scanning them with a query
+skips the segments which can't hold any matching document.
+
+A segment file starts with a magic line, followed by the segments, each made
+of newline-delimited JSON documents, and by a JSON footer describing them.
+The file ends with the length of the footer and the magic line again.
+"""
+
+import json
+import math
+import mmap
+import struct
+from collections.abc import Mapping
+
+from . import Query, _Path, _Undefined, is_non_string_sequence, string_type
+from .normalize import normalize
+from .stream import iter_matches
+
+
+_MAGIC = b"MQSEG1\n"
+_TRAILER = struct.Struct("<Q")
+
+# Types of the values zone maps describe, and equality and range conditions
+# can be checked against.
+_NUMBER_TYPES = frozenset([int, float, bool])
+_SCALAR_TYPES = _NUMBER_TYPES | frozenset([str, type(None)])
+
+_LOWER_BOUNDS = {"$gt": False, "$gte": True}
+_UPPER_BOUNDS = {"$lt": False, "$lte": True}
+
+
+def _family(value):
+    """ Returns the family of a scalar value ordered against other values of
+    its family, None if it isn't ordered (None, NaN) or isn't a scalar """
+    kind = type(value)
+    if kind in _NUMBER_TYPES:
+        return None if kind is float and math.isnan(value) else "numbers"
+    if kind is str:
+        return "strings"
+    return None
+
+
+###########
+# Zone maps
+###########
+
+class _ZoneBuilder(object):
+    """ Accumulates the zone map of a field over the documents of a segment:
+    the bounds of its numbers and of its strings, the number of null values,
+    the number of values of other types, and its distinct values while there
+    are at most sample_size of them. Array fields contribute their elements
+    as well, as equalities match them. """
+
+    def __init__(self, path, sample_size):
+        self._path = _Path(path.split("."))
+        self._sample_size = sample_size
+        self.bounds = {"numbers": None, "strings": None}
+        self.nulls = self.others = 0
+        self.values = set()
+
+    def add(self, document):
+        try:
+            value = self._path.extract(document)
+        except IndexError:
+            return
+        self._add(value)
+        if isinstance(value, list):
+            for element in value:
+                self._add(element)
+
+    def _add(self, value):
+        if isinstance(value, _Undefined):
+            return
+        if value is None:
+            self.nulls += 1
+        elif type(value) not in _SCALAR_TYPES:
+            self.others += 1
+            return
+        family = _family(value)
+        if family is not None:
+            bounds = self.bounds[family]
+            if bounds is None:
+                self.bounds[family] = [value, value]
+            elif value < bounds[0]:
+                bounds[0] = value
+            elif value > bounds[1]:
+                bounds[1] = value
+        if self.values is not None and (value is None or family):
+            self.values.add(value)
+            if len(self.values) > self._sample_size:
+                self.values = None
+
+    def zone(self):
+        values = self.values
+        if values is not None:
+            # Sorted so that footers are reproducible.
+            values = sorted(values, key=lambda value: (
+                type(value).__name__, value if value is not None else 0))
+        return {
+            "numbers": self.bounds["numbers"],
+            "strings": self.bounds["strings"],
+            "nulls": self.nulls,
+            "others": self.others,
+            "values": values,
+        }
+
+
+def _may_equal(zone, value):
+    """ Tells whether a field described by zone may be equal to, or hold in
+    an array, a scalar value """
+    if zone["values"] is not None:
+        return value in zone["values"]
+    if value is None:
+        return zone["nulls"] > 0
+    family = _family(value)
+    if family is None:
+        return True
+    bounds = zone[family]
+    return bounds is not None and bounds[0] <= value <= bounds[1]
+
+
+def _may_compare(zone, operator, value):
+    """ Tells whether a field described by zone may hold a value satisfying
+    the comparison operator against value. Values of other families can't be
+    compared to value. """
+    bounds = zone[_family(value)]
+    if bounds is None:
+        return False
+    if operator in _LOWER_BOUNDS:
+        return bounds[1] > value or (
+            _LOWER_BOUNDS[operator] and bounds[1] == value)
+    return bounds[0] < value or (
+        _UPPER_BOUNDS[operator] and bounds[0] == value)
+
+
+##########
+# Pruning
+##########
+
+def _field_tests(condition):
+    """ Returns the tests of the zone map of a field which have to pass for
+    condition to match the field """
+    if type(condition) in _SCALAR_TYPES:
+        return [lambda zone: _may_equal(zone, condition)]
+    if not isinstance(condition, Mapping) or "$exists" in condition:
+        # $exists on dotted paths ignores the other operators.
+        return []
+    tests = []
+    for operator, value in condition.items():
+        if operator == "$eq" and type(value) in _SCALAR_TYPES:
+            tests.append(
+                lambda zone, value=value: _may_equal(zone, value))
+        elif operator == "$in" and is_non_string_sequence(value) and all(
+                type(item) in _SCALAR_TYPES for item in value):
+            tests.append(lambda zone, value=value: any(
+                _may_equal(zone, item) for item in value))
+        elif (operator in _LOWER_BOUNDS or operator in _UPPER_BOUNDS) and \
+                _family(value) is not None:
+            tests.append(
+                lambda zone, operator=operator, value=value:
+                _may_compare(zone, operator, value))
+    return tests
+
+
+def _compile_pruner(definition, paths):
+    """ Returns a function of the zone maps of a segment telling whether it
+    may hold documents matching definition, None if any segment may """
+    if not isinstance(definition, Mapping):
+        return None
+    pruners = []
+    for operator, condition in definition.items():
+        if operator == "$and" and is_non_string_sequence(condition):
+            pruners.extend(
+                pruner for pruner in (
+                    _compile_pruner(sub, paths) for sub in condition)
+                if pruner is not None)
+        elif operator == "$or" and is_non_string_sequence(condition):
+            branches = [_compile_pruner(sub, paths) for sub in condition]
+            if None not in branches:
+                pruners.append(
+                    lambda zones, branches=branches: any(
+                        branch(zones) for branch in branches))
+        elif isinstance(operator, string_type) and \
+                not operator.startswith("$") and operator in paths:
+            for test in _field_tests(condition):
+                pruners.append(
+                    lambda zones, path=operator, test=test: test(zones[path]))
+    if not pruners:
+        return None
+    return lambda zones: all(pruner(zones) for pruner in pruners)
+
+
+##########
+# Writing
+##########
+
+class SegmentWriter(object):
+    """ Writes documents to a segment file, segment_size documents at a time,
+    along with the zone maps of the fields at paths of each segment """
+
+    def __init__(self, filename, paths, segment_size=10000, sample_size=64):
+        if segment_size < 1:
+            raise ValueError("segment_size must be strictly positive")
+        self.paths = list(paths)
+        self._segment_size = segment_size
+        self._sample_size = sample_size
+        self._file = open(filename, "wb")
+        self._file.write(_MAGIC)
+        self._segments = []
+        self._start_segment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _start_segment(self):
+        self._offset = self._file.tell()
+        self._count = 0
+        self._zones = [
+            _ZoneBuilder(path, self._sample_size) for path in self.paths]
+
+    def write(self, document):
+        """ Appends document to the current segment """
+        line = json.dumps(document, separators=(",", ":"))
+        # Zone maps describe documents as they are read back, JSON turning
+        # tuples into lists and keys into strings.
+        document = json.loads(line)
+        for zone in self._zones:
+            zone.add(document)
+        self._file.write(line.encode("utf-8") + b"\n")
+        self._count += 1
+        if self._count >= self._segment_size:
+            self._end_segment()
+
+    def _end_segment(self):
+        if not self._count:
+            return
+        self._segments.append({
+            "offset": self._offset,
+            "length": self._file.tell() - self._offset,
+            "count": self._count,
+            "zones": {
+                path: zone.zone()
+                for path, zone in zip(self.paths, self._zones)
+            },
+        })
+        self._start_segment()
+
+    def close(self):
+        """ Writes the last segment and the footer, and closes the file """
+        if self._file.closed:
+            return
+        self._end_segment()
+        footer = json.dumps(
+            {"paths": self.paths, "segments": self._segments}).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(_TRAILER.pack(len(footer)) + _MAGIC)
+        self._file.close()
+
+
+def write_segments(filename, documents, paths, segment_size=10000,
+                   sample_size=64):
+    """ Writes documents to a segment file, see `SegmentWriter` """
+    with SegmentWriter(filename, paths, segment_size, sample_size) as writer:
+        for document in documents:
+            writer.write(document)
+
+
+##########
+# Reading
+##########
+
+class Segment(object):
+    # pylint: disable=too-few-public-methods
+    """ A segment of a segment file: its position in the file, its number of
+    documents and the zone maps of its fields """
+    __slots__ = ("offset", "length", "count", "zones")
+
+    def __init__(self, offset, length, count, zones):
+        self.offset = offset
+        self.length = length
+        self.count = count
+        self.zones = zones
+
+
+class SegmentedCollection(object):
+    """ The documents of a segment file, scanned with queries
+
+    Segments whose zone maps show they can't hold any document matching the
+    equalities, $in and range conditions of the query (combined with $and
+    and $or) are skipped, the others being memory-mapped and filtered like
+    newline-delimited JSON (see `stream.iter_matches`).
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, "rb")
+        try:
+            self._read_footer()
+        except Exception:
+            self._file.close()
+            raise
+
+    def _read_footer(self):
+        trailer_size = _TRAILER.size + len(_MAGIC)
+        self._file.seek(0, 2)
+        size = self._file.tell()
+        self._file.seek(0)
+        if size < len(_MAGIC) + trailer_size or \
+                self._file.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError("not a segment file")
+        self._file.seek(size - trailer_size)
+        trailer = self._file.read(trailer_size)
+        if trailer[_TRAILER.size:] != _MAGIC:
+            raise ValueError("truncated segment file")
+        length, = _TRAILER.unpack(trailer[:_TRAILER.size])
+        self._file.seek(size - trailer_size - length)
+        footer = json.loads(self._file.read(length).decode("utf-8"))
+        self.paths = frozenset(footer["paths"])
+        self.segments = []
+        for segment in footer["segments"]:
+            zones = segment["zones"]
+            for zone in zones.values():
+                if zone["values"] is not None:
+                    zone["values"] = frozenset(zone["values"])
+            self.segments.append(Segment(
+                segment["offset"], segment["length"], segment["count"],
+                zones))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        return sum(segment.count for segment in self.segments)
+
+    def close(self):
+        self._file.close()
+
+    def candidates(self, query):
+        """ Returns the segments which may hold documents matching query,
+        given either as a Query or as a query definition """
+        definition = query._definition if isinstance(query, Query) else query
+        pruner = _compile_pruner(normalize(definition), self.paths)
+        if pruner is None:
+            return list(self.segments)
+        return [
+            segment for segment in self.segments if pruner(segment.zones)]
+
+    def find(self, query):
+        """ Yields the documents matching query, given either as a Query or
+        as a query definition, only reading the segments which may hold
+        some """
+        if not isinstance(query, Query):
+            query = Query(query)
+        for segment in self.candidates(query):
+            for _, document in iter_matches(query, self._lines(segment)):
+                yield document
+
+    def explain(self, query):
+        """ Returns the numbers of segments and bytes of the file, and the
+        ones a scan with query reads """
+        candidates = self.candidates(query)
+        return {
+            "segments": len(self.segments),
+            "segmentsScanned": len(candidates),
+            "bytes": sum(segment.length for segment in self.segments),
+            "bytesScanned": sum(segment.length for segment in candidates),
+        }
+
+    def _lines(self, segment):
+        """ Yields the lines of a segment, memory-mapped """
+        # Mappings have to start at a multiple of the allocation granularity.
+        start = segment.offset % mmap.ALLOCATIONGRANULARITY
+        mapped = mmap.mmap(
+            self._file.fileno(), start + segment.length,
+            offset=segment.offset - start, access=mmap.ACCESS_READ)
+        with mapped:
+            end = start + segment.length
+            while start < end:
+                stop = mapped.find(b"\n", start, end)
+                stop = end if stop == -1 else stop + 1
+                yield mapped[start:stop]
+                start = stop
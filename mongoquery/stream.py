@@ -0,0 +1,259 @@
+"""
+Streaming filter of newline-delimited JSON (NDJSON), reading its input in
+large buffered chunks or memory-mapped, and never holding more than a line at
+once.
+
+Before being decoded, lines are checked to contain literal substrings any
+matching document has to contain, derived from the query.
+"""
+
+import argparse
+import json
+import mmap
+import re
+import sys
+from collections.abc import Mapping
+
+from . import Query, QueryError, _as_index, is_non_string_sequence, \
+    string_type
+
+
+_BUFFER_SIZE = 1 << 20
+
+# Strings made of these characters are encoded as they are by JSON encoders,
+# and can therefore be searched for in encoded documents (HTML-safe encoders
+# escape <, > and &).
+_VERBATIM = re.compile(r"\A[A-Za-z0-9 _\-.,:;!?@#$%*+=~'()\[\]{}|^`]+\Z")
+
+# Operators which can't match a missing field.
+_REQUIRING_FIELD = frozenset([
+    "$eq", "$gt", "$gte", "$lt", "$lte", "$in", "$regex", "$type", "$mod",
+    "$elemMatch",
+])
+
+# A regular expression matching nothing but a literal string, optionally
+# anchored.
+_LITERAL_REGEX = re.compile(r"\A\^?([A-Za-z0-9 _\-,:;!@#%'=~`]+)\$?\Z")
+
+
+def _verbatim(value):
+    return isinstance(value, string_type) and bool(_VERBATIM.match(value))
+
+
+def required_substrings(definition):
+    """ Returns byte strings which are found in the JSON encoding of any
+    document matching the query definition """
+    if isinstance(definition, Query):
+        definition = definition._definition
+    substrings = set()
+    _collect(definition, substrings)
+    return sorted(substrings, key=len, reverse=True)
+
+
+def _collect(definition, substrings):
+    if not isinstance(definition, Mapping):
+        return
+    for operator, condition in definition.items():
+        if not isinstance(operator, string_type):
+            continue
+        if operator == "$and" and is_non_string_sequence(condition):
+            for sub_condition in condition:
+                _collect(sub_condition, substrings)
+        elif not operator.startswith("$"):
+            _collect_field(operator, condition, substrings)
+
+
+def _collect_field(path, condition, substrings):
+    if isinstance(condition, Mapping):
+        if "$exists" in condition or not _REQUIRING_FIELD.intersection(
+                condition):
+            return
+        values = []
+        if "$eq" in condition:
+            values.append(condition["$eq"])
+        regex = _literal_regex(condition)
+        if regex is not None:
+            substrings.add(regex.encode("ascii"))
+    else:
+        values = [condition]
+
+    for value in values:
+        if _verbatim(value):
+            substrings.add('"{}"'.format(value).encode("ascii"))
+    # Paths going through a null value extract it, whatever their next keys.
+    if not _matches_null(condition):
+        for key in path.split("."):
+            # Keys indexing arrays aren't in documents.
+            if _verbatim(key) and _as_index(key) is None:
+                substrings.add('"{}"'.format(key).encode("ascii"))
+
+
+def _matches_null(condition):
+    """ Tells whether the field condition may match a null value """
+    if not isinstance(condition, Mapping):
+        return condition is None
+    for operator, value in condition.items():
+        if operator == "$eq" and value is not None:
+            return False
+        if operator in ("$gt", "$gte", "$lt", "$lte", "$regex", "$mod",
+                        "$elemMatch"):
+            return False
+        if operator == "$in" and is_non_string_sequence(value) and \
+                None not in value:
+            return False
+    return True
+
+
+def _literal_regex(condition):
+    """ Returns the string any value matching the $regex of condition
+    contains, if it is a literal one """
+    pattern = condition.get("$regex")
+    if not isinstance(pattern, string_type) or "$options" in condition:
+        return None
+    literal = _LITERAL_REGEX.match(pattern)
+    if literal is None:
+        return None
+    return literal.group(1)
+
+
+#######
+# Input
+#######
+
+def iter_lines(source, use_mmap=False):
+    """ Yields the lines of source, a path or a binary file object, as bytes.
+    Files are read in large chunks, or memory-mapped with use_mmap """
+    if isinstance(source, string_type):
+        with open(source, "rb", buffering=_BUFFER_SIZE) as stream:
+            for line in iter_lines(stream, use_mmap):
+                yield line
+        return
+
+    if use_mmap:
+        try:
+            mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            # Not a regular file (a pipe, an empty file...).
+            mapped = None
+        if mapped is not None:
+            with mapped:
+                start, size = 0, len(mapped)
+                while start < size:
+                    end = mapped.find(b"\n", start)
+                    end = size if end == -1 else end + 1
+                    yield mapped[start:end]
+                    start = end
+            return
+
+    for line in iter(lambda: source.readline(_BUFFER_SIZE), b""):
+        # Lines longer than the buffer are read in several pieces.
+        while not line.endswith(b"\n"):
+            rest = source.readline(_BUFFER_SIZE)
+            if not rest:
+                break
+            line += rest
+        yield line
+
+
+#########
+# Filters
+#########
+
+def iter_matches(query, lines, prefilter=True, skip_invalid=False):
+    """ Yields (line, document) pairs for the lines of NDJSON matching query,
+    given either as a Query or as a query definition. Lines are only decoded
+    if they contain the substrings returned by `required_substrings`, unless
+    prefilter is False. Invalid lines raise a ValueError, unless
+    skip_invalid. """
+    if not isinstance(query, Query):
+        query = Query(query)
+    matcher = query._matcher
+    substrings = required_substrings(query) if prefilter else []
+    decode = json.loads
+
+    for number, line in enumerate(lines, 1):
+        if substrings and not all(
+                substring in line for substring in substrings):
+            continue
+        if not line.strip():
+            continue
+        try:
+            document = decode(line)
+        except ValueError as error:
+            if skip_invalid:
+                continue
+            raise ValueError("line {}: {}".format(number, error))
+        if matcher(document):
+            yield line, document
+
+
+def filter_ndjson(query, source, output=None, use_mmap=False,
+                  prefilter=True, skip_invalid=False):
+    """ Writes the lines of source (a path or a binary file object) matching
+    query to output, a binary file object, or yields the matching documents
+    when output isn't given """
+    matches = iter_matches(
+        query, iter_lines(source, use_mmap), prefilter, skip_invalid)
+    if output is None:
+        return (document for _, document in matches)
+
+    count = 0
+    for line, _ in matches:
+        output.write(line)
+        if not line.endswith(b"\n"):
+            output.write(b"\n")
+        count += 1
+    return count
+
+
+#########
+# Command
+#########
+
+def main(argv=None, stdin=None, stdout=None):
+    """ Command line entry point, see ``python -m mongoquery --help`` """
+    parser = argparse.ArgumentParser(
+        prog="python -m mongoquery",
+        description="Writes the lines of newline-delimited JSON files "
+                    "matching a MongoDB query.")
+    parser.add_argument("query", help="the query, as JSON")
+    parser.add_argument(
+        "files", nargs="*", default=["-"],
+        help="files to read, '-' for standard input (default)")
+    parser.add_argument(
+        "-c", "--count", action="store_true",
+        help="only write the number of matching lines")
+    parser.add_argument(
+        "--mmap", action="store_true", help="memory-map the files")
+    parser.add_argument(
+        "--no-prefilter", action="store_true",
+        help="decode every line, even those which can't match")
+    parser.add_argument(
+        "--skip-invalid", action="store_true",
+        help="skip lines which aren't valid JSON instead of failing")
+    args = parser.parse_args(argv)
+
+    stdin = stdin if stdin is not None else sys.stdin.buffer
+    stdout = stdout if stdout is not None else sys.stdout.buffer
+    try:
+        query = Query(json.loads(args.query))
+    except (ValueError, QueryError) as error:
+        parser.error("invalid query: {}".format(error))
+
+    count = 0
+    try:
+        for path in args.files:
+            source = stdin if path == "-" else path
+            if args.count:
+                count += sum(1 for _ in iter_matches(
+                    query, iter_lines(source, args.mmap),
+                    not args.no_prefilter, args.skip_invalid))
+            else:
+                filter_ndjson(
+                    query, source, stdout, args.mmap,
+                    not args.no_prefilter, args.skip_invalid)
+    except (ValueError, IOError) as error:
+        parser.exit(1, "{}: {}\n".format(parser.prog, error))
+    if args.count:
+        stdout.write("{}\n".format(count).encode("ascii"))
+    stdout.flush()
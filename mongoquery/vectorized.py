@@ -0,0 +1,356 @@
+"""
+Vectorized evaluation of queries over batches of objects, using NumPy.
+
+Numeric comparisons on fields are evaluated as boolean mask operations over
+whole columns rather than object by object. Objects for which a part of the
+query can't be vectorized (non numeric values, unsupported operators...) are
+matched using the regular `Query.match`, so that results are always the same
+as the ones of `Query`.
+
+NumPy is an optional dependency, installed with ``pip install
+mongoquery[numpy]``.
+"""
+
+from collections.abc import Mapping, Sequence
+
+from . import Query, QueryError, _Path, _Undefined, string_type
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+# Integers beyond this can't be represented exactly as float64.
+_MAX_EXACT_INT = 2 ** 53
+
+# Types which never compare equal to, nor are ordered against, a number (bytes
+# being sequences of integers, they aren't).
+_INERT_TYPES = frozenset([type(None), str, dict, _Undefined])
+_SEQUENCE_TYPES = frozenset([list, tuple])
+
+
+def _is_number(value):
+    if isinstance(value, float):
+        return True
+    if isinstance(value, int):
+        return -_MAX_EXACT_INT <= value <= _MAX_EXACT_INT
+    return False
+
+
+class _Column(object):
+    # pylint: disable=too-few-public-methods
+    """ The values of a field across a batch, along with masks telling which
+    of them are numbers, values which are neither numbers nor sequences and
+    never compare to numbers, and non-string sequences """
+
+    def __init__(self, values, numeric, inert, sequence):
+        self.values = values
+        self.numeric = numeric
+        self.inert = inert
+        self.sequence = sequence
+
+    @classmethod
+    def from_values(cls, values):
+        """ Classifies a list of python values """
+        types = [type(value) for value in values]
+        numeric = [
+            kind is float or kind is bool or (
+                kind is int and -_MAX_EXACT_INT <= value <= _MAX_EXACT_INT)
+            for value, kind in zip(values, types)
+        ]
+        return cls(
+            numpy.array([
+                value if is_numeric else 0.0
+                for value, is_numeric in zip(values, numeric)
+            ], dtype=float),
+            numpy.array(numeric, dtype=bool),
+            numpy.array([kind in _INERT_TYPES for kind in types], dtype=bool),
+            numpy.array(
+                [kind in _SEQUENCE_TYPES for kind in types], dtype=bool),
+        )
+
+    @classmethod
+    def from_array(cls, array):
+        """ Classifies a column given as an array """
+        array = numpy.asarray(array)
+        if array.dtype.kind in "biuf":
+            ones = numpy.ones(len(array), dtype=bool)
+            zeros = numpy.zeros(len(array), dtype=bool)
+            return cls(array, ones, zeros, zeros)
+        return cls.from_values(array.tolist())
+
+
+class _Batch(object):
+    """ Extracts and caches the columns referenced by a query from either a
+    sequence of objects or a mapping of field paths to columns """
+
+    def __init__(self, query, batch):
+        self._query = query
+        self._columns = {}
+        if isinstance(batch, Mapping):
+            self.arrays = {
+                path: numpy.asarray(array) for path, array in batch.items()}
+            self.records = None
+            self.size = len(next(iter(self.arrays.values()), ()))
+        else:
+            if not isinstance(batch, Sequence):
+                batch = list(batch)
+            self.arrays = None
+            self.records = batch
+            self.size = len(batch)
+
+    def column(self, path):
+        """ Returns the column of the field at path """
+        column = self._columns.get(path)
+        if column is None:
+            if self.arrays is not None:
+                dotted = ".".join(path)
+                if dotted not in self.arrays:
+                    raise QueryError(
+                        "no column provided for {!r}".format(dotted))
+                column = _Column.from_array(self.arrays[dotted])
+            else:
+                column = _Column.from_values(self._extract_all(path))
+            self._columns[path] = column
+        return column
+
+    def _extract_all(self, path):
+        extract = _Path(path).extract
+        values = []
+        append = values.append
+        for record in self.records:
+            try:
+                append(extract(record))
+            except IndexError:
+                append(_Undefined())
+        return values
+
+    def record(self, index):
+        """ Returns the object at index, rebuilt from the columns if needed """
+        if self.records is not None:
+            return self.records[index]
+        record = {}
+        for dotted, array in self.arrays.items():
+            path = dotted.split(".")
+            parent = record
+            for key in path[:-1]:
+                parent = parent.setdefault(key, {})
+            value = array[index]
+            parent[path[-1]] = value.item() if hasattr(value, "item") else value
+        return record
+
+    def constant(self, value):
+        """ Returns a mask with all values set to value """
+        return numpy.full(self.size, value, dtype=bool)
+
+
+class VectorizedQuery(Query):
+    """ A Query which can also be evaluated over a whole batch at once
+
+    A batch is either a sequence of objects, or a mapping of dotted field
+    paths to columns (NumPy arrays or sequences) of equal length. Each node of
+    the query evaluates into a pair of masks, the objects known to match it
+    and the objects known not to match it. Objects neither known to match nor
+    known not to match the whole query are matched using `Query.match`.
+    """
+
+    def __init__(self, definition):
+        if numpy is None:
+            raise ImportError(
+                "VectorizedQuery requires numpy, which can be installed "
+                "with `pip install mongoquery[numpy]`")
+        super(VectorizedQuery, self).__init__(definition)
+        self._plan = self._vectorize(definition)
+
+    def mask(self, batch):
+        """ Returns a boolean NumPy array telling which objects of the batch
+        match the query """
+        batch = _Batch(self, batch)
+        matched, unmatched = self._plan(batch)
+        unknown = numpy.flatnonzero(~(matched | unmatched))
+        if len(unknown):
+            matched = matched.copy()
+            for index in unknown:
+                matched[index] = bool(self._matcher(batch.record(index)))
+        return matched
+
+    def indices(self, batch):
+        """ Returns the indices of the objects of the batch matching the
+        query """
+        return numpy.flatnonzero(self.mask(batch))
+
+    ###############
+    # Vectorization
+    ###############
+
+    def _vectorize(self, condition):
+        if not isinstance(condition, Mapping):
+            return _unknown
+        nodes = []
+        for operator, sub_condition in condition.items():
+            if not isinstance(operator, string_type):
+                nodes.append(_unknown)
+            elif operator in ("$and", "$or", "$nor"):
+                children = [self._vectorize(sub) for sub in sub_condition]
+                if operator == "$and":
+                    nodes.append(_and(children))
+                elif operator == "$or":
+                    nodes.append(_or(children))
+                else:
+                    nodes.append(_not(_or(children)))
+            elif operator == "$comment":
+                nodes.append(_always)
+            elif operator.startswith("$"):
+                nodes.append(_unknown)
+            else:
+                nodes.append(self._vectorize_field(
+                    tuple(operator.split(".")), sub_condition))
+        return _and(nodes)
+
+    def _vectorize_field(self, path, condition):
+        if not isinstance(condition, Mapping):
+            if not _is_number(condition):
+                return _unknown
+            return _compare(path, condition, _VALUE_COMPARISON)
+        if "$exists" in condition:
+            # $exists on a dotted path disregards the other operators.
+            return _unknown
+
+        nodes = []
+        for operator, sub_condition in condition.items():
+            if operator == "$not":
+                nodes.append(_not(self._vectorize_field(path, sub_condition)))
+            elif operator == "$comment":
+                nodes.append(_always)
+            elif operator in _COMPARISONS:
+                if not _is_number(sub_condition):
+                    nodes.append(_unknown)
+                    continue
+                nodes.append(
+                    _compare(path, sub_condition, _COMPARISONS[operator]))
+            elif operator in ("$in", "$nin"):
+                if not (
+                        isinstance(sub_condition, (list, tuple))
+                        and all(_is_number(item) for item in sub_condition)):
+                    nodes.append(_unknown)
+                    continue
+                node = _isin(path, sub_condition)
+                nodes.append(node if operator == "$in" else _not(node))
+            elif operator == "$mod":
+                nodes.append(_mod(path, sub_condition))
+            else:
+                nodes.append(_unknown)
+        return _and(nodes)
+
+
+#######
+# Nodes
+#######
+
+def _always(batch):
+    return batch.constant(True), batch.constant(False)
+
+
+def _unknown(batch):
+    return batch.constant(False), batch.constant(False)
+
+
+def _and(nodes):
+    if len(nodes) == 1:
+        return nodes[0]
+
+    def vectorized_and(batch):
+        matched, unmatched = batch.constant(True), batch.constant(False)
+        for node in nodes:
+            node_matched, node_unmatched = node(batch)
+            matched &= node_matched
+            unmatched |= node_unmatched
+        return matched, unmatched
+    return vectorized_and
+
+
+def _or(nodes):
+    if len(nodes) == 1:
+        return nodes[0]
+
+    def vectorized_or(batch):
+        matched, unmatched = batch.constant(False), batch.constant(True)
+        for node in nodes:
+            node_matched, node_unmatched = node(batch)
+            matched |= node_matched
+            unmatched &= node_unmatched
+        return matched, unmatched
+    return vectorized_or
+
+
+def _not(node):
+    def vectorized_not(batch):
+        matched, unmatched = node(batch)
+        return unmatched, matched
+    return vectorized_not
+
+
+# Comparison operators, as the name of the NumPy function comparing numbers,
+# whether values which never compare to numbers match, and whether non-string
+# sequences match (None when it depends on their content).
+_COMPARISONS = {
+    "$eq": ("equal", False, False),
+    "$ne": ("not_equal", True, True),
+    "$gt": ("greater", False, False),
+    "$gte": ("greater_equal", False, False),
+    "$lt": ("less", False, False),
+    "$lte": ("less_equal", False, False),
+}
+
+# Matching a plain value also matches sequences containing it.
+_VALUE_COMPARISON = ("equal", False, None)
+
+
+def _compare(path, condition, comparison):
+    name, inert, sequence = comparison
+    compare = getattr(numpy, name)
+
+    def vectorized_compare(batch):
+        column = batch.column(path)
+        result = compare(column.values, condition)
+        matched = column.numeric & result
+        unmatched = column.numeric & ~result
+        if inert:
+            matched |= column.inert
+        else:
+            unmatched |= column.inert
+        if sequence is True:
+            matched |= column.sequence
+        elif sequence is False:
+            unmatched |= column.sequence
+        return matched, unmatched
+    return vectorized_compare
+
+
+def _isin(path, condition):
+    condition = numpy.asarray(condition, dtype=float)
+
+    def vectorized_isin(batch):
+        column = batch.column(path)
+        result = numpy.isin(column.values, condition)
+        return (
+            column.numeric & result,
+            (column.numeric & ~result) | column.inert
+        )
+    return vectorized_isin
+
+
+def _mod(path, condition):
+    try:
+        divisor, remainder = condition[0], condition[1]
+    except (TypeError, IndexError, KeyError):
+        return _unknown
+    if not (_is_number(divisor) and _is_number(remainder)) or not divisor:
+        return _unknown
+
+    def vectorized_mod(batch):
+        column = batch.column(path)
+        result = numpy.remainder(column.values, divisor) == remainder
+        return column.numeric & result, column.numeric & ~result
+    return vectorized_mod
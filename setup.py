@@ -27,6 +27,10 @@ setup(
                 "a similar fashion to what is produced by JSON or YAML "
                 "parsers.",
     install_requires=['six'],
+    extras_require={
+        'numpy': ['numpy'],
+        'bson': ['pymongo'],
+    },
     long_description=README,
     author_email='olivier.carrere@gmail.com',
     url='http://github.com/kapouille/mongoquery',
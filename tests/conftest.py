@@ -0,0 +1,5 @@
+import sys
+
+# mongoquery.aio requires Python 3.7 (asyncio.get_running_loop), and its
+# tests, made of asynchronous generators, don't even parse before 3.6.
+collect_ignore = ["test_aio.py"] if sys.version_info < (3, 7) else []
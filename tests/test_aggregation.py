@@ -0,0 +1,117 @@
+from unittest import TestCase
+
+from mongoquery import QueryError
+from mongoquery.aggregation import Pipeline, aggregate
+
+
+_SALES = [
+    {"_id": 1, "item": "abc", "price": 10, "quantity": 2, "shop": {"id": 1}},
+    {"_id": 2, "item": "jkl", "price": 20, "quantity": 1, "shop": {"id": 2}},
+    {"_id": 3, "item": "xyz", "price": 5, "quantity": 10, "shop": {"id": 1}},
+    {"_id": 4, "item": "xyz", "price": 5, "quantity": 20, "shop": {"id": 1}},
+    {"_id": 5, "item": "abc", "price": 10, "quantity": 10, "shop": {"id": 2}},
+    {"_id": 6, "item": "def", "price": 7.5, "shop": {"id": 2}},
+]
+
+
+class TestAggregation(TestCase):
+    def test_group(self):
+        self.assertEqual(
+            [
+                {"_id": "abc", "total": 12, "average": 6.0, "lowest": 10,
+                 "highest": 10, "count": 2},
+                {"_id": "xyz", "total": 30, "average": 15.0, "lowest": 5,
+                 "highest": 5, "count": 2},
+            ],
+            list(aggregate(_SALES, [
+                {"$match": {"quantity": {"$gte": 2}}},
+                {"$group": {
+                    "_id": "$item",
+                    "total": {"$sum": "$quantity"},
+                    "average": {"$avg": "$quantity"},
+                    "lowest": {"$min": "$price"},
+                    "highest": {"$max": "$price"},
+                    "count": {"$count": {}},
+                }},
+                {"$sort": {"_id": 1}},
+            ]))
+        )
+
+    def test_group_on_documents(self):
+        self.assertEqual(
+            [{"_id": {"shop": 1}, "sales": 3},
+             {"_id": {"shop": 2}, "sales": 3}],
+            list(aggregate(_SALES, [
+                {"$group": {"_id": {"shop": "$shop.id"},
+                            "sales": {"$sum": 1}}},
+            ]))
+        )
+        self.assertEqual(
+            [{"_id": None, "quantity": 43, "missing": None}],
+            list(aggregate(_SALES, [
+                {"$group": {"_id": None, "quantity": {"$sum": "$quantity"},
+                            "missing": {"$avg": "$missing"}}},
+            ]))
+        )
+
+    def test_project_sort_skip_limit(self):
+        self.assertEqual(
+            [{"item": "xyz", "shop": 1}, {"item": "abc", "shop": 2}],
+            list(aggregate(_SALES, [
+                {"$sort": {"quantity": -1, "_id": 1}},
+                {"$project": {"_id": 0, "item": 1, "shop": "$shop.id"}},
+                {"$skip": 1},
+                {"$limit": 2},
+            ]))
+        )
+        self.assertEqual(
+            [{"expensive": 2}],
+            list(aggregate(_SALES, [
+                {"$match": {"price": {"$gte": 10}}},
+                {"$limit": 3},
+                {"$match": {"shop.id": 2}},
+                {"$count": "expensive"},
+            ]))
+        )
+
+    def test_optimization(self):
+        pipeline = Pipeline([
+            {"$sort": {"price": 1}},
+            {"$match": {"price": {"$gt": 5}}},
+            {"$match": {"quantity": {"$exists": True}}},
+            {"$project": {"item": 1}},
+            {"$limit": 3},
+            {"$limit": 2},
+        ])
+        self.assertEqual(
+            ["$match", "$sort", "$limit", "$project"],
+            [name for name, _ in pipeline.stages]
+        )
+        self.assertEqual(
+            [{"_id": 1, "item": "abc"}, {"_id": 5, "item": "abc"}],
+            list(pipeline.run(_SALES))
+        )
+
+    def test_streaming(self):
+        def sales():
+            for sale in _SALES:
+                yield sale
+            raise AssertionError("consumed too many documents")
+        self.assertEqual(
+            [1, 2],
+            [sale["_id"] for sale in aggregate(sales(), [{"$limit": 2}])]
+        )
+
+    def test_invalid(self):
+        for stages in [
+                {"$match": {}},
+                [{"$unwind": "$items"}],
+                [{"$match": {}, "$limit": 1}],
+                [{"$group": {"total": {"$sum": 1}}}],
+                [{"$group": {"_id": None, "items": {"$push": "$item"}}}],
+                [{"$limit": 0}],
+                [{"$sort": {"price": 0}}],
+                [{"$project": {"item": 0, "shop": "$shop.id"}}],
+                [{"$project": {"item": 1, "qty": 0, "shop": "$shop.id"}}],
+        ]:
+            self.assertRaises(QueryError, Pipeline, stages)
@@ -0,0 +1,86 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from mongoquery import Query
+
+_ENTRIES = [{"a": index} for index in range(10)]
+
+
+async def _produce(entries, delay=0):
+    for entry in entries:
+        await asyncio.sleep(delay)
+        yield entry
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super(_CountingExecutor, self).submit(*args, **kwargs)
+
+
+class TestAsyncFilter(TestCase):
+    def test_afilter(self):
+        query = Query({"a": {"$gte": 7}})
+        expected = _ENTRIES[7:]
+        self.assertEqual(
+            expected, asyncio.run(_collect(query.afilter(_ENTRIES))))
+        self.assertEqual(
+            expected,
+            asyncio.run(_collect(query.afilter(_produce(_ENTRIES), 3))))
+
+    def test_afilter_batches(self):
+        query = Query({"a": {"$in": [1, 2, 8]}})
+        self.assertEqual(
+            [[_ENTRIES[1], _ENTRIES[2]], [_ENTRIES[8]]],
+            asyncio.run(_collect(
+                query.afilter_batches(_produce(_ENTRIES), batch_size=4))))
+        self.assertRaises(
+            ValueError, query.afilter_batches, _ENTRIES, batch_size=0)
+        self.assertRaises(ValueError, query.afilter, _ENTRIES, batch_size=0)
+
+    def test_event_loop_not_stalled(self):
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def run():
+            ticker = asyncio.ensure_future(tick())
+            matches = await _collect(
+                Query({"a": 1}).afilter(_ENTRIES * 100, batch_size=10))
+            ticker.cancel()
+            return matches
+
+        self.assertEqual([_ENTRIES[1]] * 100, asyncio.run(run()))
+        self.assertGreaterEqual(len(ticks), 99)
+
+    def test_executor(self):
+        query = Query({"a": {"$regex": "^1"}, "b": {"$lt": 3}})
+        entries = [{"a": str(index), "b": index % 5} for index in range(30)]
+        expected = list(query.filter(entries))
+        with _CountingExecutor(2) as executor:
+            self.assertEqual(expected, asyncio.run(_collect(
+                query.afilter(entries, 10, executor=executor))))
+            self.assertEqual(3, executor.submitted)
+
+            # Only batches costly enough are offloaded.
+            executor.submitted = 0
+            self.assertEqual(expected, asyncio.run(_collect(query.afilter(
+                entries, 25, executor=executor, offload_cost=100))))
+            self.assertEqual(1, executor.submitted)
+
+    def test_latency(self):
+        query = Query({"a": {"$gte": 0}})
+        batches = asyncio.run(_collect(query.afilter_batches(
+            _produce(_ENTRIES[:4], delay=0.05), batch_size=100,
+            latency=0.01)))
+        self.assertEqual([[entry] for entry in _ENTRIES[:4]], batches)
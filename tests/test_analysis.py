@@ -0,0 +1,62 @@
+import re
+from unittest import TestCase
+
+from mongoquery import Query, QueryError
+from mongoquery.analysis import analyze
+from mongoquery.planner import estimate_cost
+
+
+class TestAnalysis(TestCase):
+    def test_analysis(self):
+        definition = {
+            "status": "open",
+            "age": {"$gte": 18, "$lt": 65},
+            "tags": {"$in": ["a", "b", "c"]},
+            "items": {"$elemMatch": {
+                "qty": {"$gt": 1},
+                "parts": {"$elemMatch": {"name": {"$regex": "^x"}}},
+            }},
+            "$or": [{"city": "Paris", "zip": 1}, {"city": {"$in": ["Lyon"]}}],
+            "$nor": [{"deleted": True}],
+            "note": {"$exists": True},
+        }
+        analysis = Query(definition).analyze()
+        self.assertEqual(
+            {"status", "age", "tags", "items", "city", "zip", "deleted",
+             "note"},
+            analysis.paths)
+        self.assertEqual(
+            {"$eq", "$gte", "$lt", "$in", "$elemMatch", "$gt", "$regex",
+             "$or", "$nor", "$exists"},
+            analysis.operators)
+        self.assertEqual(
+            {"status": "any", "age": "ordered", "tags": "any",
+             "items": None, "city": "any", "zip": None, "deleted": None,
+             "note": None},
+            analysis.index_eligible)
+        self.assertEqual(estimate_cost(definition), analysis.cost)
+        self.assertEqual(2, analysis.elem_match_depth)
+        self.assertEqual(3, analysis.in_size)
+
+    def test_check(self):
+        analysis = analyze({"a": {"$in": list(range(1000))}})
+        analysis.check(max_cost=100, max_in_size=1000)
+        with self.assertRaisesRegex(QueryError, r"\$in size 1000 exceeds"):
+            analysis.check(max_in_size=100)
+        self.assertRaises(
+            QueryError, analyze({"a": {"$elemMatch": {"$elemMatch": {
+                "$gt": 1}}}}).check, max_elem_match_depth=1)
+
+    def test_regular_expressions_not_indexable(self):
+        analysis = analyze({
+            "a": {"$in": [re.compile("^x"), "q"]},
+            "b": re.compile("^x"),
+            "c": {"$in": ["x", "q"]},
+        })
+        self.assertEqual(
+            {"a": None, "b": None, "c": "any"}, analysis.index_eligible)
+
+    def test_whole_objects(self):
+        analysis = analyze({"$and": [{"$gt": 1}]})
+        self.assertIsNone(analysis.paths)
+        self.assertEqual({}, analysis.index_eligible)
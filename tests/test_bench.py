@@ -0,0 +1,27 @@
+import json
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery import bench
+
+
+class TestBench(TestCase):
+    def test_cases_match_their_documents(self):
+        for name, shape, definition in bench.CASES:
+            documents = bench._SHAPES[shape](50)
+            matched = Query(definition).count(documents)
+            self.assertTrue(0 < matched <= 50, name)
+
+    def test_run(self):
+        results = bench.run(sizes=[10, 20], repeat=1, names=["regex", "or"])
+        self.assertEqual(
+            [("regex", 10), ("regex", 20), ("or", 10), ("or", 20),
+             ("nor", 10), ("nor", 20)],
+            [(result["name"], result["size"])
+             for result in results["results"]]
+        )
+        results = json.loads(json.dumps(results))
+
+        ratios = bench.compare(results, results)
+        self.assertEqual({1.0}, set(ratios.values()))
+        self.assertIn("regex", bench.format_results(results, ratios))
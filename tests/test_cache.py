@@ -0,0 +1,145 @@
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery.cache import CachedQuery, QueryCache, query_cache
+from mongoquery.codegen import CompiledQuery
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCachedQuery(TestCase):
+    def setUp(self):
+        self.matched = []
+        self.cached = CachedQuery({"a": {"$gt": 1}, "b.c": "x"}, maxsize=2)
+        matcher = self.cached._matcher
+        self.cached._matcher = lambda entry: (
+            self.matched.append(entry) or matcher(entry))
+
+    def test_keys_and_versions(self):
+        document = {"a": 2, "b": {"c": "x"}}
+        self.assertTrue(self.cached.match(document, key=1, version=1))
+        document["a"] = 0
+        self.assertTrue(self.cached.match(document, key=1, version=1))
+        self.assertFalse(self.cached.match(document, key=1, version=2))
+        self.assertFalse(self.cached.match(document, key=1, version=2))
+        self.assertEqual((2, 2), (self.cached.hits, self.cached.misses))
+
+        self.cached.invalidate(1)
+        self.assertFalse(self.cached.match(document, key=1, version=2))
+        self.assertEqual(3, len(self.matched))
+
+    def test_fields(self):
+        self.assertTrue(self.cached.match({"a": 2, "b": {"c": "x"}, "d": 1}))
+        self.assertTrue(self.cached.match({"a": 2, "b": {"c": "x"}, "d": 2}))
+        self.assertFalse(self.cached.match({"a": 2, "b": {"c": "y"}}))
+        self.assertFalse(self.cached.match({"a": 2, "b": [{"c": "y"}]}))
+        self.assertEqual(3, len(self.matched))
+
+        # Equal values of different types aren't confused.
+        cached = CachedQuery({"a": {"$type": "bool"}})
+        self.assertTrue(cached.match({"a": True}))
+        self.assertFalse(cached.match({"a": 1}))
+        cached = CachedQuery({"a": {"$eq": [1, 2]}})
+        self.assertTrue(cached.match({"a": [1, 2]}))
+        self.assertFalse(cached.match({"a": (1, 2)}))
+        self.assertFalse(cached.match({"a": b"\x01\x02"}))
+
+        # Results for unhashable values aren't cached.
+        self.assertFalse(self.cached.match({"a": {1, 2}}))
+        self.assertFalse(self.cached.match({"a": {1, 2}}))
+        self.assertEqual(5, len(self.matched))
+        self.assertEqual(2, len(self.cached))
+
+    def test_eviction(self):
+        for key in (1, 2, 1, 3):
+            self.cached.match({"a": 2}, key=key)
+        self.assertEqual(1, self.cached.evictions)
+        self.assertEqual(2, len(self.cached))
+        self.cached.match({"a": 2}, key=1)
+        self.cached.match({"a": 2}, key=2)
+        self.assertEqual(4, len(self.matched))
+
+        self.cached.clear()
+        self.assertEqual(0, len(self.cached))
+
+    def test_ttl(self):
+        clock = _Clock()
+        cached = CachedQuery(Query({"a": 1}), ttl=10, clock=clock)
+        cached.match({"a": 1}, key="x")
+        clock.now = 5
+        cached.match({"a": 1}, key="x")
+        clock.now = 10
+        cached.match({"a": 1}, key="x")
+        self.assertEqual((1, 2), (cached.hits, cached.misses))
+
+
+class TestQueryCache(TestCase):
+    def test_equivalent_definitions(self):
+        cache = QueryCache()
+        query = cache.get({"a": {"$gt": 1, "$lt": 5}, "b": [1, {"c": 2}]})
+        self.assertIs(
+            query,
+            cache.get({"b": [1, {"c": 2}], "a": {"$lt": 5, "$gt": 1}}))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+        # Values of different types, and lists in a different order, match
+        # differently.
+        for definition in [
+                {"a": {"$gt": 1, "$lt": 5}, "b": [{"c": 2}, 1]},
+                {"a": {"$gt": 1, "$lt": 5}, "b": (1, {"c": 2})},
+                {"a": {"$gt": True, "$lt": 5}, "b": [1, {"c": 2}]},
+                {"a": {"$gt": 1.0, "$lt": 5}, "b": [1, {"c": 2}]}]:
+            self.assertIsNot(query, cache.get(definition))
+        self.assertEqual((1, 5), (cache.hits, cache.misses))
+
+        # Conditions which may raise keep their position.
+        cache.get({"a": {"$mod": [2, 0]}, "b": 1})
+        query = cache.get({"b": 1, "a": {"$mod": [2, 0]}})
+        self.assertEqual(["b", "a"], list(query._definition))
+        self.assertFalse(query.match({"a": "x", "b": 2}))
+        self.assertIs(
+            cache.get({"b": 1, "c": 2, "a": {"$mod": [2, 0]}}),
+            cache.get({"c": 2, "b": 1, "a": {"$mod": [2, 0]}}))
+
+    def test_definitions_copied(self):
+        cache = QueryCache()
+        definition = {"a": {"$in": [1, 2]}}
+        query = cache.get(definition)
+        definition["a"]["$in"].append(3)
+        self.assertEqual({"a": {"$in": [1, 2]}}, query._definition)
+        self.assertFalse(query.match({"a": 3}))
+        self.assertIsNot(query, cache.get(definition))
+
+    def test_eviction(self):
+        cache = QueryCache(maxsize=2)
+        first = cache.get({"a": 1})
+        cache.get({"a": 2})
+        self.assertIs(first, cache.get({"a": 1}))
+        cache.get({"a": 3})
+        self.assertEqual((2, 1), (len(cache), cache.evictions))
+        self.assertIs(first, cache.get({"a": 1}))
+        cache.clear()
+        self.assertEqual(0, len(cache))
+
+    def test_unhashable_values(self):
+        class Unhashable(object):
+            __hash__ = None
+
+        cache = QueryCache()
+        definition = {"a": Unhashable()}
+        self.assertIsNot(cache.get(definition), cache.get(definition))
+        self.assertEqual((0, 2, 0), (cache.hits, cache.misses, len(cache)))
+
+    def test_query_classes(self):
+        query = Query.cached({"a": {"$gt": 1}})
+        self.assertIs(query, Query.cached({"a": {"$gt": 1}}))
+        compiled = CompiledQuery.cached({"a": {"$gt": 1}})
+        self.assertIsInstance(compiled, CompiledQuery)
+        self.assertIsNot(query, compiled)
+        self.assertIs(query, query_cache.get({"a": {"$gt": 1}}))
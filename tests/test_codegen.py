@@ -0,0 +1,77 @@
+import pickle
+from unittest import TestCase, mock
+
+import test_query
+
+from mongoquery import Query
+from mongoquery.codegen import CompiledQuery
+
+
+class TestCompiledQuerySuite(test_query.TestQuery):
+    """ Runs the tests of Query against CompiledQuery """
+
+    def setUp(self):
+        super(TestCompiledQuerySuite, self).setUp()
+        patcher = mock.patch.object(test_query, "Query", CompiledQuery)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestCompiledQuery(TestCase):
+    def test_same_results(self):
+        class Record(dict):
+            pass
+
+        entries = [
+            {"a": 5, "b": {"c": "x"}},
+            {"a": 5.5, "b": [{"c": "y"}, {"c": "x"}]},
+            {"a": "5", "b": {"c": ["x"]}},
+            {"a": [1, 7], "b": None},
+            {"a": None, "b": {"d": 1}},
+            {"b": Record(c="x")},
+            Record(a=4, b={"c": "x"}),
+            {"a": {"b": 1}, "c": (1, 2)},
+            [1, 2],
+        ]
+        definitions = [
+            {"a": {"$gt": 3}, "b.c": "x"},
+            {"a": {"$lte": "5"}},
+            {"a": {"$eq": None}},
+            {"a": {"$ne": 5}, "b.d": {"$exists": False}},
+            {"a": {"$in": [1, 5, "5"]}, "b.c": {"$nin": ["y"]}},
+            {"$or": [{"a": 5}, {"b.c": {"$regex": "^X", "$options": "i"}}]},
+            {"$nor": [{"a": {"$type": "string"}}], "$and": [{"b.c": "x"}]},
+            {"a.b": 1, "c": {"$size": 2}, "$comment": "nested"},
+            {"a": [1, 7], "b.0.c": "y"},
+            {"$or": [], "a": 5},
+            {"$nor": []},
+        ]
+        for definition in definitions:
+            self.assertEqual(
+                list(Query(definition).filter(entries)),
+                list(CompiledQuery(definition).filter(entries)),
+                definition
+            )
+
+    def test_source(self):
+        query = CompiledQuery({"a": {"$gt": 3}, "b.c": "x"})
+        self.assertIn("def ", query.source)
+        self.assertIn(".get('c', _M)", query.source)
+        self.assertIs(True, query.match({"a": 4, "b": {"c": "x"}}))
+        self.assertIs(False, query.match({"a": 3, "b": {"c": "x"}}))
+
+    def test_comparisons_swallow_type_errors(self):
+        query = CompiledQuery({"a": {"$gt": 3}})
+        self.assertFalse(query.match({"a": "4"}))
+        self.assertFalse(query.match({"a": {"b": 4}}))
+        self.assertFalse(query.match({}))
+        self.assertFalse(query.match({"a": [1, 4]}))
+        self.assertTrue(query.match({"a": 4.5}))
+
+    def test_malformed_query_rejected(self):
+        self.assertRaises(test_query.QueryError, CompiledQuery, {"$foo": 2})
+
+    def test_pickle(self):
+        query = pickle.loads(pickle.dumps(CompiledQuery({"a.b": 1})))
+        self.assertIsInstance(query, CompiledQuery)
+        self.assertTrue(query.match({"a": [{"b": 3}, {"b": 1}]}))
@@ -0,0 +1,81 @@
+import re
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery.collection import IndexedCollection
+
+_RECORDS = [
+    {"a": 5, "b": {"c": "x"}, "tags": ["red", "blue"]},
+    {"a": 3, "b": {"c": "y"}, "tags": ["blue"]},
+    {"a": 2.5, "b": [{"c": "x"}, {"c": "z"}]},
+    {"a": "3", "b": None, "tags": "red"},
+    {"a": None, "tags": []},
+    {"b": {"c": "y"}, "tags": [["red"], "green"]},
+    {"a": [1, 4], "b": {"c": 3}},
+]
+
+
+class TestIndexedCollection(TestCase):
+    def setUp(self):
+        self.collection = IndexedCollection(_RECORDS)
+        self.collection.create_index("a", ordered=True)
+        self.collection.create_index("b.c")
+        self.collection.create_index("tags")
+
+    def assertSameAsQuery(self, definition):
+        expected = list(filter(Query(definition).match, self.collection))
+        self.assertEqual(expected, list(self.collection.find(definition)))
+        self.assertEqual(len(expected), self.collection.count(definition))
+
+    def test_equality(self):
+        self.assertSameAsQuery({"a": 3})
+        self.assertSameAsQuery({"a": "3"})
+        self.assertSameAsQuery({"a": 4})
+        self.assertSameAsQuery({"a": None})
+        self.assertSameAsQuery({"b.c": "x"})
+        self.assertSameAsQuery({"tags": "red"})
+        self.assertSameAsQuery({"tags": ["red"]})
+        self.assertSameAsQuery({"tags": {"$eq": "blue"}})
+        self.assertSameAsQuery({"tags": {"$in": ["green", "blue"]}})
+        self.assertSameAsQuery({"b.c": {"$in": [3, {"d": 1}]}})
+        self.assertSameAsQuery({"b.c": {"$in": [re.compile("^[xy]"), 3]}})
+        self.assertSameAsQuery({"b.c": re.compile("^[xy]")})
+
+    def test_range(self):
+        self.assertSameAsQuery({"a": {"$gt": 2.5}})
+        self.assertSameAsQuery({"a": {"$gte": 2.5, "$lt": 5}})
+        self.assertSameAsQuery({"a": {"$lte": "5"}})
+        self.assertSameAsQuery({"a": {"$gt": 2, "$in": [3, 5, "3"]}})
+
+    def test_logical(self):
+        self.assertSameAsQuery({"$or": [{"a": 3}, {"tags": "red"}]})
+        self.assertSameAsQuery({"$or": [{"a": 3}, {"d": 1}]})
+        self.assertSameAsQuery({"$and": [{"a": {"$gt": 1}}, {"b.c": "x"}]})
+        self.assertSameAsQuery({"a": {"$gt": 1}, "tags": {"$size": 1}})
+
+    def test_index_narrows_candidates(self):
+        candidates = self.collection._candidates({"a": {"$gte": 3}, "b.c": "y"})
+        self.assertEqual({2}, candidates)
+        self.assertIsNone(self.collection._candidates({"d": 1}))
+
+    def test_modifications(self):
+        collection = self.collection
+        doc_id = collection.insert({"a": 7, "b": {"c": "x"}})
+        self.assertEqual([doc_id], list(collection.find_ids({"a": 7})))
+
+        collection.update(doc_id, {"a": 8, "b": {"c": "w"}})
+        self.assertEqual([], list(collection.find_ids({"a": 7})))
+        self.assertEqual([doc_id], list(collection.find_ids({"b.c": "w"})))
+
+        collection.get(doc_id)["a"] = 9
+        collection.update(doc_id)
+        self.assertEqual([doc_id], list(collection.find_ids({"a": {"$gt": 8}})))
+
+        self.assertEqual({"a": 9, "b": {"c": "w"}}, collection.remove(doc_id))
+        self.assertEqual([], list(collection.find_ids({"a": {"$gt": 8}})))
+        self.assertEqual(len(_RECORDS), len(collection))
+
+    def test_create_and_drop_index(self):
+        self.collection.drop_index("tags")
+        self.assertEqual(["a", "b.c"], self.collection.indexes)
+        self.assertSameAsQuery({"tags": "red"})
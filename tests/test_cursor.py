@@ -0,0 +1,79 @@
+import random
+from datetime import datetime
+from unittest import TestCase
+
+from mongoquery import Query, QueryError
+from mongoquery.cursor import sort_key
+
+
+class TestCursor(TestCase):
+    def setUp(self):
+        rand = random.Random(0)
+        self.documents = [
+            {"_id": index, "qty": rand.randint(0, 20),
+             "item": {"name": rand.choice("abcde")}}
+            for index in range(100)
+        ]
+
+    def test_sort_skip_limit(self):
+        expected = sorted(
+            (document for document in self.documents if document["qty"] > 5),
+            key=lambda document: (-document["qty"], document["item"]["name"]))
+        query = Query({"qty": {"$gt": 5}})
+        self.assertEqual(
+            expected,
+            list(query.find(self.documents).sort(
+                [("qty", -1), ("item.name", 1)]))
+        )
+        self.assertEqual(
+            expected[10:15],
+            list(query.find(self.documents).sort(
+                {"qty": -1, "item.name": 1}).skip(10).limit(5))
+        )
+
+    def test_stream_without_sort(self):
+        def documents():
+            for document in self.documents:
+                yield document
+            raise AssertionError("consumed too many documents")
+        self.assertEqual(
+            [2, 3],
+            [document["_id"] for document in Query({}).find(
+                documents()).skip(2).limit(2)]
+        )
+
+    def test_projection(self):
+        self.assertEqual(
+            [{"_id": 0}, {"_id": 1}],
+            list(Query({}).find(self.documents, {"_id": 1}).limit(2))
+        )
+
+    def test_mixed_types(self):
+        values = [
+            datetime(2020, 1, 1), True, b"\x00", [1, 2], {"a": 1}, "abc",
+            2.5, 1, float("nan"), None,
+        ]
+        self.assertEqual(
+            list(reversed(values)), sorted(values, key=sort_key))
+        documents = [{"a": value} for value in values] + [{}, {"a": []}]
+        ordered = [
+            document.get("a", "missing") for document in
+            Query({}).find(documents).sort({"a": 1})
+        ]
+        # Arrays sort by their smallest element, missing fields as null.
+        self.assertEqual(
+            [[], None, "missing", [1, 2], 1, 2.5, "abc", {"a": 1}, b"\x00",
+             True, datetime(2020, 1, 1)],
+            [value for value in ordered
+             if not (isinstance(value, float) and value != value)]
+        )
+        descending = list(Query({}).find(documents).sort({"a": -1}))
+        self.assertEqual(values[0], descending[0]["a"])
+        self.assertEqual([], descending[-1]["a"])
+
+    def test_invalid(self):
+        cursor = Query({}).find([])
+        self.assertRaises(QueryError, cursor.sort, {"a": 2})
+        self.assertRaises(QueryError, cursor.sort, {})
+        self.assertRaises(QueryError, cursor.skip, -1)
+        self.assertRaises(QueryError, cursor.limit, "1")
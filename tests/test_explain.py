@@ -0,0 +1,98 @@
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery.codegen import CompiledQuery
+from mongoquery.explain import InstrumentedQuery, instrumented_class
+from mongoquery.planner import PlannedQuery
+
+_RECORDS = [
+    {"a": i, "b": "line {}".format(i), "c": [{"d": i}, {"d": i + 1}]}
+    for i in range(10)
+]
+
+
+def _operators(node):
+    return [
+        node["operator"], [_operators(child) for child in node["children"]]]
+
+
+class TestExplain(TestCase):
+    def test_plan(self):
+        explanation = Query({
+            "a": {"$gt": 1, "$lt": 8},
+            "$or": [{"b": {"$regex": "1$"}, "a": 1}, {"c.d": 5}],
+        }).explain()
+        self.assertNotIn("executionStats", explanation)
+        plan = explanation["queryPlanner"]["winningPlan"]
+        self.assertEqual(
+            ["$query", [
+                ["a", [["$and", [["$gt", []], ["$lt", []]]]]],
+                ["$or", [
+                    ["$and", [["b", [["$regex", []]]], ["a", []]]],
+                    ["c.d", []],
+                ]],
+            ]],
+            _operators(plan))
+        self.assertNotIn("calls", plan)
+
+    def test_execution_stats(self):
+        stats = Query({"a": {"$gte": 2}, "c.d": {"$in": [4, 7]}}).explain(
+            _RECORDS)["executionStats"]
+        self.assertEqual(4, stats["nReturned"])
+        self.assertEqual(10, stats["totalDocsExamined"])
+        root = stats["executionStages"]
+        self.assertEqual((10, 4, 6), (
+            root["calls"], root["matched"], root["unmatched"]))
+        a, c_d = root["children"]
+        self.assertEqual((10, 8), (a["calls"], a["matched"]))
+        self.assertEqual((8, 4), (c_d["calls"], c_d["matched"]))
+        self.assertGreaterEqual(root["time"], a["time"] + c_d["time"])
+        self.assertGreaterEqual(root["self_time"], 0)
+
+    def test_instrumented_query(self):
+        evaluations = []
+        query = InstrumentedQuery(
+            {"$nor": [{"a": 3}, {"b": {"$regex": "^x"}}]},
+            hooks=[lambda node, result, elapsed: evaluations.append(
+                (node.path, bool(result)))])
+        self.assertEqual(
+            list(Query(query._definition).filter(_RECORDS)),
+            list(query.filter(_RECORDS)))
+        self.assertIn((("$query", "$nor", "a"), True), evaluations)
+        self.assertEqual(
+            len(evaluations), sum(node.calls for node in query.nodes()))
+
+        regex = [node for node in query.nodes() if node.operator == "$regex"]
+        self.assertEqual(9, regex[0].calls)
+        query.reset()
+        self.assertEqual(0, regex[0].calls)
+
+    def test_query_subclasses(self):
+        definition = {"b": {"$regex": "^line"}, "a": 3}
+        stats = PlannedQuery(definition, sample_size=5).explain(
+            _RECORDS)["executionStats"]
+        self.assertEqual(1, stats["nReturned"])
+        b, a = stats["executionStages"]["children"]
+        self.assertEqual((10, 1), (a["calls"], b["calls"]))
+
+        instrumented = instrumented_class(PlannedQuery)
+        self.assertIs(instrumented, instrumented_class(PlannedQuery))
+        self.assertTrue(issubclass(instrumented, PlannedQuery))
+        self.assertIs(instrumented, instrumented_class(instrumented))
+        self.assertIs(InstrumentedQuery, instrumented_class(Query))
+        self.assertRaises(
+            TypeError, CompiledQuery(definition).explain, _RECORDS)
+
+    def test_array_fan_out_stops_at_first_match(self):
+        class Items(list):
+            visited = 0
+
+            def __iter__(self):
+                for item in list.__iter__(self):
+                    self.visited += 1
+                    yield item
+
+        items = Items({"memo": str(index)} for index in range(10))
+        query = InstrumentedQuery({"items.memo": "2"})
+        self.assertTrue(query.match({"items": items}))
+        self.assertEqual(3, items.visited)
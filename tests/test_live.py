@@ -0,0 +1,80 @@
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery.collection import IndexedCollection
+from mongoquery.live import LiveView
+
+
+class TestLiveView(TestCase):
+    def setUp(self):
+        self.collection = IndexedCollection([
+            {"status": "open", "owner": {"name": "ann"}, "views": 1},
+            {"status": "closed", "owner": {"name": "bob"}, "views": 2},
+            {"status": "open", "owner": {"name": "bob"}, "views": 3},
+        ])
+        self.events = []
+        self.view = LiveView(
+            self.collection,
+            {"status": "open", "owner.name": "bob"},
+            lambda *event: self.events.append(event[:2]))
+
+    def test_initial(self):
+        self.assertEqual([3], sorted(self.view.ids))
+        self.assertEqual((set(), set()), self.view.changes())
+
+    def test_deltas(self):
+        doc_id = self.collection.insert(
+            {"status": "open", "owner": {"name": "bob"}})
+        self.collection.update(2, {"status": "open", "owner": {"name": "bob"}})
+        self.collection.remove(3)
+        self.collection.insert({"status": "closed"})
+        self.assertEqual(
+            [("added", doc_id), ("added", 2), ("removed", 3)], self.events)
+        self.assertEqual(({2, doc_id}, {3}), self.view.changes())
+        self.assertEqual({2, doc_id}, set(self.view.ids))
+
+        # Changes cancelling each other out aren't reported.
+        self.collection.update(2, {"status": "closed"})
+        self.collection.update(2, {"status": "open", "owner": {"name": "bob"}})
+        self.assertEqual((set(), set()), self.view.changes())
+        self.assertEqual(
+            list(Query(self.view.query._definition).filter(self.collection)),
+            list(self.view))
+
+    def test_irrelevant_updates(self):
+        calls = []
+        self.view._matcher = lambda document: calls.append(document) or True
+        self.collection.update(
+            3, {"status": "open", "owner": {"name": "bob"}, "views": 4})
+        self.collection.update(1, changed=["views"])
+        self.assertEqual([], calls)
+        self.collection.update(1, changed=["owner.name"])
+        self.collection.update(1, changed=["owner"])
+        self.collection.update(1)
+        self.assertEqual(3, len(calls))
+
+    def test_update_in_place(self):
+        document = self.collection.get(1)
+        document["owner"] = {"name": "bob"}
+        self.collection.update(1, document)
+        self.assertEqual([1, 3], sorted(self.view.ids))
+        self.assertEqual([("added", 1)], self.events)
+
+    def test_array_indexes(self):
+        doc_id = self.collection.insert({"items": [{"n": 0}, {"n": 1}]})
+        view = LiveView(self.collection, {"items.n": 2})
+        self.collection.get(doc_id)["items"][-1]["n"] = 2
+        self.collection.update(doc_id, changed=["items.-1.n"])
+        self.assertEqual([doc_id], list(view.ids))
+
+    def test_close(self):
+        self.view.close()
+        self.collection.insert({"status": "open", "owner": {"name": "bob"}})
+        self.assertEqual([], self.events)
+
+    def test_paths(self):
+        self.assertEqual(
+            {"a", "b.c", "d"},
+            Query({"a": 1, "$or": [{"b.c": {"$gt": 1}}, {"d": None}],
+                   "$comment": "paths"}).paths)
+        self.assertIsNone(Query({"$and": [{"$comment": "x", "$gt": 1}]}).paths)
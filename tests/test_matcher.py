@@ -0,0 +1,78 @@
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery.matcher import QuerySet
+
+_QUERIES = {
+    "food": {"type": "food"},
+    "cheap": {"price": {"$lt": 3}},
+    "rated": {"ratings": {"$in": [8, 10]}, "qty": {"$gt": 5}},
+    "billing": {"memos.by": "billing"},
+    "either": {"$or": [{"type": "fruit"}, {"item": "xyz"}]},
+    "elem": {"memos": {"$elemMatch": {"memo": "delayed"}}},
+}
+
+_DOCUMENTS = [
+    {
+        "type": "food", "item": "xyz", "qty": 25, "price": 2.5,
+        "ratings": [5, 8, 9],
+        "memos": [
+            {"memo": "on time", "by": "shipping"},
+            {"memo": "approved", "by": "billing"}
+        ]
+    },
+    {
+        "type": "fruit", "item": "jkl", "qty": 10, "price": 4.25,
+        "ratings": [5, 9],
+        "memos": [
+            {"memo": "on time", "by": "payment"},
+            {"memo": "delayed", "by": "shipping"}
+        ]
+    },
+    {"type": "ham"},
+]
+
+
+class TestQuerySet(TestCase):
+    def assertSameAsQueries(self, query_set, queries):
+        for document in _DOCUMENTS:
+            self.assertEqual(
+                [
+                    query_id for query_id, definition in queries.items()
+                    if Query(definition).match(document)
+                ],
+                query_set.match(document)
+            )
+
+    def test_match(self):
+        query_set = QuerySet(_QUERIES)
+        self.assertEqual(len(_QUERIES), len(query_set))
+        self.assertEqual(
+            ["food", "cheap", "rated", "billing", "either"],
+            query_set.match(_DOCUMENTS[0])
+        )
+        self.assertSameAsQueries(query_set, _QUERIES)
+
+    def test_indexed_queries(self):
+        query_set = QuerySet(_QUERIES)
+        self.assertEqual({"cheap", "elem"}, query_set._unindexed)
+        self.assertEqual(
+            {"cheap", "elem", "either"},
+            query_set._candidates(_DOCUMENTS[1])
+        )
+
+    def test_add_and_remove(self):
+        query_set = QuerySet()
+        for query_id, definition in _QUERIES.items():
+            query_set.add(query_id, Query(definition))
+        query_set.remove("food")
+        query_set.remove("either")
+        query_set.add("cheap", {"price": {"$gt": 3}})
+        self.assertNotIn("food", query_set)
+
+        queries = dict(_QUERIES)
+        del queries["food"]
+        del queries["either"]
+        del queries["cheap"]
+        queries["cheap"] = {"price": {"$gt": 3}}
+        self.assertSameAsQueries(query_set, queries)
@@ -0,0 +1,102 @@
+from unittest import TestCase
+
+from mongoquery import Query, QueryError
+from mongoquery.normalize import EMPTY, normalize
+
+_RECORDS = [
+    {},
+    {"a": None},
+    {"a": 3, "b": "x"},
+    {"a": 7, "b": ["y", "z"]},
+    {"a": [1, 6], "b": {"c": 2}},
+    {"a": "6", "b": None},
+    {"a": {"b": 4}, "c": [{"d": 1}, {"d": 5}]},
+]
+
+
+class TestNormalize(TestCase):
+    def _assert_normalized(self, expected, definition):
+        normalized = normalize(definition)
+        self.assertEqual(expected, normalized)
+        self.assertEqual(normalized, normalize(normalized))
+        self.assertEqual(
+            list(Query(definition).filter(_RECORDS)),
+            list(Query(normalized).filter(_RECORDS)))
+
+    def test_logical_operators_flattened(self):
+        self._assert_normalized(
+            {"a": 3, "b": "x"},
+            {"$and": [{"a": 3}, {"$and": [{"b": "x"}]}]})
+        self._assert_normalized(
+            {"$or": [{"a": 3}, {"b": "x"}, {"c.d": 5}]},
+            {"$or": [{"$or": [{"a": 3}, {"b": "x"}]}, {"c.d": 5}]})
+        self._assert_normalized(
+            {"a": {"$gt": 1}}, {"$or": [{"a": {"$gt": 1}}]})
+
+    def test_ranges_merged(self):
+        self._assert_normalized(
+            {"a": {"$gt": 5}},
+            {"$and": [{"a": {"$gt": 1}}, {"a": {"$gt": 5}}]})
+        self._assert_normalized(
+            {"a": {"$gte": 2, "$lt": 7, "$ne": 3}},
+            {"a": {"$gte": 2, "$ne": 3}, "$and": [
+                {"a": {"$lte": 7}}, {"a": {"$lt": 7}}, {"a": {"$gte": 1}}]})
+        # Bounds of different families, or with $exists, are left as is.
+        self._assert_normalized(
+            {"a": {"$gt": 1, "$lt": "9"}}, {"a": {"$gt": 1, "$lt": "9"}})
+        self._assert_normalized(
+            {"a": {"$gt": 1, "$exists": True},
+             "$and": [{"a": {"$gt": 2}}]},
+            {"$and": [{"a": {"$gt": 1, "$exists": True}}, {"a": {"$gt": 2}}]})
+
+    def test_equalities_turned_into_in(self):
+        self._assert_normalized(
+            {"$or": [{"a": {"$in": [3, 7, 6]}}, {"b": "x"}]},
+            {"$or": [{"a": 3}, {"b": "x"}, {"a": {"$in": [7, 6]}}, {"a": 3}]})
+        self._assert_normalized({"a": 3}, {"a": {"$in": [3]}})
+        self._assert_normalized(
+            {"a": {"$in": [{"b": 4}]}}, {"a": {"$in": [{"b": 4}]}})
+        # Equalities on a same field all have to hold for arrays.
+        self._assert_normalized(
+            {"a": 1, "$and": [{"a": 6}]}, {"$and": [{"a": 1}, {"a": 6}]})
+
+    def test_constants_folded(self):
+        self._assert_normalized({"a": 3}, {"a": 3, "$comment": "three"})
+        self._assert_normalized(
+            {}, {"$and": [], "$nor": [], "a": {"$nin": []}, "b": {}})
+        self._assert_normalized({}, {"$or": [{"a": 3}, {"$comment": "x"}]})
+        self._assert_normalized(
+            {"b": "x"}, {"$or": [{"a": {"$gt": 5, "$lt": 2}}, {"b": "x"}]})
+        self._assert_normalized(
+            {"a": None}, {"a": None, "$nor": [{"a": {"$in": []}}]})
+
+    def test_empty(self):
+        for definition in [
+                {"a": {"$gt": 5, "$lt": 2}},
+                {"a": {"$gte": 5}, "$and": [{"a": {"$lt": 5}}]},
+                {"b": "x", "a": {"$in": []}},
+                {"$or": []},
+                {"$or": [{"a": {"$in": []}}]},
+                {"$nor": [{"$comment": "always"}]}]:
+            self._assert_normalized(EMPTY, definition)
+
+    def test_malformed_definitions_kept(self):
+        for definition in [
+                {"$or": [{"a": 3}, {"$comment": "x", "b": {"$mod": 2}}]},
+                {"a": {"$in": []}, "b": {"$in": 3}},
+                {"$nor": [{}, {"c": {"$type": "unknown"}}]}]:
+            self.assertIs(definition, normalize(definition))
+            self.assertRaises(
+                (QueryError, TypeError), Query.normalized, definition)
+
+    def test_normalized_query(self):
+        query = Query.normalized({"a": {"$gt": 5, "$lt": 2}})
+        entries = iter(_RECORDS)
+        self.assertEqual([], list(query.filter(entries)))
+        self.assertEqual(0, query.count(entries))
+        self.assertIsNone(query.first(entries))
+        self.assertEqual(len(_RECORDS), len(list(entries)))
+        self.assertEqual(
+            [_RECORDS[3]],
+            list(Query.normalized({"$or": [{"a": 7}, {"a": 8}]}).filter(
+                _RECORDS)))
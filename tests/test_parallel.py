@@ -0,0 +1,45 @@
+import pickle
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery.planner import PlannedQuery
+
+_RECORDS = [{"a": index % 7, "b": {"c": index}} for index in range(500)]
+
+
+class TestParallelFilter(TestCase):
+    def test_pickle(self):
+        query = pickle.loads(pickle.dumps(Query({"a": {"$in": [1, 2]}})))
+        self.assertEqual(
+            list(Query({"a": {"$in": [1, 2]}}).filter(_RECORDS)),
+            list(query.filter(_RECORDS)))
+
+        query = pickle.loads(pickle.dumps(PlannedQuery({"a": 1}, 10)))
+        self.assertEqual(10, query._sample_size)
+
+    def test_parallel_filter(self):
+        query = Query({"a": {"$gt": 4}, "b.c": {"$mod": [3, 0]}})
+        expected = list(query.filter(_RECORDS))
+
+        self.assertEqual(
+            expected,
+            list(query.parallel_filter(_RECORDS, workers=2, chunksize=30)))
+        self.assertEqual(
+            sorted(expected, key=lambda record: record["b"]["c"]),
+            sorted(
+                query.parallel_filter(
+                    iter(_RECORDS), workers=2, chunksize=7, ordered=False),
+                key=lambda record: record["b"]["c"]))
+        self.assertEqual(
+            [record["b"]["c"] for record in expected],
+            list(query.parallel_filter(
+                _RECORDS, workers=2, chunksize=100, indices=True)))
+
+    def test_parallel_filter_empty(self):
+        self.assertEqual(
+            [], list(Query({"a": 1}).parallel_filter([], workers=2)))
+
+    def test_invalid_chunksize(self):
+        self.assertRaises(
+            ValueError, Query({"a": 1}).parallel_filter, _RECORDS,
+            chunksize=0)
@@ -0,0 +1,95 @@
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery.planner import PlannedQuery, estimate_cost, may_raise
+
+_RECORDS = [
+    {"a": i, "b": "line {}".format(i), "c": [i, i + 1]}
+    for i in range(20)
+]
+
+
+class _ProbedQuery(PlannedQuery):
+    """ Records the order in which $probe conditions are evaluated """
+    safe_operators = PlannedQuery.safe_operators | {"$probe"}
+
+    def __init__(self, definition, sample_size=0):
+        self.calls = []
+        super(_ProbedQuery, self).__init__(definition, sample_size)
+
+    def _probe(self, condition):
+        name, result = condition
+
+        def match_probe(_):
+            self.calls.append(name)
+            return result
+        return match_probe
+
+
+class TestPlannedQuery(TestCase):
+    def test_estimate_cost(self):
+        self.assertLess(
+            estimate_cost({"a": 1}), estimate_cost({"b": {"$regex": "x"}}))
+        self.assertLess(
+            estimate_cost({"a": 1}), estimate_cost({"a.b.c": 1}))
+        self.assertLess(
+            estimate_cost({"c": {"$in": [1, 2, 3]}}),
+            estimate_cost({"c": {"$elemMatch": {"$gt": 1, "$lt": 3}}}))
+
+    def test_same_results(self):
+        definitions = [
+            {"b": {"$regex": "1$"}, "a": {"$gt": 5}},
+            {"$or": [{"b": {"$regex": "^line 1"}}, {"a": 3}]},
+            {"$nor": [{"c": {"$elemMatch": {"$gt": 10}}}, {"a": 0}]},
+            {"c": {"$all": [{"$elemMatch": {"$gt": 3}}, 5]}},
+            {"a": {"$gte": 2, "$lt": 8, "$nin": [4]}},
+        ]
+        for definition in definitions:
+            expected = list(Query(definition).filter(_RECORDS))
+            self.assertEqual(
+                expected, list(PlannedQuery(definition).filter(_RECORDS)))
+            self.assertEqual(
+                expected,
+                list(PlannedQuery(definition, sample_size=5).filter(_RECORDS))
+            )
+
+    def test_conditions_which_may_raise_keep_their_order(self):
+        self.assertTrue(may_raise({"n": {"$mod": [2, 0]}}))
+        self.assertTrue(
+            may_raise({"$or": [{"a": 1}, {"b.c": {"$exists": True}}]}))
+        self.assertFalse(may_raise({"a": {"$not": {"$regex": "x"}}, "b": 1}))
+
+        definition = {"meta.kind": "invoice", "n": {"$mod": [2, 0]}}
+        for record in [{"meta": {"kind": "note"}},
+                       {"meta": {"kind": "note"}, "n": "1"}]:
+            self.assertFalse(Query(definition).match(record))
+            self.assertFalse(PlannedQuery(definition).match(record))
+        self.assertRaises(
+            TypeError, PlannedQuery(definition).match,
+            {"meta": {"kind": "invoice"}, "n": "1"})
+        query = PlannedQuery({"$or": [
+            {"a": {"$size": {"$gt": 1}}}, {"b": {"$regex": "x"}}, {"c": 1}]})
+        self.assertRaises(TypeError, query.match, {"a": 1, "c": 1})
+
+    def test_cost_ordering(self):
+        query = _ProbedQuery({
+            "$and": [{"$probe": ("first", True)}, {"b": {"$regex": "x"}}],
+            "a": {"$probe": ("second", False)},
+        })
+        self.assertFalse(query.match(_RECORDS[0]))
+        self.assertEqual(["second"], query.calls)
+
+    def test_selectivity_ordering(self):
+        query = _ProbedQuery({
+            "$and": [
+                {"$probe": ("rarely_false", True)},
+                {"$probe": ("often_false", False)},
+            ]
+        }, sample_size=10)
+        for record in _RECORDS[:10]:
+            query.match(record)
+        self.assertEqual(["rarely_false", "often_false"] * 10, query.calls)
+
+        del query.calls[:]
+        query.match(_RECORDS[0])
+        self.assertEqual(["often_false"], query.calls)
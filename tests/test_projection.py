@@ -0,0 +1,94 @@
+from unittest import TestCase
+
+from mongoquery import Query, QueryError
+from mongoquery.projection import Projection
+
+
+_DOCUMENT = {
+    "_id": 1,
+    "name": "Jane",
+    "address": {"city": "Paris", "zip": "75001"},
+    "orders": [
+        {"sku": "a", "qty": 1},
+        {"sku": "b", "qty": 5},
+        "cancelled",
+    ],
+    "scores": [1, 2, 3, 4, 5],
+}
+
+
+class TestProjection(TestCase):
+    def _project(self, specification):
+        return Projection(specification).apply(_DOCUMENT)
+
+    def test_inclusion(self):
+        self.assertEqual(
+            {"_id": 1, "name": "Jane", "address": {"city": "Paris"}},
+            self._project({"name": 1, "address.city": 1, "missing": 1})
+        )
+        self.assertEqual(
+            {"orders": [{"qty": 1}, {"qty": 5}]},
+            self._project({"orders.qty": True, "_id": 0})
+        )
+        self.assertEqual({"_id": 1}, self._project({"_id": 1}))
+
+    def test_exclusion(self):
+        projected = self._project({"address.zip": 0, "orders.sku": 0,
+                                   "scores": 0})
+        self.assertEqual(
+            {"_id": 1, "name": "Jane", "address": {"city": "Paris"},
+             "orders": [{"qty": 1}, {"qty": 5}, "cancelled"]},
+            projected
+        )
+        self.assertEqual("75001", _DOCUMENT["address"]["zip"])
+        self.assertEqual(_DOCUMENT, self._project({}))
+
+    def test_slice(self):
+        self.assertEqual([1, 2], self._project({"scores": {"$slice": 2}})[
+            "scores"])
+        self.assertEqual([4, 5], self._project({"scores": {"$slice": -2}})[
+            "scores"])
+        self.assertEqual([2, 3], self._project({
+            "scores": {"$slice": [1, 2]}})["scores"])
+        self.assertEqual([4], self._project({
+            "scores": {"$slice": [-2, 1]}})["scores"])
+        # $slice alone keeps the other fields.
+        self.assertEqual("Jane", self._project({
+            "scores": {"$slice": 1}})["name"])
+        self.assertEqual(
+            {"name": "Jane", "scores": [5]},
+            self._project({"scores": {"$slice": -1}, "name": 1, "_id": 0})
+        )
+
+    def test_elem_match(self):
+        self.assertEqual(
+            {"_id": 1, "orders": [{"sku": "b", "qty": 5}]},
+            self._project({"orders": {"$elemMatch": {"qty": {"$gt": 2}}}})
+        )
+        self.assertEqual(
+            {"_id": 1},
+            self._project({"orders": {"$elemMatch": {"qty": {"$gt": 9}}}})
+        )
+
+    def test_invalid(self):
+        for specification in [
+                {"a": 1, "b": 0},
+                {"a": 1, "a.b": 1},
+                {"a.$": 1},
+                {"a": {"$slice": "2"}},
+                {"a": {"$slice": [1, 0]}},
+                {"a": {"$size": 1}},
+        ]:
+            self.assertRaises(QueryError, Projection, specification)
+
+    def test_filter(self):
+        documents = [dict(_DOCUMENT, _id=index) for index in range(3)]
+        self.assertEqual(
+            [{"_id": 1, "name": "Jane"}],
+            list(Query({"_id": 1}).filter(documents, {"name": 1}))
+        )
+        self.assertEqual(
+            [{"_id": 0}, {"_id": 2}],
+            list(Query({"_id": {"$ne": 1}}).filter(
+                documents, Projection({"_id": 1})))
+        )
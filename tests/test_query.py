@@ -1,7 +1,7 @@
 import re
 from unittest import TestCase
 
-from mongoquery import Query
+from mongoquery import Query, QueryError
 
 _FOOD = {
     "_id": 100,
@@ -94,6 +94,38 @@ class TestQuery(TestCase):
             self._query({"qty": {"$nin": [10, 42]}})
         )
 
+    def test_in_membership(self):
+        collection = [
+            {"a": 1, "b": ["x", "y"]},
+            {"a": {"c": 1}, "b": [{"c": 1}, "z"]},
+            {"a": [1, 2], "b": "xyz"},
+            {"a": "abc"},
+        ]
+
+        self.assertEqual(
+            collection[:1] + collection[2:3],
+            self._query({"a": {"$in": list(range(1, 10000, 2))}}, collection)
+        )
+        self.assertEqual(
+            collection[1:2],
+            self._query({"a": {"$in": [3, {"c": 1}]}}, collection)
+        )
+        self.assertEqual(
+            collection[1:2],
+            self._query({"b": {"$in": [{"c": 1}]}}, collection)
+        )
+        self.assertEqual(
+            collection[:1] + collection[2:3],
+            self._query({"b": {"$in": [re.compile("^x"), "q"]}}, collection)
+        )
+        self.assertEqual(
+            collection[1:2] + collection[3:],
+            self._query({"a": {"$nin": [1, 2, 3]}}, collection)
+        )
+        self.assertEqual(
+            [], self._query({"a": {"$in": []}}, collection)
+        )
+
     def test_element(self):
         self.assertEqual(
             _ALL,
@@ -257,6 +289,47 @@ class TestQuery(TestCase):
             }, collection=products)
         )
 
+    def test_regex_options(self):
+        products = [
+            {"_id": 100, "sku": "abc123",
+             "description": "Single line description."},
+            {"_id": 101, "sku": "abc789",
+             "description": "First line\nSecond line"},
+            {"_id": 102, "sku": "xyz456",
+             "description": "Many spaces before     line"},
+        ]
+
+        self.assertEqual(
+            products[:2],
+            self._query(
+                {"sku": {"$regex": "^ABC", "$options": "i"}},
+                collection=products)
+        )
+        self.assertEqual(
+            products[:2],
+            self._query(
+                {"description": {"$regex": "^s", "$options": "im"}},
+                collection=products)
+        )
+        self.assertEqual(
+            products[:2],
+            self._query(
+                {"sku": {"$regex": re.compile("^ABC"), "$options": "i"}},
+                collection=products)
+        )
+        self.assertEqual(
+            products[1:2],
+            self._query(
+                {"description": {"$regex": "/^second/i", "$options": "m"}},
+                collection=products)
+        )
+
+        self.assertRaises(QueryError, Query, {"sku": {"$options": "i"}})
+        self.assertRaises(
+            QueryError, Query, {"sku": {"$regex": "a", "$options": "z"}})
+        self.assertRaises(QueryError, Query, {"sku": {"$regex": "(a"}})
+        self.assertRaises(QueryError, Query, {"sku": {"$regex": 42}})
+
     def test_array(self):
         self.assertEqual(
             [_FOOD],
@@ -435,3 +508,63 @@ class TestQuery(TestCase):
         collection = [{"a": "5"}, {"a": "567"}]
         self.assertEqual([], self._query({"a": 5}, collection))
         self.assertEqual([{"a": "5"}], self._query({"a": "5"}, collection))
+
+    def test_malformed_query_rejected_on_instanciation(self):
+        self.assertRaises(QueryError, Query, {"$foo": 2})
+        self.assertRaises(QueryError, Query, {"a": {"$foo": 2}})
+        self.assertRaises(QueryError, Query, {"$or": 2})
+        self.assertRaises(QueryError, Query, {"a": {"$type": "foo"}})
+        self.assertRaises(QueryError, Query, {"a": {"$size": "foo"}})
+        self.assertRaises(QueryError, Query, {"a": {"$mod": 4}})
+
+    def test_collection_methods(self):
+        query = Query({"type": "fruit"})
+        self.assertEqual([_FRUIT], list(query.filter(_ALL)))
+        self.assertEqual(1, query.count(_ALL))
+        self.assertEqual(0, query.count([_FOOD]))
+        self.assertIs(_FRUIT, query.first(_ALL))
+        self.assertIsNone(query.first([_FOOD]))
+        self.assertIs(_FOOD, query.first([], default=_FOOD))
+        self.assertEqual(([_FRUIT], [_FOOD]), query.partition(_ALL))
+
+    def test_first_stops_at_first_match(self):
+        entries = iter([_FOOD, _FRUIT, _FOOD])
+        self.assertIs(_FRUIT, Query({"type": "fruit"}).first(entries))
+        self.assertEqual([_FOOD], list(entries))
+
+    def test_array_fan_out_stops_at_first_match(self):
+        class Items(list):
+            visited = 0
+
+            def __iter__(self):
+                for item in list.__iter__(self):
+                    self.visited += 1
+                    yield item
+
+        items = Items({"memo": str(index)} for index in range(10))
+        self.assertTrue(Query({"items.memo": "2"}).match({"items": items}))
+        self.assertEqual(3, items.visited)
+
+        items.visited = 0
+        self.assertTrue(
+            Query({"items.memo": {"$in": ["1", "x"]}}).match({"items": items}))
+        self.assertEqual(2, items.visited)
+
+        self.assertFalse(Query({"items.memo": "x"}).match({"items": items}))
+
+    def test_nested_array_fan_out(self):
+        collection = [
+            {"a": [{"b": [{"c": 1}, {"c": 2}]}, {"b": {"c": 3}}]},
+            {"a": [{"b": [{"c": 4}]}, {"d": 1}]},
+        ]
+        self.assertEqual(
+            collection[:1], self._query({"a.b.c": 3}, collection))
+        self.assertEqual(
+            collection[:1], self._query({"a.b.c": [1, 2]}, collection))
+        self.assertEqual(
+            [], self._query({"a.b.c": 1}, collection))
+        self.assertEqual(
+            collection[1:], self._query({"a.b.0.c": {"$in": [4]}}, collection))
+        self.assertEqual(
+            collection[:1],
+            self._query({"a.b": {"$elemMatch": {"c": 2}}}, collection))
@@ -0,0 +1,99 @@
+import json
+from datetime import datetime
+from unittest import TestCase, skipIf
+
+from mongoquery import Query
+from mongoquery.raw import RawBSONDocument, RawJSONDocument, bson
+
+
+_DOCUMENT = {
+    "id": 1,
+    "name": "café \"au lait\" {not: [a, container]}",
+    "tags": ["hot", "drink"],
+    "price": 2.5,
+    "available": True,
+    "supplier": None,
+    "recipe": {"steps": [{"do": "brew", "minutes": 4}], "size": "large"},
+    "deep": {"a": {"b": {"c": {"d": {"e": {"f": {"g": {"h": 1}}}}}}}},
+}
+
+
+class TestRawJSON(TestCase):
+    def test_mapping(self):
+        document = RawJSONDocument(json.dumps(_DOCUMENT, indent=2))
+        self.assertEqual(1, document["id"])
+        self.assertEqual(_DOCUMENT["name"], document["name"])
+        self.assertIn("deep", document)
+        self.assertNotIn("missing", document)
+        self.assertRaises(KeyError, lambda: document["missing"])
+        self.assertIsInstance(document["recipe"], RawJSONDocument)
+        self.assertEqual(list(_DOCUMENT), list(document))
+        self.assertEqual(len(_DOCUMENT), len(document))
+        self.assertEqual(_DOCUMENT, document)
+        self.assertEqual(_DOCUMENT, document.decode())
+
+    def test_lazy(self):
+        document = RawJSONDocument(b'{"a": 1, "b": [1, 2, , ], "c": {"x": ]}')
+        self.assertEqual(1, document["a"])
+        self.assertRaises(ValueError, lambda: document["b"])
+        self.assertRaises(ValueError, lambda: document["c"]["x"])
+        self.assertRaises(ValueError, RawJSONDocument, b"[1, 2]")
+
+    def test_match(self):
+        raw = json.dumps(_DOCUMENT).encode("utf-8")
+        for definition in [
+                {"id": 1},
+                {"tags": "drink", "price": {"$lt": 3}},
+                {"recipe.steps.do": "brew"},
+                {"recipe.steps": {"$elemMatch": {"minutes": {"$gt": 3}}}},
+                {"recipe": {"steps": [{"do": "brew", "minutes": 4}],
+                            "size": "large"}},
+                {"deep.a.b.c.d.e.f.g.h": 1},
+                {"supplier": {"$exists": True}, "missing": {"$exists": False}},
+                {"$or": [{"available": False}, {"recipe.size": "small"}]},
+        ]:
+            query = Query(definition)
+            self.assertEqual(
+                query.match(_DOCUMENT),
+                query.match(RawJSONDocument(raw)),
+                definition
+            )
+
+
+@skipIf(bson is None, "bson isn't installed")
+class TestRawBSON(TestCase):
+    def test_mapping(self):
+        document = RawBSONDocument(bson.encode(_DOCUMENT))
+        self.assertEqual(_DOCUMENT["name"], document["name"])
+        self.assertIsInstance(document["recipe"], RawBSONDocument)
+        self.assertEqual(list(_DOCUMENT), list(document))
+        self.assertEqual(_DOCUMENT, document)
+        self.assertEqual(_DOCUMENT, document.decode())
+
+    def test_match(self):
+        raw = bson.encode(_DOCUMENT)
+        for definition in [
+                {"tags": "drink", "price": {"$lt": 3}},
+                {"recipe.steps.do": "brew", "supplier": None},
+                {"deep.a.b.c.d.e.f.g.h": {"$gt": 1}},
+        ]:
+            query = Query(definition)
+            self.assertEqual(
+                query.match(_DOCUMENT),
+                query.match(RawBSONDocument(raw)),
+                definition
+            )
+
+    def test_dates(self):
+        raw = bson.encode({"when": datetime(2021, 6, 1, 12, 30, 0, 125000)})
+        self.assertEqual(bson.decode(raw), RawBSONDocument(raw).decode())
+        for definition in [
+                {"when": {"$gt": datetime(2021, 1, 1)}},
+                {"when": datetime(2021, 6, 1, 12, 30, 0, 125000)},
+        ]:
+            query = Query(definition)
+            self.assertTrue(query.match(bson.decode(raw)))
+            self.assertTrue(
+                query.match(RawBSONDocument(raw)),
+                definition
+            )
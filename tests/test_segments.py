@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery.segments import SegmentedCollection, SegmentWriter, \
+    write_segments
+
+_DOCUMENTS = [
+    {
+        "_id": index,
+        "date": "2020-01-{:02d}".format(index + 1),
+        "level": ["info", "warning", "error"][index % 3],
+        "size": index * 10,
+        "tags": ["a", "b"] if index % 5 == 0 else None,
+    }
+    for index in range(30)
+]
+
+
+class TestSegmentedCollection(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "documents.seg")
+        write_segments(
+            self.filename, _DOCUMENTS, ["date", "level", "size", "tags"],
+            segment_size=10, sample_size=3)
+        self.collection = SegmentedCollection(self.filename)
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(self.collection.close)
+
+    def _assert_scan(self, definition, segments_scanned):
+        self.assertEqual(
+            list(Query(definition).filter(_DOCUMENTS)),
+            list(self.collection.find(definition)))
+        self.assertEqual(
+            segments_scanned,
+            self.collection.explain(definition)["segmentsScanned"])
+
+    def test_file(self):
+        self.assertEqual(30, len(self.collection))
+        self.assertEqual(3, len(self.collection.segments))
+        zone = self.collection.segments[0].zones["size"]
+        self.assertEqual([0, 90], zone["numbers"])
+        self.assertIsNone(zone["values"])
+        self.assertEqual(
+            frozenset(["a", "b", None]),
+            self.collection.segments[1].zones["tags"]["values"])
+        self.assertRaises(ValueError, SegmentedCollection, __file__)
+
+    def test_ranges(self):
+        self._assert_scan(
+            {"date": {"$gte": "2020-01-12", "$lt": "2020-01-15"}}, 1)
+        self._assert_scan({"size": {"$gt": 90, "$lte": 100}}, 1)
+        self._assert_scan({"size": {"$gt": 290}}, 0)
+        # Strings are never greater than numbers.
+        self._assert_scan({"date": {"$gt": 0}}, 0)
+
+    def test_equalities(self):
+        self._assert_scan({"size": 150}, 1)
+        self._assert_scan({"size": {"$in": [150, 250, 300]}}, 2)
+        self._assert_scan({"tags": "a"}, 3)
+        self._assert_scan({"tags": "c"}, 0)
+        self._assert_scan({"tags": None}, 3)
+        self._assert_scan({"level": "debug"}, 0)
+        self._assert_scan({"level": {"$in": ["debug", "error"]}}, 3)
+
+    def test_logical_operators(self):
+        self._assert_scan(
+            {"$or": [{"size": 10}, {"date": "2020-01-30"}]}, 2)
+        self._assert_scan(
+            {"$and": [{"size": {"$gte": 100}}, {"size": {"$lt": 200}}]}, 1)
+        # Nothing can be said of segments for other operators, or fields
+        # without zone maps.
+        self._assert_scan({"$or": [{"size": 10}, {"_id": 25}]}, 3)
+        self._assert_scan({"tags.-1": "b"}, 3)
+        self._assert_scan({"$nor": [{"size": {"$lt": 200}}]}, 3)
+        self._assert_scan({"size": {"$ne": 10}}, 3)
+        self._assert_scan({"size": {"$gt": 5, "$lt": 2}}, 0)
+
+    def test_json_round_trip(self):
+        filename = os.path.join(self.directory, "keys.seg")
+        with SegmentWriter(filename, ["1", "a"]) as writer:
+            writer.write({1: 5, "a": (1, 2)})
+        with SegmentedCollection(filename) as collection:
+            self.assertEqual(
+                [{"1": 5, "a": [1, 2]}], list(collection.find({"1": 5})))
+            self.assertEqual(1, len(list(collection.find({"a": 2}))))
+
+    def test_segments_are_json_lines(self):
+        with open(self.filename, "rb") as stream:
+            stream.readline()
+            self.assertEqual(_DOCUMENTS[0], json.loads(stream.readline()))
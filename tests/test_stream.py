@@ -0,0 +1,119 @@
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from mongoquery import Query
+from mongoquery import stream
+
+
+_DOCUMENTS = [
+    {"level": "error", "duration": 700, "tags": ["db", "slow"]},
+    {"level": "info", "duration": 20, "message": "error"},
+    {"level": "error", "duration": 30},
+    {"level": "debug", "user": {"name": "bob"}},
+    {"level": "Error", "duration": 900},
+]
+
+
+class TestStream(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "wb") as output:
+            for document in _DOCUMENTS:
+                output.write(json.dumps(document).encode("utf-8") + b"\n")
+            output.write(b"\n")
+            # The last line has no line feed.
+            output.write(json.dumps({"level": "error"}).encode("utf-8"))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_required_substrings(self):
+        self.assertEqual(
+            {b'"level"', b'"error"', b'"user"', b'"name"', b'bo'},
+            set(stream.required_substrings({
+                "level": "error",
+                "user.name": {"$regex": "^bo"},
+            }))
+        )
+        self.assertEqual(
+            {b'"tags"', b'"note"'},
+            set(stream.required_substrings({
+                "$and": [{"tags.0": {"$in": ["db", "web"]}}, {"tags.-1": 1}],
+                "$or": [{"level": "error"}, {"level": "info"}],
+                "message": {"$ne": "error"},
+                "name": {"$exists": True, "$eq": "bob"},
+                "note": "café",
+            }))
+        )
+
+    def test_html_safe_encoding(self):
+        definition = {"note": "a<b", "tags": {"$regex": "^x&y"}}
+        self.assertEqual(
+            {b'"note"', b'"tags"'},
+            set(stream.required_substrings(definition)))
+        line = b'{"note": "a\\u003cb", "tags": "x\\u0026y"}\n'
+        self.assertEqual(
+            [(line, {"note": "a<b", "tags": "x&y"})],
+            list(stream.iter_matches(Query(definition), [line])))
+
+    def test_filter_same_as_query(self):
+        definitions = [
+            {"level": "error"},
+            {"level": {"$regex": "rror$"}},
+            {"level": {"$regex": "error", "$options": "i"}},
+            {"duration": {"$gt": 100}},
+            {"tags": "slow"},
+            {"user.name": "bob"},
+            {"message": {"$exists": False}},
+            {"tags.-1": "slow"},
+        ]
+        documents = _DOCUMENTS + [{"level": "error"}]
+        for definition in definitions:
+            expected = list(Query(definition).filter(documents))
+            for use_mmap in (False, True):
+                for prefilter in (False, True):
+                    self.assertEqual(
+                        expected, list(stream.filter_ndjson(
+                            definition, self.path, use_mmap=use_mmap,
+                            prefilter=prefilter)),
+                        definition
+                    )
+
+    def test_write_matching_lines(self):
+        output = io.BytesIO()
+        with open(self.path, "rb") as source:
+            count = stream.filter_ndjson({"level": "error"}, source, output)
+        self.assertEqual(3, count)
+        self.assertEqual(
+            [{"level": "error", "duration": 700, "tags": ["db", "slow"]},
+             {"level": "error", "duration": 30},
+             {"level": "error"}],
+            [json.loads(line) for line in output.getvalue().splitlines()]
+        )
+
+    def test_invalid_lines(self):
+        lines = [b'{"a": 1}\n', b'{"a": \n', b'{"a": 1}\n']
+        with self.assertRaisesRegex(ValueError, "line 2"):
+            list(stream.iter_matches({"a": 1}, lines))
+        self.assertEqual(
+            2, len(list(stream.iter_matches({"a": 1}, lines,
+                                            skip_invalid=True))))
+
+    def test_main(self):
+        output = io.BytesIO()
+        stream.main(
+            ["--count", '{"duration": {"$lt": 100}}', self.path, "-"],
+            stdin=io.BytesIO(b'{"duration": 1}\n{"duration": 200}\n'),
+            stdout=output)
+        self.assertEqual(b"3\n", output.getvalue())
+
+        output = io.BytesIO()
+        stream.main(["--mmap", '{"user.name": "bob"}', self.path],
+                    stdout=output)
+        self.assertEqual(
+            [_DOCUMENTS[3]],
+            [json.loads(line) for line in output.getvalue().splitlines()]
+        )
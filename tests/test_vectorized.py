@@ -0,0 +1,85 @@
+from unittest import TestCase, skipIf
+
+from mongoquery import Query
+
+try:
+    import numpy
+    from mongoquery.vectorized import VectorizedQuery
+except ImportError:
+    numpy = None
+
+_RECORDS = [
+    {"a": 5, "b": 5, "c": None},
+    {"a": 3, "b": None, "c": 8},
+    {"a": None, "b": 3, "c": 9},
+    {"a": 1, "b": 2, "c": 3},
+    {"a": 2, "c": 5},
+    {"a": 3, "b": 2},
+    {"a": 4},
+    {"b": 2, "c": 4},
+    {"b": 2},
+    {"c": 6},
+    {"a": [1, 3], "b": "2"},
+    {"a": {"b": 2.5}, "c": 2 ** 60},
+    {"a": "3", "b": True},
+    {"a": b"\x03", "c": b"\x02"},
+]
+
+
+@skipIf(numpy is None, "numpy isn't installed")
+class TestVectorizedQuery(TestCase):
+    def assertSameAsQuery(self, definition, records=_RECORDS):
+        expected = [Query(definition).match(record) for record in records]
+        mask = VectorizedQuery(definition).mask(records)
+        self.assertEqual(numpy.bool_, mask.dtype.type)
+        self.assertEqual(expected, mask.tolist())
+
+    def test_comparison(self):
+        for operator in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+            self.assertSameAsQuery({"a": {operator: 3}})
+            self.assertSameAsQuery({"c": {operator: 2.5}})
+        self.assertSameAsQuery({"a": 3})
+        self.assertSameAsQuery({"a.b": {"$gt": 2}})
+        self.assertSameAsQuery({"b": {"$in": [2, 3]}})
+        self.assertSameAsQuery({"b": {"$nin": [2, 3]}})
+        self.assertSameAsQuery({"a": {"$in": [1]}})
+        self.assertSameAsQuery(
+            {"c": {"$mod": [4, 1]}, "a": {"$gt": 2}},
+            [record for record in _RECORDS if isinstance(record.get("c"), int)]
+        )
+        self.assertSameAsQuery({"c": {"$gte": 2 ** 60}})
+
+    def test_logical(self):
+        self.assertSameAsQuery({"a": {"$gt": 1, "$lt": 5}})
+        self.assertSameAsQuery({"a": {"$not": {"$gt": 3}}})
+        self.assertSameAsQuery({"$or": [{"a": 3}, {"c": {"$gt": 5}}]})
+        self.assertSameAsQuery({"$nor": [{"a": 3}, {"c": {"$gt": 5}}]})
+        self.assertSameAsQuery({"$and": [{"a": {"$gte": 3}}, {"b": 2}]})
+        self.assertSameAsQuery({"$and": [], "$or": [{"b": 5}]})
+
+    def test_fallback(self):
+        self.assertSameAsQuery({"a": {"$exists": True}, "b": 2})
+        # Query raises looking None up in bytes.
+        self.assertSameAsQuery(
+            {"$or": [{"a": None}, {"b": {"$type": "bool"}}]},
+            [record for record in _RECORDS
+             if not isinstance(record.get("a"), bytes)])
+        self.assertSameAsQuery({"b": {"$regex": "2"}, "a": {"$lt": 3}})
+
+    def test_indices(self):
+        query = VectorizedQuery({"a": {"$gte": 3}})
+        self.assertEqual(
+            [0, 1, 5, 6],
+            query.indices(_RECORDS).tolist()
+        )
+
+    def test_columns(self):
+        columns = {
+            "a": numpy.array([1, 5, 3, 8]),
+            "b.c": numpy.array([0.5, 1.5, 2.5, 3.5]),
+        }
+        query = VectorizedQuery({"a": {"$gt": 2}, "b.c": {"$lt": 3}})
+        self.assertEqual([1, 2], query.indices(columns).tolist())
+
+        query = VectorizedQuery({"a": {"$gt": 2}, "b.c": {"$type": "double"}})
+        self.assertEqual([1, 2, 3], query.indices(columns).tolist())